@@ -5,7 +5,7 @@ from typing import Callable
 import paho.mqtt.client as mqtt
 
 from PythonLib.Scheduler import Scheduler
-from PythonLib.Mqtt import Mqtt
+from PythonLib.Mqtt import BatchedMQTTHandler, Mqtt, PayloadType, flushingLogBatch
 
 # https://pypi.org/project/aiomqtt/
 
@@ -48,17 +48,28 @@ class AsyncMqtt:
     async def publishOnChangeIndependentTopic(self, topic: str, payload: str, forceUpdateMs: int = 60000) -> None:
         self.mqttClient.publishOnChangeIndependentTopic(topic, payload, forceUpdateMs)
 
-    async def subscribe(self, topic: str, callback: Callable[[str], None]) -> None:
-        self.mqttClient.subscribe(topic, callback)
+    async def subscribe(self, topic: str, callback: Callable[[str], None], payloadType: PayloadType = PayloadType.STR) -> None:
+        self.mqttClient.subscribe(topic, callback, payloadType)
 
-    async def subscribeIndependentTopic(self, topic: str, callback: Callable[[str], None]) -> None:
-        self.mqttClient.subscribeIndependentTopic(topic, callback)
+    async def subscribeIndependentTopic(self, topic: str, callback: Callable[[str], None],
+                                        payloadType: PayloadType = PayloadType.STR) -> None:
+        self.mqttClient.subscribeIndependentTopic(topic, callback, payloadType)
 
     async def getSubscriptionCatalog(self) -> list[str]:
         return self.mqttClient.getSubscriptionCatalog()
 
-    async def subscribeStartWithTopic(self, topic: str, callback: Callable[[str, str], None]) -> None:
-        self.mqttClient.subscribeStartWithTopic(topic, callback)
+    async def enableParallelDispatch(self, workers: int = 4, slowHandlerMs: int = 500) -> None:
+        self.mqttClient.enableParallelDispatch(workers, slowHandlerMs)
+
+    async def disableParallelDispatch(self) -> None:
+        self.mqttClient.disableParallelDispatch()
+
+    async def getCallbackStats(self) -> dict:
+        return self.mqttClient.getCallbackStats()
+
+    async def subscribeStartWithTopic(self, topic: str, callback: Callable[[str, str], None],
+                                      payloadType: PayloadType = PayloadType.STR) -> None:
+        self.mqttClient.subscribeStartWithTopic(topic, callback, payloadType)
 
 
 class AsyncMQTTHandler(logging.Handler):
@@ -75,3 +86,93 @@ class AsyncMQTTHandler(logging.Handler):
         task = asyncio.create_task(self.mqtt.publishIndependentTopic(self.topic, log_message))
         self.background_tasks.add(task)
         task.add_done_callback(self.background_tasks.remove)
+
+
+class AsyncBatchedMQTTHandler(BatchedMQTTHandler):
+    """
+    Batching logging handler with a single flusher task instead of one task per record.
+    The flusher has to be started with start() from within the event loop.
+    """
+
+    def __init__(self, mqttClient: AsyncMqtt, topic: str, capacity: int = 10000, batchSize: int = 100,
+                 flushIntervalMs: int = 1000, maxMessagesPerSecond: float = 10) -> None:
+        self.asyncMqtt = mqttClient
+        self.task = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.wakeupEvent: asyncio.Event = None
+        super().__init__(mqttClient.mqttClient, topic, capacity, batchSize, flushIntervalMs, maxMessagesPerSecond)
+
+    def _startFlusher(self) -> None:
+        pass
+
+    async def start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.wakeupEvent = asyncio.Event()
+
+        async def fct():
+            # The task runs in its own copy of the context
+            flushingLogBatch.set(True)
+            while not self.closed:
+                try:
+                    await asyncio.wait_for(self.wakeupEvent.wait(), self.flushIntervalMs / 1000)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeupEvent.clear()
+                await self.__flushBuffer()
+
+        self.task = asyncio.create_task(fct())
+
+    def _wakeupFlusher(self) -> None:
+        if self.wakeupEvent is None:
+            return
+
+        try:
+            runningLoop = asyncio.get_running_loop()
+        except RuntimeError:
+            runningLoop = None
+
+        # asyncio.Event is not thread safe, records may be logged by other threads
+        if runningLoop is self.loop:
+            self.wakeupEvent.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self.wakeupEvent.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+
+    async def __flushBuffer(self) -> None:
+        # Also awaited by stop() outside of the flusher task
+        token = flushingLogBatch.set(True)
+        try:
+            while self.buffer or self.droppedCount != self.reportedDroppedCount:
+                delay = self._reserveMessage()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                payload = self._takeBatch()
+                if payload is None:
+                    break
+                try:
+                    await self.asyncMqtt.publishIndependentTopic(self.topic, payload)
+                except BaseException:
+                    logger.exception("Publishing log batch failed")
+        finally:
+            flushingLogBatch.reset(token)
+
+    async def stop(self) -> None:
+        """
+        Stop the flusher task and publish the records still buffered.
+        """
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.__flushBuffer()
+
+    def close(self) -> None:
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+        super().close()
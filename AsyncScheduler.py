@@ -1,37 +1,218 @@
 import asyncio
-from typing import Callable
-from datetime import datetime, timedelta, time
+import heapq
+import itertools
+import logging
+from typing import Callable, List, Optional, Tuple, Union
+from datetime import datetime, timedelta, time, tzinfo
+
+from PythonLib.Cron import CronExpression
+from PythonLib.Scheduler import (WALL_CLOCK_JUMP_MS, AbsDateTask, AbsTimeTask, CatchUpPolicy, CronTask, ExecutionMode,
+                                  OverrunPolicy, RelMsTask, Scheduler, Task)
+
+logger = logging.getLogger('PythonLib.AsyncScheduler')
+
+# Longest sleep of the dispatcher, so a jump of the wall clock is noticed while waiting for a distant deadline
+MAX_SLEEP_MS = 60000
 
 
 class AsyncScheduler:
+    """
+    Asyncio counterpart of Scheduler. All jobs share one dispatcher coroutine sleeping until the earliest deadline,
+    a sleeping job costs only its task object and a heap entry. Callbacks are coroutine functions.
+    """
 
     def __init__(self) -> None:
+        # Min-heap of (deadlineMs, sequence, task), same layout as in Scheduler
+        self.taskHeap: List[Tuple[int, int, Task]] = []
+        self.sequence = itertools.count()
+        self.cancelledInHeap = 0
+        self.wallClockOffsetMs = Scheduler.getWallClockOffsetMs()
+
+        # Callbacks currently running
         self.background_tasks = set()
+        self.dispatcher: asyncio.Task = None
+        self.wakeup: asyncio.Event = None
 
-    async def oneShoot(self, callback: Callable[[None], None], timePeriodMs: int) -> None:
-        """Adds a new non-reloading task to the task list."""
+    def __push(self, task: Task) -> None:
+        """Adds a task to the heap and wakes the dispatcher if the task is the new earliest one."""
+        task.scheduled = True
+        task.inHeap = True
+        deadlineMs = task.getDeadlineMs()
+        heapq.heappush(self.taskHeap, (deadlineMs, next(self.sequence), task))
 
-        async def fct():
-            await asyncio.sleep(timePeriodMs / 1000)
-            await callback()
+        if self.dispatcher is None:
+            self.wakeup = asyncio.Event()
+            self.dispatcher = asyncio.create_task(self.__dispatch())
+        elif self.taskHeap[0][2] is task:
+            self.wakeup.set()
+
+    async def __sleep(self) -> None:
+        """Sleeps until the earliest deadline or until a new earlier task was added."""
+        timeout = None
+        if self.taskHeap:
+            timeout = min(MAX_SLEEP_MS, max(0, self.taskHeap[0][0] + 1 - Scheduler.getMonotonicMillis())) / 1000
+
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.wakeup.clear()
+
+    async def __dispatch(self) -> None:
+        while True:
+            await self.__sleep()
+
+            wallClockOffsetMs = Scheduler.getWallClockOffsetMs()
+            if abs(wallClockOffsetMs - self.wallClockOffsetMs) > WALL_CLOCK_JUMP_MS:
+                logger.info("Wall clock jumped by %i ms", wallClockOffsetMs - self.wallClockOffsetMs)
+                self.wallClockOffsetMs = wallClockOffsetMs
+                Scheduler.updateAbsoluteDeadlines(self.taskHeap)
+
+            nowMs = Scheduler.getMonotonicMillis()
+            dueTasks: List[Task] = []
+            while self.taskHeap and self.taskHeap[0][0] < nowMs:
+                task = self.__pop()
+                if not task.isCancelled():
+                    dueTasks.append(task)
+
+            for task in dueTasks:
+                # A failing task must not end the dispatcher, all other timers would stop with it
+                try:
+                    latenessMs = max(0, nowMs - task.getDeadlineMs() - 1)
+                    if task.isMissed(latenessMs):
+                        logger.debug("Task %s skipped, %i ms late", task.getFct(), latenessMs)
+                    else:
+                        task.recordRun(latenessMs)
+                        self.__run(task)
+
+                    if task.isReloading() and not task.isCancelled():
+                        task.reload()
+                        self.__push(task)
+                    else:
+                        task.scheduled = False
+                except Exception:
+                    logger.exception("Task %s failed, it is not scheduled anymore", task.getName())
+                    task.scheduled = False
+
+    def __pop(self) -> Task:
+        task = heapq.heappop(self.taskHeap)[2]
+        task.inHeap = False
+        if task.isCancelled():
+            self.cancelledInHeap -= 1
+        return task
 
-        task = asyncio.create_task(fct())
-        self.background_tasks.add(task)
-        task.add_done_callback(self.background_tasks.remove)
+    def __run(self, task: Task) -> None:
+        if task.runningCount > 0:
+            if task.overrunPolicy == OverrunPolicy.SKIP:
+                logger.debug("Task %s still running, run skipped", task.getName())
+                return
+            if task.overrunPolicy == OverrunPolicy.QUEUE:
+                task.runQueued = True
+                return
+        task.runningCount += 1
 
-    async def scheduleEach(self, callback: Callable[[None], None], timePeriodMs: int) -> None:
-        """Adds a new reloading task to the task list."""
         async def fct():
-            while True:
-                await asyncio.sleep(timePeriodMs / 1000)
-                await callback()
+            try:
+                while True:
+                    try:
+                        await task.getFct()()
+                    except Exception:
+                        logger.exception("Task %s failed", task.getName())
 
-        task = asyncio.create_task(fct())
-        self.background_tasks.add(task)
-        task.add_done_callback(self.background_tasks.remove)
+                    # At most one run waits for the previous one
+                    if not task.runQueued or task.isCancelled():
+                        break
+                    task.runQueued = False
+            finally:
+                task.runningCount -= 1
 
-    async def scheduleAtTime(self, callback: Callable[[None], None], startTime: time, reloading: timedelta = None) -> None:
-        """Adds a new time-based task to the task list."""
+        runningTask = asyncio.create_task(fct())
+        self.background_tasks.add(runningTask)
+        runningTask.add_done_callback(self.background_tasks.remove)
 
-    async def scheduleAtDate(self, callback: Callable[[None], None], startDate: datetime, reloading: timedelta = None) -> None:
+    async def cancel(self, task: Task) -> bool:
+        """Cancels a task returned by one of the schedule functions. Returns False if it was not pending anymore."""
+        if not Scheduler.cancelTask(task):
+            return False
+
+        # A task cancelled by its own callback has been popped already
+        if task.inHeap:
+            self.cancelledInHeap = Scheduler.compactHeap(self.taskHeap, self.cancelledInHeap + 1)
+
+        return True
+
+    async def stop(self) -> None:
+        """
+        Cancels the dispatcher and waits for it, callbacks already running are not cancelled.
+        The tasks stay scheduled, the next schedule function starts the dispatcher again.
+        """
+        dispatcher = self.dispatcher
+        self.dispatcher = None
+        if dispatcher is None:
+            return
+
+        dispatcher.cancel()
+        try:
+            await dispatcher
+        except asyncio.CancelledError:
+            # Only the dispatcher was cancelled, not the caller of stop()
+            if asyncio.current_task().cancelling():
+                raise
+
+    async def oneShoot(self, callback: Callable[[None], None], timePeriodMs: int) -> RelMsTask:
+        """Adds a new non-reloading task to the task list. The returned task can be passed to cancel()."""
+        task = RelMsTask(Scheduler.getMonotonicMillis(), timePeriodMs, callback, False)
+        self.__push(task)
+        return task
+
+    async def scheduleEach(self, callback: Callable[[None], None], timePeriodMs: int,
+                           catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                           overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> RelMsTask:
+        """
+        Adds a new reloading fixed-rate task to the task list, the runtime of the callback does not shift the period.
+        overrunPolicy decides about a run which is due while the previous one is still running.
+        """
+        task = RelMsTask(Scheduler.getMonotonicMillis(), timePeriodMs, callback, True, catchUpPolicy)
+        task.setExecution(ExecutionMode.INLINE, overrunPolicy)
+        self.__push(task)
+        return task
+
+    async def scheduleAtTime(self, callback: Callable[[None], None], startTime: time, reloading: timedelta = None,
+                             catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                             overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> AbsTimeTask:
+        """Adds a new time-based task to the task list. A start time already passed today is due immediately."""
+        task = AbsTimeTask(startTime, callback, reloading, catchUpPolicy)
+        task.setExecution(ExecutionMode.INLINE, overrunPolicy)
+        self.__push(task)
+        return task
+
+    async def scheduleAtDate(self, callback: Callable[[None], None], startDate: datetime, reloading: timedelta = None,
+                             catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                             overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> AbsDateTask:
         """Adds a new date-based task to the task list."""
+        task = AbsDateTask(startDate, callback, reloading, catchUpPolicy)
+        task.setExecution(ExecutionMode.INLINE, overrunPolicy)
+        self.__push(task)
+        return task
+
+    async def scheduleCron(self, callback: Callable[[None], None], expression: str, timeZone: Union[tzinfo, str] = None,
+                           catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                           overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> CronTask:
+        """Adds a new task running on a cron schedule like "*/5 * * * 1-5" to the task list."""
+        task = CronTask(CronExpression(expression, timeZone), callback, catchUpPolicy)
+        task.setExecution(ExecutionMode.INLINE, overrunPolicy)
+        self.__push(task)
+        return task
+
+    def timeUntilNextTask(self) -> Optional[int]:
+        """Returns the time in ms until the next task is due, 0 if one is due already and None if there is no task."""
+        while self.taskHeap and self.taskHeap[0][2].isCancelled():
+            self.__pop()
+
+        if not self.taskHeap:
+            return None
+        return max(0, self.taskHeap[0][0] + 1 - Scheduler.getMonotonicMillis())
+
+    def getTaskSize(self) -> int:
+        """Returns the number of scheduled tasks."""
+        return len(self.taskHeap) - self.cancelledInHeap
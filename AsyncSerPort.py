@@ -0,0 +1,100 @@
+# This class provides a serial port as asyncio stream, e.g. frame = await port.readuntil(b'!').
+# A thread blocks on the port and hands received data to the event loop, so frames are delivered as soon as
+# they are complete, without polling.
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+import serial
+
+from PythonLib.SerPort import readAvailable
+
+logger = logging.getLogger('PythonLib.AsyncSerPort')
+
+
+class AsyncSerPort:
+    def __init__(self, serPort: serial.Serial, limit: int = 65536) -> None:
+        """
+        Initialize the AsyncSerPort class.
+
+        Args:
+            serPort (serial.Serial): The opened port, without timeout (see SerPortHw.setup).
+            limit (int, optional): Maximum size of a frame in readuntil (default is 65536).
+        """
+        self.serial = serPort
+        self.limit = limit
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.readerThread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    async def open(self) -> AsyncSerPort:
+        """
+        Start reading, data received before is discarded.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.reader = asyncio.StreamReader(self.limit)
+        self.serial.reset_input_buffer()
+        self.stopped.clear()
+        self.readerThread = threading.Thread(target=self.__readLoop, name="AsyncSerPortReader", daemon=True)
+        self.readerThread.start()
+        return self
+
+    def __readLoop(self) -> None:
+        loop = self.loop
+        reader = self.reader
+        try:
+            while not self.stopped.is_set():
+                inputData = readAvailable(self.serial)
+                if inputData:
+                    logger.debug("AsyncSerPort read %s", inputData)
+                    loop.call_soon_threadsafe(reader.feed_data, inputData)
+        except (serial.SerialException, OSError) as e:
+            if not self.stopped.is_set():
+                logger.exception("AsyncSerPort reader failed")
+                loop.call_soon_threadsafe(reader.set_exception, e)
+                return
+        except RuntimeError:
+            # Event loop already closed
+            return
+        loop.call_soon_threadsafe(reader.feed_eof)
+
+    async def readuntil(self, separator: bytes = b'\n') -> bytes:
+        """
+        Wait for a frame.
+
+        Args:
+            separator (bytes, optional): The end of the frame.
+
+        Returns:
+            bytes: The frame including the separator.
+        """
+        return await self.reader.readuntil(separator)
+
+    async def read(self, n: int = -1) -> bytes:
+        return await self.reader.read(n)
+
+    async def readexactly(self, n: int) -> bytes:
+        return await self.reader.readexactly(n)
+
+    def write(self, data: bytes) -> None:
+        logger.debug("AsyncSerPort write %s", data)
+        self.serial.write(data)
+
+    async def close(self) -> None:
+        """
+        Stop the reader thread, pending reads end with IncompleteReadError.
+        """
+        self.stopped.set()
+        self.serial.cancel_read()
+        if self.readerThread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.readerThread.join)
+            self.readerThread = None
+
+    async def __aenter__(self) -> AsyncSerPort:
+        return await self.open()
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
@@ -0,0 +1,88 @@
+import asyncio
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from PythonLib.TaskQueue import Priority
+
+logger = logging.getLogger('PythonLib.AsyncTaskQueue')
+
+
+class AsyncTaskQueue:
+    """
+    Asyncio counterpart of TaskQueue. Jobs are coroutine functions which are awaited one after another per lane,
+    each lane has its own worker coroutine which sleeps while the lane is empty.
+    """
+
+    def __init__(self, laneCount: int = 1) -> None:
+        """
+        Args:
+            laneCount (int, optional): Number of independent lanes, each lane runs one job at a time.
+        """
+        self.laneCount = laneCount
+        self.sequence = itertools.count()
+
+        # Created on first use, they need a running event loop
+        self.queues: List[asyncio.PriorityQueue] = None
+        self.workers: List[asyncio.Task] = []
+        self.currentJobs: Dict[int, asyncio.Task] = {}
+
+    def __start(self) -> None:
+        if self.queues is None:
+            self.queues = [asyncio.PriorityQueue() for _ in range(self.laneCount)]
+            self.workers = [asyncio.create_task(self.__work(lane)) for lane in range(self.laneCount)]
+
+    async def __work(self, lane: int) -> None:
+        queue = self.queues[lane]
+        while True:
+            _, _, job = await queue.get()
+            try:
+                # job() itself may raise, e.g. if it is no coroutine function
+                runningJob = asyncio.create_task(job())
+                self.currentJobs[lane] = runningJob
+                await runningJob
+            except asyncio.CancelledError:
+                # Only a job cancelled by cancel() is dropped, a cancelled worker (stop(), end of asyncio.run()) ends
+                if asyncio.current_task().cancelling():
+                    raise
+                logger.debug("Job of lane %i cancelled", lane)
+            except Exception:
+                logger.exception("Job of lane %i failed", lane)
+            finally:
+                self.currentJobs.pop(lane, None)
+                queue.task_done()
+
+    async def add(self, job: Callable[[], Awaitable[None]], lane: int = 0, priority: Priority = Priority.NORMAL) -> None:
+        """Adds a coroutine function to a lane."""
+        self.__start()
+        self.queues[lane].put_nowait((priority.value, next(self.sequence), job))
+
+    async def addWait(self, timeMs: int, lane: int = 0, priority: Priority = Priority.NORMAL) -> None:
+        """Adds a pause to a lane, the following jobs of the lane start timeMs later."""
+        await self.add(lambda: asyncio.sleep(timeMs / 1000), lane, priority)
+
+    async def cancel(self, lane: Optional[int] = None) -> None:
+        """Cancels the running job of a lane, or of all lanes if no lane is given."""
+        for runningLane, runningJob in list(self.currentJobs.items()):
+            if lane is None or lane == runningLane:
+                runningJob.cancel()
+
+    async def join(self) -> None:
+        """Waits until all lanes are empty."""
+        if self.queues is not None:
+            for queue in self.queues:
+                await queue.join()
+
+    async def stop(self) -> None:
+        """Cancels the workers, waiting and running jobs are dropped."""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queues = None
+
+    def getTaskSize(self) -> int:
+        """Returns the number of waiting and running jobs of all lanes."""
+        if self.queues is None:
+            return 0
+        return sum(queue.qsize() for queue in self.queues) + len(self.currentJobs)
@@ -0,0 +1,140 @@
+# This class provides cron expressions (minute hour day-of-month month day-of-week) and computes their next fire time.
+# Supported per field: *, numbers, names (JAN-DEC, SUN-SAT), ranges a-b, lists a,b and steps */n, a-b/n, a/n.
+
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import List, Tuple, Union
+from zoneinfo import ZoneInfo
+
+MONTH_NAMES = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+DAY_NAMES = ['SUN', 'MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT']
+
+# Upper bound of the search, an expression like "0 0 30 2 *" never fires
+MAX_SEARCH_DAYS = 366 * 5
+
+
+class CronExpression:
+    def __init__(self, expression: str, timeZone: Union[tzinfo, str] = None) -> None:
+        """
+        Initialize the CronExpression class.
+
+        Args:
+            expression (str): The cron expression with five fields, e.g. "*/5 * * * 1-5".
+            timeZone (Union[tzinfo, str], optional): Time zone the expression is evaluated in, e.g. "Europe/Berlin".
+                Without time zone, naive local time is used like datetime.now().
+        """
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+
+        self.expression = expression
+        self.timeZone = ZoneInfo(timeZone) if isinstance(timeZone, str) else timeZone
+
+        self.minutes = CronExpression.__parseField(fields[0], 0, 59, [])
+        self.hours = CronExpression.__parseField(fields[1], 0, 23, [])
+        self.days = CronExpression.__parseField(fields[2], 1, 31, [])
+        self.months = CronExpression.__parseField(fields[3], 1, 12, MONTH_NAMES)
+        # 0 and 7 are both Sunday
+        self.weekdays = tuple(sorted({day % 7 for day in CronExpression.__parseField(fields[4], 0, 7, DAY_NAMES)}))
+
+        # Like in cron, day of month and day of week are combined with OR if both are restricted
+        self.daysRestricted = not fields[2].startswith('*')
+        self.weekdaysRestricted = not fields[4].startswith('*')
+
+    @staticmethod
+    def __parseValue(value: str, names: List[str], offset: int) -> int:
+        if value.upper() in names:
+            return names.index(value.upper()) + offset
+        return int(value)
+
+    @staticmethod
+    def __parseField(field: str, minimum: int, maximum: int, names: List[str]) -> Tuple[int, ...]:
+        # Month names start with 1, day names with 0
+        offset = minimum if names else 0
+        values = set()
+
+        for part in field.split(','):
+            rangePart, _, stepPart = part.partition('/')
+            step = int(stepPart) if stepPart else 1
+
+            if rangePart == '*':
+                start, end = minimum, maximum
+            elif '-' in rangePart:
+                startStr, endStr = rangePart.split('-')
+                start = CronExpression.__parseValue(startStr, names, offset)
+                end = CronExpression.__parseValue(endStr, names, offset)
+            else:
+                start = CronExpression.__parseValue(rangePart, names, offset)
+                end = maximum if stepPart else start
+
+            if step < 1 or start < minimum or end > maximum or start > end:
+                raise ValueError(f"Invalid cron field: {field}")
+            values.update(range(start, end + 1, step))
+
+        return tuple(sorted(values))
+
+    def __matchesDay(self, date: datetime) -> bool:
+        dayMatches = date.day in self.days
+        # datetime.weekday() is 0 for Monday, cron uses 0 for Sunday
+        weekdayMatches = (date.weekday() + 1) % 7 in self.weekdays
+
+        if self.daysRestricted and self.weekdaysRestricted:
+            return dayMatches or weekdayMatches
+        return dayMatches and weekdayMatches
+
+    def __exists(self, date: datetime) -> bool:
+        """Wall clock times inside a DST gap do not exist, they would not survive a round trip through UTC."""
+        return date.astimezone(timezone.utc).astimezone(self.timeZone).replace(tzinfo=None) == date.replace(tzinfo=None)
+
+    def nextFireTime(self, after: datetime) -> datetime:
+        """
+        Get the first fire time after a given time.
+
+        Args:
+            after (datetime): The reference time, the result is strictly later. Naive times are local time.
+
+        Returns:
+            datetime: The next fire time, aware in the time zone of the expression if one is set.
+        """
+        if self.timeZone is not None:
+            # Naive times are local time, like datetime.now()
+            after = after.astimezone(self.timeZone)
+
+        date = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = date + timedelta(days=MAX_SEARCH_DAYS)
+
+        while date < limit:
+            if date.month not in self.months:
+                # First day of the next month
+                date = (date.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+
+            if not self.__matchesDay(date):
+                date = date.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+
+            if date.hour not in self.hours:
+                nextHours = [hour for hour in self.hours if hour > date.hour]
+                if nextHours:
+                    date = date.replace(hour=nextHours[0], minute=0)
+                else:
+                    date = date.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+
+            if date.minute not in self.minutes:
+                nextMinutes = [minute for minute in self.minutes if minute > date.minute]
+                if nextMinutes:
+                    date = date.replace(minute=nextMinutes[0])
+                else:
+                    date = date.replace(minute=0) + timedelta(hours=1)
+                continue
+
+            if self.timeZone is not None and not self.__exists(date):
+                date = date + timedelta(minutes=1)
+                continue
+
+            return date
+
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+    def __str__(self) -> str:
+        return self.expression
@@ -0,0 +1,193 @@
+# This class provides an in-process MQTT broker together with a client implementing the part of the
+# Paho Client interface used by Mqtt. It allows tests and benchmarks without a real broker.
+
+import logging
+import queue
+import threading
+from typing import Dict, List
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger('PythonLib.FakeMqttBroker')
+
+
+class FakeMqttBroker:
+    def __init__(self) -> None:
+        self.clients: List['FakeMqttClient'] = []
+        self.retained: Dict[str, tuple] = {}
+        self.lock = threading.Lock()
+
+    def register(self, client: 'FakeMqttClient') -> None:
+        with self.lock:
+            if client not in self.clients:
+                self.clients.append(client)
+
+    def unregister(self, client: 'FakeMqttClient') -> None:
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def route(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        """
+        Deliver a message to all connected clients with a matching subscription, wildcards included.
+        """
+        with self.lock:
+            clients = list(self.clients)
+            if retain:
+                self.retained[topic] = (payload, qos)
+
+        for client in clients:
+            client._deliver(topic, payload, qos, False)
+
+    def getRetained(self, subscription: str) -> List[tuple]:
+        with self.lock:
+            return [(topic, payload, qos) for topic, (payload, qos) in self.retained.items()
+                    if mqtt.topic_matches_sub(subscription, topic)]
+
+
+class FakeMqttClient:
+    def __init__(self, broker: FakeMqttBroker, client_id: str = "") -> None:
+        """
+        Initialize the FakeMqttClient class.
+
+        Args:
+            broker (FakeMqttBroker): The broker the client connects to.
+            client_id (str, optional): Name of the client, only used for logging.
+        """
+        self.broker = broker
+        self.clientId = client_id
+        self.on_message = None
+        self.on_connect = None
+        self.on_disconnect = None
+
+        self.subscriptions: Dict[str, int] = {}
+        self.wildcardSubscriptions: List[str] = []
+        self.inbox = queue.Queue()
+        self.connected = False
+        self.mid = 0
+        self.thread: threading.Thread = None
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60) -> int:
+        self.connected = True
+        self.broker.register(self)
+        self.inbox.put(('connect', mqtt.CONNACK_ACCEPTED))
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def disconnect(self) -> int:
+        self.connected = False
+        self.broker.unregister(self)
+        self.inbox.put(('disconnect', mqtt.MQTT_ERR_SUCCESS))
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def dropConnection(self) -> None:
+        """
+        Simulate a broker outage: messages are neither sent nor received until reconnect() is called.
+        """
+        self.connected = False
+        self.broker.unregister(self)
+        self.inbox.put(('disconnect', mqtt.MQTT_ERR_CONN_LOST))
+
+    def reconnect(self) -> int:
+        return self.connect("")
+
+    def enable_logger(self, logger=None) -> None:
+        pass
+
+    def subscribe(self, topic: str, qos: int = 0, options=None, properties=None) -> tuple:
+        self.subscriptions[topic] = qos
+        self.wildcardSubscriptions = [sub for sub in self.subscriptions if '+' in sub or '#' in sub]
+        self.mid += 1
+
+        for retainedTopic, payload, retainedQos in self.broker.getRetained(topic):
+            self._deliver(retainedTopic, payload, min(qos, retainedQos), True)
+
+        return (mqtt.MQTT_ERR_SUCCESS, self.mid)
+
+    def unsubscribe(self, topic: str, properties=None) -> tuple:
+        self.subscriptions.pop(topic, None)
+        self.wildcardSubscriptions = [sub for sub in self.subscriptions if '+' in sub or '#' in sub]
+        self.mid += 1
+        return (mqtt.MQTT_ERR_SUCCESS, self.mid)
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False, properties=None) -> mqtt.MQTTMessageInfo:
+        self.mid += 1
+        info = mqtt.MQTTMessageInfo(self.mid)
+
+        if not self.connected:
+            info.rc = mqtt.MQTT_ERR_NO_CONN
+            return info
+
+        if payload is None:
+            payload = b''
+        elif isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        elif isinstance(payload, (int, float)):
+            payload = str(payload).encode('ascii')
+
+        self.broker.route(topic, bytes(payload), qos, retain)
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+        info._set_as_published()
+        return info
+
+    def _deliver(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        if topic not in self.subscriptions:
+            for subscription in self.wildcardSubscriptions:
+                if mqtt.topic_matches_sub(subscription, topic):
+                    break
+            else:
+                return
+
+        message = mqtt.MQTTMessage(self.mid, topic.encode('utf-8'))
+        message.payload = payload
+        message.qos = qos
+        message.retain = retain
+        self.inbox.put(('message', message))
+
+    def __handle(self, event: tuple) -> None:
+        kind, value = event
+        try:
+            if kind == 'message':
+                if self.on_message:
+                    self.on_message(self, None, value)
+            elif kind == 'connect':
+                if self.on_connect:
+                    self.on_connect(self, None, {}, value)
+            elif self.on_disconnect:
+                self.on_disconnect(self, None, value)
+        except BaseException:
+            logger.exception("Callback of %s failed", self.clientId)
+
+    def loop(self, timeout: float = 1.0) -> int:
+        """
+        Process all pending events in the calling thread, like Client.loop() without network.
+        """
+        try:
+            self.__handle(self.inbox.get(timeout=timeout))
+            while True:
+                self.__handle(self.inbox.get_nowait())
+        except queue.Empty:
+            pass
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_start(self) -> int:
+        if self.thread is not None:
+            return mqtt.MQTT_ERR_INVAL
+
+        def fct():
+            while True:
+                event = self.inbox.get()
+                if event is None:
+                    break
+                self.__handle(event)
+
+        self.thread = threading.Thread(target=fct, name=f"FakeMqttClient-{self.clientId}", daemon=True)
+        self.thread.start()
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force: bool = False) -> int:
+        if self.thread is None:
+            return mqtt.MQTT_ERR_INVAL
+
+        self.inbox.put(None)
+        self.thread.join()
+        self.thread = None
+        return mqtt.MQTT_ERR_SUCCESS
@@ -0,0 +1,52 @@
+from bisect import bisect_left
+from typing import Tuple
+
+# This class provides a fixed-bucket histogram, e.g. for durations in ms.
+
+
+class Histogram:
+    DEFAULT_BOUNDS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'maximum')
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BOUNDS) -> None:
+        """
+        Initialize the Histogram class.
+
+        Args:
+            bounds (Tuple[float, ...], optional): Sorted upper bounds of the buckets, a last bucket catches everything above.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def getCount(self) -> int:
+        return self.count
+
+    def getMean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def asDict(self) -> dict:
+        """
+        Export the histogram.
+
+        Returns:
+            dict: Count, sum, mean and max plus the bucket counts keyed by their upper bound ('inf' for the last one).
+        """
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets['inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.getMean(),
+            'max': self.maximum,
+            'buckets': buckets
+        }
@@ -1,8 +1,14 @@
 from __future__ import annotations
 import logging
+from pathlib import Path
+from typing import Dict, Hashable, List, Tuple
 from influxdb import InfluxDBClient
 
+from PythonLib.InfluxLineProtocol import LineProtocolEncoder, writeLines
+from PythonLib.InfluxQuery import QuerySeries, queryColumnar
+from PythonLib.InfluxWriteBuffer import InfluxWriteBuffer
 from PythonLib.Scheduler import Scheduler
+from PythonLib.Spool import Spool, SyncPolicy
 
 logger = logging.getLogger('Influx')
 
@@ -29,12 +35,121 @@ class RetentionPolicy:
         return self.retentionStr
 
 
+class ChangeTracker:
+    """
+    Last written value per series field, keyed by (measurement, tags, field).
+    Entries not written for ttlMs are evicted, the next value of such a field counts as a change.
+    """
+
+    def __init__(self, ttlMs: int = 3600000) -> None:
+        self.ttlMs = ttlMs
+        # key -> (last written value, time of the write)
+        self.entries: Dict[Tuple[str, Hashable, str], Tuple[object, int]] = {}
+        self.lastEvictionMs = Scheduler.getMillis()
+
+    @staticmethod
+    def __isChanged(lastValue: object, value: object, deadband: float, deadbandPercent: float) -> bool:
+        numeric = type(value) in (int, float) and type(lastValue) in (int, float)
+        if not numeric or (deadband is None and deadbandPercent is None):
+            return lastValue != value
+
+        difference = abs(value - lastValue)
+        if deadband is not None and difference <= deadband:
+            return False
+        if deadbandPercent is not None and difference <= abs(lastValue) * deadbandPercent / 100:
+            return False
+        return difference > 0
+
+    def __evict(self, nowMs: int) -> None:
+        if nowMs - self.lastEvictionMs < self.ttlMs:
+            return
+        self.lastEvictionMs = nowMs
+        self.entries = {key: entry for key, entry in self.entries.items() if nowMs - entry[1] <= self.ttlMs}
+
+    def filter(self, measurement: str, fields: dict, tags: dict = None, forceUpdateMs: int = 60000,
+               deadband: float = None, deadbandPercent: float = None) -> dict:
+        """
+        Get the fields which have to be written and remember them as written.
+
+        Args:
+            measurement (str): The measurement name.
+            fields (dict): The current field values.
+            tags (dict, optional): The tags, fields of different tag sets are tracked separately.
+            forceUpdateMs (int, optional): Unchanged fields are written again after this time.
+            deadband (float, optional): Numeric values count as changed only if they differ more than this
+                from the last written value.
+            deadbandPercent (float, optional): Like deadband, relative to the last written value in percent.
+
+        Returns:
+            dict: The fields to write.
+        """
+        nowMs = Scheduler.getMillis()
+        self.__evict(nowMs)
+
+        tagKey = tuple(sorted(tags.items())) if tags else None
+        dictToWrite = {}
+        for field, value in fields.items():
+            key = (measurement, tagKey, field)
+            entry = self.entries.get(key)
+
+            if entry is None or nowMs - entry[1] > forceUpdateMs or \
+                    ChangeTracker.__isChanged(entry[0], value, deadband, deadbandPercent):
+                self.entries[key] = (value, nowMs)
+                dictToWrite[field] = value
+
+        return dictToWrite
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
 class Influx:
-    def __init__(self, host: str, database: str) -> None:
+    def __init__(self, host: str, database: str, compressLevel: int = None) -> None:
+        """
+        Args:
+            host (str): Host name of the InfluxDB server.
+            database (str): The database to write to.
+            compressLevel (int, optional): If set, writes are sent gzip compressed with this level (1 fastest - 9 smallest).
+        """
         self.client = InfluxDBClient(host=host, port=8086, database=database)
         self.database = database
-        self.onChangeDict = {}
-        self.onChangeDictStartTime = {}
+        self.compressLevel = compressLevel
+        self.changeTracker = ChangeTracker()
+        self.writeBuffer: InfluxWriteBuffer = None
+
+    def enableWriteBuffer(self, batchSize: int = 5000, flushIntervalMs: int = 1000, capacity: int = 100000,
+                          maxRetries: int = 5, walDirectory: Path = None, walMaxSizeBytes: int = 256 * 1024 * 1024,
+                          syncPolicy: SyncPolicy = SyncPolicy.INTERVAL) -> InfluxWriteBuffer:
+        """
+        Buffer written points and send them in batches on a background thread instead of one request per write.
+
+        Args:
+            batchSize (int, optional): A batch is written as soon as this many points are buffered (default is 5000).
+            flushIntervalMs (int, optional): Maximum time a point waits in the buffer (default is 1000).
+            capacity (int, optional): Maximum number of buffered points, the oldest ones are dropped if exceeded (default is 100000).
+            maxRetries (int, optional): Retries with exponential backoff before a batch is given up (default is 5).
+            walDirectory (Path, optional): If set, points which cannot be written are kept in a write-ahead spool
+                in this directory and replayed once the server is reachable again, instead of being retried.
+            walMaxSizeBytes (int, optional): Size cap of the spool, the oldest points are dropped if exceeded (default is 256 MiB).
+            syncPolicy (SyncPolicy, optional): When spooled points are forced to disk (default is INTERVAL).
+        """
+        spool = None
+        if walDirectory is not None:
+            spool = Spool(walDirectory, maxSizeBytes=walMaxSizeBytes, syncPolicy=syncPolicy)
+
+        self.writeBuffer = InfluxWriteBuffer(self.client, self.database, batchSize, flushIntervalMs, capacity, maxRetries,
+                                             compressLevel=self.compressLevel, spool=spool)
+        return self.writeBuffer
+
+    def flush(self) -> Influx:
+        if self.writeBuffer is not None:
+            self.writeBuffer.flush()
+        return self
+
+    def close(self) -> None:
+        if self.writeBuffer is not None:
+            self.writeBuffer.close()
+        self.client.close()
 
     def createRetentionPolicy(self, retentionStr: str) -> RetentionPolicy:
         return RetentionPolicy(self.client, retentionStr)
@@ -45,40 +160,36 @@ class Influx:
     def deleteDatabase(self) -> Influx:
         self.client.drop_database(self.database)
 
-    def write(self, measurement: str, fields: dict, retentionPolicy: str = None) -> Influx:
+    def write(self, measurement: str, fields: dict, retentionPolicy: str = None, tags: dict = None,
+              timeNs: int = None) -> Influx:
+
+        if self.writeBuffer is not None:
+            self.writeBuffer.add(measurement, fields, tags, retentionPolicy, timeNs)
+            return self
 
         try:
             if len(fields) != 0:
-                json_body = [
-                    {
-                        "measurement": measurement,
-                        "tags": {
-                        },
-                        "fields": fields
-                    }
-                ]
-
-                self.client.write_points(json_body, retention_policy=retentionPolicy)
+                encoder = LineProtocolEncoder()
+                encoder.add(measurement, fields, tags, timeNs)
+                writeLines(self.client, self.database, encoder.getBody(self.compressLevel), retentionPolicy,
+                           self.compressLevel is not None)
         except BaseException:
             logging.exception('_1_')
 
         return self
 
-    def writeOnChange(self, measurement: str, fields: dict, forceUpdateMs: int = 60000, retentionPolicy: str = None) -> Influx:
-        dictToWrite = {}
-        for topic, payload in fields.items():
-
-            if self.onChangeDict.get(topic) != payload:
-                # Payload changed, write
-                self.onChangeDict[topic] = payload
-                self.onChangeDictStartTime[topic] = Scheduler.getMillis()
-                dictToWrite[topic] = payload
-            else:
-                # Payload not changed, but perhaps timeout is over
-                if Scheduler.getMillis() - self.onChangeDictStartTime.get(topic, 0) > forceUpdateMs:
-                    # timeout is over
-                    self.onChangeDict[topic] = payload
-                    self.onChangeDictStartTime[topic] = Scheduler.getMillis()
-                    dictToWrite[topic] = payload
-
-        return self.write(measurement, dictToWrite, retentionPolicy=retentionPolicy)
+    def query(self, query: str, chunkSize: int = 10000, retentionPolicy: str = None) -> List[QuerySeries]:
+        """
+        Run a query, the response is streamed in chunks into columnar arrays (see QuerySeries).
+        Exceptions of the client (e.g. InfluxDBClientError for invalid queries) are passed on.
+        """
+        return queryColumnar(self.client, self.database, query, chunkSize, retentionPolicy)
+
+    def writeOnChange(self, measurement: str, fields: dict, forceUpdateMs: int = 60000, retentionPolicy: str = None,
+                      tags: dict = None, deadband: float = None, deadbandPercent: float = None) -> Influx:
+        """
+        Write only the fields which changed since they were written last, or which were not written for forceUpdateMs.
+        Numeric fields may ignore changes within deadband (absolute) or deadbandPercent (relative to the last written value).
+        """
+        dictToWrite = self.changeTracker.filter(measurement, fields, tags, forceUpdateMs, deadband, deadbandPercent)
+        return self.write(measurement, dictToWrite, retentionPolicy=retentionPolicy, tags=tags)
@@ -0,0 +1,189 @@
+# This class downsamples points before they are written to Influx.
+# Per series (measurement + tags) and window only count, sum, min, max and last of each field are kept,
+# when the window is over one point with the configured aggregates is written, stamped with the window start.
+
+from __future__ import annotations
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Dict, Hashable, List, Tuple
+
+from PythonLib.Influx import Influx
+
+logger = logging.getLogger('PythonLib.InfluxAggregator')
+
+
+class Aggregate(Enum):
+    """Aggregates of a field, the value is the suffix of the written field name, e.g. temperature_mean."""
+    MEAN = 'mean'
+    MIN = 'min'
+    MAX = 'max'
+    LAST = 'last'
+    COUNT = 'count'
+
+
+DEFAULT_AGGREGATES = (Aggregate.MEAN, Aggregate.MIN, Aggregate.MAX)
+
+# Indexes of the per field state
+COUNT = 0
+SUM = 1
+MIN = 2
+MAX = 3
+LAST = 4
+
+
+class AggregationRule:
+    __slots__ = ('windowMs', 'aggregates', 'retentionPolicy', 'rawRetentionPolicy')
+
+    def __init__(self, windowMs: int, aggregates: Tuple[Aggregate, ...], retentionPolicy: str,
+                 rawRetentionPolicy: str) -> None:
+        self.windowMs = windowMs
+        self.aggregates = aggregates
+        self.retentionPolicy = retentionPolicy
+        self.rawRetentionPolicy = rawRetentionPolicy
+
+
+class SeriesWindow:
+    __slots__ = ('key', 'measurement', 'tags', 'rule', 'startMs', 'fields')
+
+    def __init__(self, key: Tuple[str, Hashable], measurement: str, tags: dict, rule: AggregationRule,
+                 startMs: int) -> None:
+        self.key = key
+        self.measurement = measurement
+        self.tags = tags
+        self.rule = rule
+        self.startMs = startMs
+        # field -> [count, sum, min, max, last], sum/min/max stay None for non-numeric fields
+        self.fields: Dict[str, list] = {}
+
+    def add(self, fields: dict) -> None:
+        for field, value in fields.items():
+            state = self.fields.get(field)
+            numeric = type(value) in (int, float)
+            if state is None:
+                self.fields[field] = [1, value, value, value, value] if numeric else [1, None, None, None, value]
+                continue
+
+            state[COUNT] += 1
+            state[LAST] = value
+            if numeric and state[SUM] is not None:
+                state[SUM] += value
+                if value < state[MIN]:
+                    state[MIN] = value
+                if value > state[MAX]:
+                    state[MAX] = value
+
+    def getFields(self) -> dict:
+        """Returns the aggregates of the window as fields, numeric aggregates are left out for non-numeric fields."""
+        result = {}
+        for field, state in self.fields.items():
+            for aggregate in self.rule.aggregates:
+                if aggregate == Aggregate.COUNT:
+                    value = state[COUNT]
+                elif aggregate == Aggregate.LAST:
+                    value = state[LAST]
+                elif state[SUM] is None:
+                    continue
+                elif aggregate == Aggregate.MEAN:
+                    value = state[SUM] / state[COUNT]
+                elif aggregate == Aggregate.MIN:
+                    value = state[MIN]
+                else:
+                    value = state[MAX]
+                result[f'{field}_{aggregate.value}'] = value
+        return result
+
+
+class InfluxAggregator:
+    def __init__(self, influx: Influx) -> None:
+        """
+        Initialize the InfluxAggregator class. Points of measurements without rule are passed through unchanged.
+
+        Args:
+            influx (Influx): The writer of the raw and aggregated points.
+        """
+        self.influx = influx
+        self.rules: Dict[str, AggregationRule] = {}
+        self.windows: Dict[Tuple[str, Hashable], SeriesWindow] = {}
+        # write() and loop() may be called from different threads
+        self.lock = threading.Lock()
+
+        self.emittedCount = 0
+
+    def configure(self, measurement: str, windowMs: int, aggregates: Tuple[Aggregate, ...] = DEFAULT_AGGREGATES,
+                  retentionPolicy: str = None, rawRetentionPolicy: str = None) -> InfluxAggregator:
+        """
+        Aggregate a measurement.
+
+        Args:
+            measurement (str): The measurement name.
+            windowMs (int): Length of the windows, aligned to the epoch (e.g. 60000 for full minutes).
+            aggregates (Tuple[Aggregate, ...], optional): Aggregates written per field (default is mean, min, max).
+            retentionPolicy (str, optional): Retention policy of the aggregated points.
+            rawRetentionPolicy (str, optional): If set, the raw points are written to this retention policy as well.
+        """
+        self.rules[measurement] = AggregationRule(windowMs, tuple(aggregates), retentionPolicy, rawRetentionPolicy)
+        return self
+
+    def write(self, measurement: str, fields: dict, retentionPolicy: str = None, tags: dict = None,
+              timeNs: int = None) -> InfluxAggregator:
+        """Same parameters as Influx.write, retentionPolicy is only used for measurements without rule."""
+        rule = self.rules.get(measurement)
+        if rule is None:
+            self.influx.write(measurement, fields, retentionPolicy, tags, timeNs)
+            return self
+
+        if timeNs is None:
+            timeNs = time.time_ns()
+        if rule.rawRetentionPolicy is not None:
+            self.influx.write(measurement, fields, rule.rawRetentionPolicy, tags, timeNs)
+
+        timeMs = timeNs // 1000000
+        startMs = timeMs - timeMs % rule.windowMs
+        key = (measurement, tuple(sorted(tags.items())) if tags else None)
+
+        finished = None
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or window.startMs < startMs:
+                finished = window
+                window = self.windows[key] = SeriesWindow(key, measurement, tags, rule, startMs)
+            # Late samples of an already written window are counted in the current one
+            window.add(fields)
+
+        if finished is not None:
+            self.__emit(finished)
+        return self
+
+    def __emit(self, window: SeriesWindow) -> None:
+        self.influx.write(window.measurement, window.getFields(), window.rule.retentionPolicy, window.tags,
+                          window.startMs * 1000000)
+        self.emittedCount += 1
+
+    def loop(self) -> None:
+        """Writes windows which are over, also if no newer sample arrived. Has to be called periodically."""
+        nowMs = time.time_ns() // 1000000
+        with self.lock:
+            finished: List[SeriesWindow] = [window for window in self.windows.values()
+                                            if window.startMs + window.rule.windowMs <= nowMs]
+            for window in finished:
+                del self.windows[window.key]
+
+        for window in finished:
+            self.__emit(window)
+
+    def flush(self) -> None:
+        """Writes all windows, including the running ones."""
+        with self.lock:
+            finished = list(self.windows.values())
+            self.windows.clear()
+
+        for window in finished:
+            self.__emit(window)
+
+    def getSeriesCount(self) -> int:
+        return len(self.windows)
+
+    def getEmittedCount(self) -> int:
+        return self.emittedCount
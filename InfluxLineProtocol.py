@@ -0,0 +1,141 @@
+# This class encodes points directly into InfluxDB line protocol, without the intermediate JSON body of influxdb-python.
+# Escaping follows influxdb.line_protocol, so the written data is the same as with InfluxDBClient.write_points.
+# https://docs.influxdata.com/influxdb/v1/write_protocols/line_protocol_reference/
+
+import gzip
+from typing import Dict, Optional
+
+from influxdb import InfluxDBClient
+
+# Measurement, tag keys, tag values and field keys
+KEY_ESCAPES = str.maketrans({'\\': '\\\\', ' ': '\\ ', ',': '\\,', '=': '\\=', '\n': '\\n'})
+# String field values
+STRING_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n'})
+
+# Escaped names are cached for all encoders, there are usually only a few distinct ones
+MAX_CACHE_SIZE = 10000
+escapeCache: Dict[str, str] = {}
+
+
+def escapeKey(key: str) -> str:
+    if type(key) is not str:
+        # Not cached, True and 1 (False and 0) are equal dict keys and would get each other's encoding
+        return str(key).translate(KEY_ESCAPES)
+
+    escaped = escapeCache.get(key)
+    if escaped is None:
+        if len(escapeCache) >= MAX_CACHE_SIZE:
+            escapeCache.clear()
+        escaped = escapeCache[key] = key.translate(KEY_ESCAPES)
+    return escaped
+
+
+class LineProtocolEncoder:
+    def __init__(self) -> None:
+        # Reused for every batch, clear() keeps the allocated memory
+        self.buffer = bytearray()
+        self.pointCount = 0
+
+    @staticmethod
+    def __encodeValue(value: object) -> Optional[str]:
+        # Exact type checks first, they cover nearly all values and keep bool apart from int
+        valueType = type(value)
+        if valueType is float:
+            return repr(value)
+        if valueType is bool:
+            return str(value)
+        if valueType is int:
+            return f'{value}i'
+        if valueType is str:
+            return '"' + value.translate(STRING_ESCAPES) + '"'
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return '"' + value.decode('utf-8').translate(STRING_ESCAPES) + '"'
+        return repr(float(value))
+
+    def add(self, measurement: str, fields: dict, tags: dict = None, timeNs: int = None) -> None:
+        """
+        Append one point to the buffer.
+
+        Args:
+            measurement (str): The measurement name.
+            fields (dict): The field values, None values are left out.
+            tags (dict, optional): The tags, sorted as recommended by InfluxDB. Empty keys or values are left out.
+            timeNs (int, optional): Timestamp in ns since epoch, the server time is used if not given.
+        """
+        encodeValue = LineProtocolEncoder.__encodeValue
+
+        line = escapeKey(measurement)
+        if tags:
+            for key in sorted(tags):
+                value = tags[key]
+                if key != '' and value is not None and value != '':
+                    line += ',' + escapeKey(key) + '=' + escapeKey(value)
+
+        separator = ' '
+        for key, value in fields.items():
+            encoded = encodeValue(value)
+            if encoded is not None and key != '':
+                line += separator + escapeKey(key) + '=' + encoded
+                separator = ','
+
+        if separator == ' ':
+            # No field left, InfluxDB rejects points without fields
+            return
+
+        if timeNs is not None:
+            line += f' {timeNs}'
+
+        self.buffer += line.encode('utf-8')
+        self.buffer += b'\n'
+        self.pointCount += 1
+
+    def getBody(self, compressLevel: int = None) -> bytes:
+        """
+        Get the encoded points.
+
+        Args:
+            compressLevel (int, optional): If set, the body is gzip compressed with this level (1 fastest - 9 smallest).
+
+        Returns:
+            bytes: The request body for the write endpoint.
+        """
+        if compressLevel is None:
+            return bytes(self.buffer)
+        return LineProtocolEncoder.compress(self.buffer, compressLevel)
+
+    @staticmethod
+    def compress(body: bytes, compressLevel: int) -> bytes:
+        return gzip.compress(body, compressLevel)
+
+    def clear(self) -> None:
+        self.buffer.clear()
+        self.pointCount = 0
+
+    def __len__(self) -> int:
+        return self.pointCount
+
+
+def writeLines(client: InfluxDBClient, database: str, body: bytes, retentionPolicy: str = None,
+               compressed: bool = False) -> None:
+    """
+    Send a line protocol body to the write endpoint, timestamps in ns.
+
+    Args:
+        client (InfluxDBClient): The client, a client created with gzip=True compresses the body itself.
+        database (str): The database to write to.
+        body (bytes): The body from LineProtocolEncoder.getBody().
+        retentionPolicy (str, optional): The retention policy to write to.
+        compressed (bool, optional): True if the body is gzip compressed already.
+    """
+    # User and password are added by request() itself
+    headers = {'Content-Type': 'application/octet-stream'}
+    if compressed:
+        headers['Content-Encoding'] = 'gzip'
+
+    params = {'db': database, 'precision': 'n'}
+    if retentionPolicy is not None:
+        params['rp'] = retentionPolicy
+
+    client.request('write', 'POST', params=params, data=body, expected_response_code=204, headers=headers)
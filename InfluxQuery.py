@@ -0,0 +1,149 @@
+# Streaming query of Influx with columnar results.
+# The response is requested in chunks and each chunk is appended to typed arrays right away,
+# so neither the whole response nor one dict per point is ever held in memory.
+
+import json
+import math
+from array import array
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+from influxdb import InfluxDBClient
+from influxdb.exceptions import InfluxDBClientError
+
+Column = Union[array, list]
+
+
+class QuerySeries:
+    """
+    One series of a query result. Timestamps are int64 ns, numeric columns float64 (NaN if missing), others lists.
+    Results without time column (e.g. SHOW MEASUREMENTS, SHOW TAG KEYS) have no time axis, time stays empty.
+    """
+
+    def __init__(self, name: str, tags: Optional[dict], columns: List[str]) -> None:
+        self.name = name
+        self.tags = tags or {}
+        self.hasTime = 'time' in columns
+        self.time = array('q')
+        # Typed on the first non-null value of each column
+        self.columns: Dict[str, Optional[Column]] = {column: None for column in columns if column != 'time'}
+        self.length = 0
+
+    @staticmethod
+    def __createColumn(value: object, length: int) -> Column:
+        if type(value) in (int, float):
+            return array('d', [math.nan]) * length
+        return [None] * length
+
+    def append(self, columnNames: List[str], values: List[list]) -> None:
+        timeIndex = columnNames.index('time') if 'time' in columnNames else None
+        if timeIndex is not None:
+            self.time.extend([row[timeIndex] for row in values])
+
+        for index, columnName in enumerate(columnNames):
+            if index == timeIndex:
+                continue
+            columnValues = [row[index] for row in values]
+            column = self.columns.get(columnName)
+
+            if column is None:
+                firstValue = next((value for value in columnValues if value is not None), None)
+                if firstValue is None:
+                    # Still nothing known about the type
+                    self.columns[columnName] = None
+                    continue
+                column = self.columns[columnName] = QuerySeries.__createColumn(firstValue, self.length)
+
+            if isinstance(column, array):
+                if all(value is None or type(value) in (int, float) for value in columnValues):
+                    column.extend([math.nan if value is None else value for value in columnValues])
+                    continue
+                # Mixed types, fall back to a list
+                column = self.columns[columnName] = [None if math.isnan(value) else value for value in column]
+            column.extend(columnValues)
+
+        self.length += len(values)
+
+        # Columns without any value so far, or missing in this chunk, keep the same length as the series
+        for columnName, column in self.columns.items():
+            if column is not None and len(column) < self.length:
+                missing = self.length - len(column)
+                column.extend(array('d', [math.nan]) * missing if isinstance(column, array) else [None] * missing)
+
+    def getColumn(self, columnName: str) -> Column:
+        column = self.columns[columnName]
+        if column is None:
+            return [None] * self.length
+        return column
+
+    def toNumpy(self) -> dict:
+        """
+        Get the columns as numpy arrays, numeric columns and the time without copying. Needs numpy.
+
+        Returns:
+            dict: 'time' as datetime64[ns] if the series has a time axis, plus one array per column.
+        """
+        import numpy
+
+        result = {}
+        if self.hasTime:
+            result['time'] = numpy.frombuffer(self.time, dtype=numpy.int64).view('datetime64[ns]')
+        for columnName in self.columns:
+            column = self.getColumn(columnName)
+            if isinstance(column, array):
+                result[columnName] = numpy.frombuffer(column, dtype=numpy.float64)
+            else:
+                result[columnName] = numpy.array(column, dtype=object)
+        return result
+
+    def __len__(self) -> int:
+        return self.length
+
+
+def queryColumnar(client: InfluxDBClient, database: str, query: str, chunkSize: int = 10000,
+                  retentionPolicy: str = None) -> List[QuerySeries]:
+    """
+    Run a query with a chunked response.
+
+    Args:
+        client (InfluxDBClient): The client.
+        database (str): The database to query.
+        query (str): The InfluxQL query.
+        chunkSize (int, optional): Points per chunk of the response (default is 10000).
+        retentionPolicy (str, optional): The retention policy of measurements without explicit one.
+
+    Returns:
+        List[QuerySeries]: The series in the order they appear in the response.
+    """
+    params = {'q': query, 'db': database, 'epoch': 'ns', 'chunked': 'true', 'chunk_size': chunkSize}
+    if retentionPolicy is not None:
+        params['rp'] = retentionPolicy
+
+    # The default of the client is msgpack, which the client reads completely instead of streaming.
+    # User and password are added by request() itself
+    response = client.request('query', 'POST', params=params, stream=True, expected_response_code=200,
+                              headers={'Accept': 'application/json'})
+    seriesByKey: Dict[Tuple[int, str, Hashable], QuerySeries] = {}
+
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if 'error' in chunk:
+                raise InfluxDBClientError(chunk['error'])
+
+            for result in chunk.get('results', []):
+                if 'error' in result:
+                    raise InfluxDBClientError(result['error'])
+
+                for series in result.get('series', []):
+                    tags = series.get('tags')
+                    key = (result.get('statement_id', 0), series['name'], tuple(sorted(tags.items())) if tags else None)
+                    querySeries = seriesByKey.get(key)
+                    if querySeries is None:
+                        querySeries = seriesByKey[key] = QuerySeries(series['name'], tags, series['columns'])
+                    querySeries.append(series['columns'], series.get('values', []))
+    finally:
+        response.close()
+
+    return list(seriesByKey.values())
@@ -0,0 +1,322 @@
+# This class buffers Influx points and writes them in batches on a background thread.
+# Timestamps are taken when a point is added, so batching does not shift the data in time.
+# With a Spool, batches which cannot be written are kept on disk and replayed once the server is back.
+
+import collections
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from influxdb import InfluxDBClient
+from influxdb.exceptions import InfluxDBClientError
+
+from PythonLib.InfluxLineProtocol import LineProtocolEncoder, writeLines
+from PythonLib.Spool import Spool
+
+logger = logging.getLogger('PythonLib.InfluxWriteBuffer')
+
+
+class BufferedPoint(NamedTuple):
+    measurement: str
+    tags: Optional[dict]
+    fields: dict
+    timeNs: int
+    retentionPolicy: Optional[str]
+    # time.monotonic() when the point was added, the flush interval is counted from here, not from timeNs
+    addedTime: float
+
+
+class InfluxWriteBuffer:
+    def __init__(self, client: InfluxDBClient, database: str, batchSize: int = 5000, flushIntervalMs: int = 1000,
+                 capacity: int = 100000, maxRetries: int = 5, retryDelayMs: int = 500,
+                 maxRetryDelayMs: int = 30000, compressLevel: int = None, spool: Spool = None,
+                 replayBatchSize: int = 20000) -> None:
+        """
+        Initialize the InfluxWriteBuffer class.
+
+        Args:
+            client (InfluxDBClient): The client used for writing.
+            database (str): The database to write to.
+            batchSize (int, optional): A batch is written as soon as this many points are buffered (default is 5000).
+            flushIntervalMs (int, optional): Maximum time a point waits in the buffer (default is 1000).
+            capacity (int, optional): Maximum number of buffered points, the oldest ones are dropped if exceeded (default is 100000).
+            maxRetries (int, optional): Retries of a failed batch before it is given up (default is 5).
+            retryDelayMs (int, optional): Delay before the first retry, doubled for each further retry (default is 500).
+            maxRetryDelayMs (int, optional): Upper limit of the retry delay (default is 30000).
+            compressLevel (int, optional): If set, batches are sent gzip compressed with this level.
+            spool (Spool, optional): Write-ahead spool for batches which could not be written. Failed batches go there
+                without retries, and while it holds points all new batches go there too, so the order is kept.
+                A spool left over from a previous run is replayed as well.
+            replayBatchSize (int, optional): Maximum number of spooled points written per request (default is 20000).
+        """
+        self.client = client
+        self.database = database
+        self.compressLevel = compressLevel
+        self.encoder = LineProtocolEncoder()
+        self.batchSize = batchSize
+        self.flushIntervalMs = flushIntervalMs
+        self.maxRetries = maxRetries
+        self.retryDelayMs = retryDelayMs
+        self.maxRetryDelayMs = maxRetryDelayMs
+
+        self.spool = spool
+        self.replayBatchSize = replayBatchSize
+        self.replayFailures = 0
+        self.nextReplayTime = time.monotonic()
+        self.replayedCount = 0
+        self.spooledCount = 0
+        self.oldestSpooledNs: Optional[int] = None
+
+        self.buffer: collections.deque = collections.deque(maxlen=capacity)
+        # Serializes sending, so batches are written in the order the points were added
+        self.sendLock = threading.Lock()
+
+        self.droppedCount = 0
+        self.writtenCount = 0
+        self.batchCount = 0
+        self.retryCount = 0
+        self.failedCount = 0
+        self.lastBatchMs = 0.0
+        self.startTime = time.monotonic()
+
+        self.closed = False
+        self.wakeup = threading.Event()
+        self.flusherThread = threading.Thread(target=self.__flushLoop, name="InfluxWriteBuffer", daemon=True)
+        self.flusherThread.start()
+
+    def add(self, measurement: str, fields: dict, tags: dict = None, retentionPolicy: str = None,
+            timeNs: int = None) -> None:
+        """
+        Add a point, it is written by the background thread.
+
+        Args:
+            measurement (str): The measurement name.
+            fields (dict): The field values.
+            tags (dict, optional): The tags of the point.
+            retentionPolicy (str, optional): The retention policy to write to.
+            timeNs (int, optional): Timestamp in ns since epoch, the current time if not given.
+        """
+        if not fields:
+            return
+        if timeNs is None:
+            timeNs = time.time_ns()
+
+        if len(self.buffer) == self.buffer.maxlen:
+            self.droppedCount += 1
+        self.buffer.append(BufferedPoint(measurement, tags, fields, timeNs, retentionPolicy, time.monotonic()))
+
+        if len(self.buffer) >= self.batchSize:
+            self.wakeup.set()
+
+    def __flushLoop(self) -> None:
+        while not self.closed:
+            timeout = self.flushIntervalMs / 1000
+            if self.buffer:
+                # Sleep until the oldest point reaches its maximum age
+                ageS = time.monotonic() - self.buffer[0].addedTime
+                timeout = max(0.0, timeout - ageS)
+            if self.spool is not None and self.spool.getPendingCount():
+                timeout = min(timeout, max(0.0, self.nextReplayTime - time.monotonic()))
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+            if self.closed:
+                break
+            self.__flushDue()
+            self.__replaySpool()
+
+    def __isDue(self) -> bool:
+        """A batch is due if it is full or its oldest point waits for the flush interval already."""
+        if len(self.buffer) >= self.batchSize:
+            return True
+        return bool(self.buffer) and (time.monotonic() - self.buffer[0].addedTime) * 1000 >= self.flushIntervalMs
+
+    def __flushDue(self) -> None:
+        with self.sendLock:
+            while self.__isDue():
+                self.__sendBatch(self._takeBatch())
+
+    def _takeBatch(self) -> List[BufferedPoint]:
+        batch = []
+        while self.buffer and len(batch) < self.batchSize:
+            batch.append(self.buffer.popleft())
+        return batch
+
+    def __encode(self, batch: List[BufferedPoint]) -> Dict[Optional[str], bytes]:
+        """Encodes a batch as line protocol, one body per retention policy."""
+        pointsByPolicy: Dict[Optional[str], List[BufferedPoint]] = {}
+        for point in batch:
+            pointsByPolicy.setdefault(point.retentionPolicy, []).append(point)
+
+        encoder = self.encoder
+        bodies = {}
+        for retentionPolicy, points in pointsByPolicy.items():
+            encoder.clear()
+            for point in points:
+                encoder.add(point.measurement, point.fields, point.tags, point.timeNs)
+            bodies[retentionPolicy] = encoder.getBody()
+        return bodies
+
+    def __writeBodies(self, bodies: Dict[Optional[str], bytes]) -> None:
+        for retentionPolicy, body in bodies.items():
+            compressed = self.compressLevel is not None
+            if compressed:
+                body = LineProtocolEncoder.compress(body, self.compressLevel)
+            writeLines(self.client, self.database, body, retentionPolicy, compressed)
+
+    def _writeBatch(self, batch: List[BufferedPoint]) -> None:
+        """Writes a batch, grouped by retention policy. Raises the exception of the client if writing failed."""
+        self.__writeBodies(self.__encode(batch))
+
+    def __spoolBatch(self, batch: List[BufferedPoint]) -> None:
+        """Appends a batch to the spool, one record [retention policy, line] per point."""
+        records = []
+        for retentionPolicy, body in self.__encode(batch).items():
+            # Not splitlines(), it splits at \r and other characters line protocol does not escape
+            for line in body.decode('utf-8').split('\n'):
+                if not line:
+                    continue
+                records.append(json.dumps([retentionPolicy, line], ensure_ascii=False).encode('utf-8'))
+        self.spool.appendMany(records)
+        self.spooledCount += len(records)
+        if self.oldestSpooledNs is None:
+            self.oldestSpooledNs = batch[0].timeNs
+
+    def __replaySpool(self) -> None:
+        """Writes spooled points in large batches, oldest first. Failures are retried with backoff."""
+        if self.spool is None:
+            return
+
+        with self.sendLock:
+            while self.spool.getPendingCount() and time.monotonic() >= self.nextReplayTime and not self.closed:
+                records = self.spool.peek(self.replayBatchSize)
+                if not records:
+                    break
+
+                linesByPolicy: Dict[Optional[str], List[str]] = {}
+                for record in records:
+                    retentionPolicy, line = json.loads(record)
+                    linesByPolicy.setdefault(retentionPolicy, []).append(line)
+                # The timestamp is the last element of a line
+                self.oldestSpooledNs = int(json.loads(records[0])[1].rsplit(' ', 1)[1])
+
+                try:
+                    self.__writeBodies({retentionPolicy: ('\n'.join(lines) + '\n').encode('utf-8')
+                                        for retentionPolicy, lines in linesByPolicy.items()})
+                except BaseException as e:
+                    if isinstance(e, InfluxDBClientError) and e.code is not None and 400 <= e.code < 500:
+                        # Rejected by the server, replaying it again would block the spool forever
+                        logger.error("Spooled batch of %i points rejected: %s", len(records), e)
+                        self.failedCount += len(records)
+                        self.spool.consume(len(records))
+                        continue
+
+                    delayMs = min(self.maxRetryDelayMs, self.retryDelayMs * 2 ** self.replayFailures)
+                    self.replayFailures += 1
+                    self.nextReplayTime = time.monotonic() + delayMs / 1000
+                    logger.warning("Replaying %i spooled points failed (%s), retry in %i ms", len(records), e, delayMs)
+                    break
+
+                # Written points carry their original timestamp, if they are written twice (e.g. crash before
+                # consume) InfluxDB overwrites the identical points instead of duplicating them
+                self.spool.consume(len(records))
+                self.replayedCount += len(records)
+                self.writtenCount += len(records)
+                self.replayFailures = 0
+
+            if not self.spool.getPendingCount():
+                self.oldestSpooledNs = None
+
+    def _handleFailedBatch(self, batch: List[BufferedPoint]) -> None:
+        """Called with a batch which could not be written after all retries."""
+        self.failedCount += len(batch)
+        logger.error("Giving up %i points", len(batch))
+
+    def __sendBatch(self, batch: List[BufferedPoint]) -> None:
+        if self.spool is not None and self.spool.getPendingCount():
+            # Older points are still spooled, they have to be written first
+            self.__spoolBatch(batch)
+            return
+
+        for attempt in range(self.maxRetries + 1):
+            start = time.perf_counter()
+            try:
+                self._writeBatch(batch)
+            except InfluxDBClientError as e:
+                # Rejected by the server (bad request, unknown database), a retry would fail again
+                if e.code is not None and 400 <= e.code < 500:
+                    logger.error("Batch rejected: %s", e)
+                    break
+                error = e
+            except BaseException as e:
+                error = e
+            else:
+                self.lastBatchMs = (time.perf_counter() - start) * 1000
+                self.writtenCount += len(batch)
+                self.batchCount += 1
+                return
+
+            if self.spool is not None:
+                # The spool is replayed with backoff, retrying here would only block the buffer
+                logger.warning("Writing %i points failed (%s), spooled", len(batch), error)
+                self.__spoolBatch(batch)
+                self.nextReplayTime = time.monotonic() + self.retryDelayMs / 1000
+                return
+
+            if attempt == self.maxRetries or self.closed:
+                break
+            delayMs = min(self.maxRetryDelayMs, self.retryDelayMs * 2 ** attempt)
+            logger.warning("Writing %i points failed (%s), retry in %i ms", len(batch), error, delayMs)
+            self.retryCount += 1
+            time.sleep(delayMs / 1000)
+
+        self._handleFailedBatch(batch)
+
+    def flush(self) -> None:
+        """Writes all buffered points, blocks until they are written or given up."""
+        with self.sendLock:
+            while self.buffer:
+                self.__sendBatch(self._takeBatch())
+
+    def getStatistics(self) -> dict:
+        """
+        Get the counters of the buffer.
+
+        Returns:
+            dict: Buffered, written, dropped and failed point counts, batches, retries,
+                average points per second since start and duration of the last batch.
+                With a spool also the spooled, pending, replayed and dropped point counts of the spool and the
+                replay lag, the age of the oldest pending point in ms.
+        """
+        statistics = {
+            'buffered': len(self.buffer),
+            'written': self.writtenCount,
+            'batches': self.batchCount,
+            'retries': self.retryCount,
+            'dropped': self.droppedCount,
+            'failed': self.failedCount,
+            'pointsPerSecond': self.writtenCount / max(1e-9, time.monotonic() - self.startTime),
+            'lastBatchMs': self.lastBatchMs
+        }
+
+        if self.spool is not None:
+            oldestSpooledNs = self.oldestSpooledNs
+            statistics.update({
+                'spooled': self.spooledCount,
+                'spoolPending': self.spool.getPendingCount(),
+                'replayed': self.replayedCount,
+                'spoolDropped': self.spool.getDroppedCount(),
+                'replayLagMs': (time.time_ns() - oldestSpooledNs) / 1e6 if oldestSpooledNs is not None else 0.0
+            })
+        return statistics
+
+    def close(self) -> None:
+        """Stops the background thread and writes the remaining points. Points left in the spool stay there."""
+        self.closed = True
+        self.wakeup.set()
+        self.flusherThread.join()
+        self.flush()
+        if self.spool is not None:
+            self.spool.close()
@@ -1,59 +1,252 @@
-
 from __future__ import annotations
 import logging
-from typing import List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple
 
 import ros_api
 
+from PythonLib.MikrotikTrafficMonitor import TrafficMonitor
+
 logger = logging.getLogger('MikrotikRouter.Mqtt')
 
+# Errors of a broken connection, the command is repeated once on a new connection
+CONNECTION_ERRORS = (OSError, EOFError)
+
+
+def isParentNeighbor(neighbor: dict) -> bool:
+    """
+    Default neighbor filter: Mikrotik routers seen on the parents VLAN.
+
+    :param neighbor: A row of /ip/neighbor/print
+    :return: True if the neighbor is followed
+    """
+    return neighbor.get('platform') == 'MikroTik' and neighbor.get('interface') == 'vlan30_Parents'
+
+
+class RowDiff(NamedTuple):
+    added: List[dict]
+    removed: List[dict]
+    changed: List[dict]
+
+    def isEmpty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+
+class RowDiffer:
+    """
+    This class compares the rows of a print command with the rows of the previous call.
+    """
+
+    def __init__(self, key: str = '.id') -> None:
+        """
+        Constructor for the RowDiffer class.
+
+        :param key: The field identifying a row
+        """
+        self.key = key
+        self.lastRows: Dict[str, dict] = {}
+
+    def update(self, rows: List[dict]) -> RowDiff:
+        """
+        Remembers the rows and returns the difference to the previous ones. The first call returns all rows as added.
+
+        :param rows: The current rows
+        :return: Added and changed rows in their current state, removed rows in their last state
+        """
+        currentRows = {row[self.key]: row for row in rows}
+        added = [row for key, row in currentRows.items() if key not in self.lastRows]
+        changed = [row for key, row in currentRows.items() if key in self.lastRows and self.lastRows[key] != row]
+        removed = [row for key, row in self.lastRows.items() if key not in currentRows]
+        self.lastRows = currentRows
+        return RowDiff(added, removed, changed)
+
+
 class MikrotikRouter:
     """
     This class represents a Mikrotik Router and provides methods to retrieve
     various information from the router.
     """
 
-    def __init__(self, ipAddr: str, user: str, passwd: str) -> None:
+    def __init__(self, ipAddr: str, user: str, passwd: str, pool: MikrotikRouterPool = None,
+                 connectNow: bool = True, cacheTtlMs: int = 0) -> None:
         """
         Constructor for the MikrotikRouter class.
 
         :param ipAddr: The IP address of the router
         :param user: The username to authenticate with
         :param passwd: The password to authenticate with
+        :param pool: The pool the router belongs to, neighbors are taken from the pool as well
+        :param connectNow: Login in the constructor, otherwise with the first command
+        :param cacheTtlMs: Time the results of the get methods are reused, 0 disables the cache (see setCacheTtl)
         """
+        self.ipAddr = ipAddr
         self.user = user
         self.password = passwd
-        self.router = ros_api.Api(ipAddr, user=user, password=passwd)
+        self.pool = pool
+        # One command at a time per connection, the API protocol does not multiplex here
+        self.lock = threading.Lock()
+        self.router: ros_api.Api = None
+
+        self.cacheTtlMs = cacheTtlMs
+        self.cacheTtls: Dict[str, int] = {}
+        # command -> (time of the reply, reply)
+        self.cache: Dict[str, Tuple[float, List[dict]]] = {}
+        # Commands currently sent, concurrent callers of the same command wait for its reply
+        self.pendingCommands: Dict[str, Future] = {}
+        self.cacheLock = threading.Lock()
+        self.differs: Dict[str, RowDiffer] = {}
+
+        if connectNow:
+            self.connect()
+
+    def connect(self) -> None:
+        """
+        Opens and authenticates the API session, it is kept for all following commands.
+        """
+        self.router = ros_api.Api(self.ipAddr, user=self.user, password=self.password)
+
+    def disconnect(self) -> None:
+        """
+        Closes the socket of the session, the next command connects again.
+        """
+        router, self.router = self.router, None
+        if router is not None:
+            try:
+                router.sock.close()
+            except OSError:
+                pass
+
+    def talk(self, command: str) -> List[dict]:
+        """
+        Sends a command over the kept session. A broken session is replaced by a new one and the command is repeated once.
+
+        :param command: The API command, e.g. '/interface/print'
+        :return: The replies of the router
+        """
+        with self.lock:
+            try:
+                if self.router is None:
+                    self.connect()
+                return self.router.talk(command)
+            except CONNECTION_ERRORS:
+                logger.info("Connection to %s lost, reconnecting", self.ipAddr)
+                self.disconnect()
+                self.connect()
+                return self.router.talk(command)
+
+    def setCacheTtl(self, command: str, ttlMs: int) -> None:
+        """
+        Sets the cache time of a single command, e.g. setCacheTtl('/system/identity/print', 3600000).
+
+        :param command: The API command
+        :param ttlMs: Time the reply is reused, 0 disables the cache for this command
+        """
+        self.cacheTtls[command] = ttlMs
+
+    def query(self, command: str) -> List[dict]:
+        """
+        Like talk, but replies are reused within their cache time and concurrent calls of the same
+        command share one request. The returned list is shared, it must not be modified.
+
+        :param command: The API command
+        :return: The replies of the router
+        """
+        ttlMs = self.cacheTtls.get(command, self.cacheTtlMs)
+        if ttlMs <= 0:
+            return self.talk(command)
+
+        with self.cacheLock:
+            entry = self.cache.get(command)
+            if entry is not None and (time.monotonic() - entry[0]) * 1000 < ttlMs:
+                return entry[1]
+
+            future = self.pendingCommands.get(command)
+            if future is not None:
+                waiting = True
+            else:
+                waiting = False
+                future = self.pendingCommands[command] = Future()
+
+        if waiting:
+            return future.result()
+
+        try:
+            r = self.talk(command)
+            with self.cacheLock:
+                self.cache[command] = (time.monotonic(), r)
+            future.set_result(r)
+            return r
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.cacheLock:
+                del self.pendingCommands[command]
+
+    def diff(self, command: str, key: str = '.id') -> RowDiff:
+        """
+        Retrieves the rows of a print command which were added, removed or changed since the last call,
+        e.g. diff('/ip/dhcp-server/lease/print'). The first call returns all rows as added.
+
+        :param command: The API print command
+        :param key: The field identifying a row
+        :return: The RowDiff to the previous call
+        """
+        with self.cacheLock:
+            differ = self.differs.get(command)
+            if differ is None:
+                differ = self.differs[command] = RowDiffer(key)
+
+        return differ.update(self.query(command))
 
     def getListOfInterfaces(self) -> List[dict]:
-        r = self.router.talk('/interface/print')
+        r = self.query('/interface/print')
         return r
 
     def getSystemResources(self) -> List[dict]:
-        r = self.router.talk('/system/resource/print')
+        r = self.query('/system/resource/print')
         return r
 
     def getMonitorTraffic(self, interfaceName: str) -> dict:
-        r = self.router.talk(f'/interface/monitor-traffic\n=interface={interfaceName}\n=once=')
+        r = self.talk(f'/interface/monitor-traffic\n=interface={interfaceName}\n=once=')
         return r
 
-    def getNeighbors(self) -> List[MikrotikRouter]:
+    def createTrafficMonitor(self, interfaceNames: List[str]) -> TrafficMonitor:
+        """
+        Creates a continuous traffic monitor, one connection delivers a sample per interface and second.
+        Use it instead of calling getMonitorTraffic for each interface periodically.
+
+        :param interfaceNames: The names of the monitored interfaces
+        :return: The TrafficMonitor, started with start(callback) or iterated with samples()
+        """
+        return TrafficMonitor(self.ipAddr, self.user, self.password, interfaceNames)
+
+    def getNeighbors(self, neighborFilter: Callable[[dict], bool] = isParentNeighbor) -> List[MikrotikRouter]:
         """
-        Retrieves a list of neighboring Mikrotik routers.
+        Retrieves a list of neighboring Mikrotik routers. For the whole network use MikrotikTopology.
 
+        :param neighborFilter: Selects the rows of /ip/neighbor/print which are returned as routers
         :return: A list of MikrotikRouter objects
         """
         neighbors : List[MikrotikRouter] = []
 
-        r = self.router.talk('/ip/neighbor/print')
+        r = self.query('/ip/neighbor/print')
         for neighbor in r:
-            if neighbor['platform'] == 'MikroTik' and neighbor['interface'] == 'vlan30_Parents':
-                try:                
-                    mikroTikRouter = MikrotikRouter(neighbor['address'], self.user, self.password)
-                    neighbors.append(mikroTikRouter)
+            if not neighborFilter(neighbor):
+                continue
 
-                except BaseException:
-                    logging.exception("Error in setting up Router: %s", neighbor['address'])
+            if self.pool is not None:
+                # Routers of the pool log in with their first command
+                neighbors.append(self.pool.getRouter(neighbor['address']))
+                continue
+
+            # Unreachable neighbors are left out
+            try:
+                neighbors.append(MikrotikRouter(neighbor['address'], self.user, self.password))
+            except OSError:
+                logger.exception("Error in setting up Router: %s", neighbor['address'])
 
         return neighbors
 
@@ -65,7 +258,7 @@ class MikrotikRouter:
         """
         leases : List[dict] = []
 
-        r = self.router.talk('/ip/dhcp-server/lease/print')
+        r = self.query('/ip/dhcp-server/lease/print')
         for lease in r:
             if lease['status'] == 'bound':
                 leases.append(lease)
@@ -78,7 +271,7 @@ class MikrotikRouter:
 
         :return: A list of dictionary objects representing DNS static entries
         """
-        r = self.router.talk('/ip/dns/static/print')
+        r = self.query('/ip/dns/static/print')
         return r
 
     def getWiFiRegistrationTable(self) -> List[dict]:
@@ -87,7 +280,7 @@ class MikrotikRouter:
 
         :return: A list of dictionary objects representing the WiFi registration table
         """
-        r = self.router.talk('/interface/wireless/registration-table/print')
+        r = self.query('/interface/wireless/registration-table/print')
         return r
 
     def getIdentity(self) -> str:
@@ -96,7 +289,7 @@ class MikrotikRouter:
 
         :return: A string representing the router's identity
         """
-        r = self.router.talk('/system/identity/print')
+        r = self.query('/system/identity/print')
         return r[0]['name']
 
     def getActivities(self) -> List[dict]:
@@ -105,5 +298,72 @@ class MikrotikRouter:
 
         :return: A list of dictionary objects representing kid-control device activities
         """
-        r = self.router.talk('/ip/kid-control/device/print')
+        r = self.query('/ip/kid-control/device/print')
         return r
+
+
+class MikrotikRouterPool:
+    """
+    This class keeps one authenticated session per router and polls many routers concurrently.
+    """
+
+    def __init__(self, user: str, passwd: str, maxWorkers: int = 8, cacheTtlMs: int = 0) -> None:
+        """
+        Constructor for the MikrotikRouterPool class.
+
+        :param user: The username to authenticate with at all routers
+        :param passwd: The password to authenticate with at all routers
+        :param maxWorkers: Maximum number of routers queried at the same time
+        :param cacheTtlMs: Cache time of the routers created by the pool
+        """
+        self.user = user
+        self.password = passwd
+        self.cacheTtlMs = cacheTtlMs
+        self.routers: Dict[str, MikrotikRouter] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(maxWorkers, thread_name_prefix='MikrotikRouterPool')
+
+    def getRouter(self, ipAddr: str) -> MikrotikRouter:
+        """
+        Retrieves the router of an address, it is created on first use and logs in with its first command.
+
+        :param ipAddr: The IP address of the router
+        :return: The MikrotikRouter object shared by all users of the pool
+        """
+        with self.lock:
+            router = self.routers.get(ipAddr)
+            if router is None:
+                router = self.routers[ipAddr] = MikrotikRouter(ipAddr, self.user, self.password, self, connectNow=False,
+                                                                cacheTtlMs=self.cacheTtlMs)
+            return router
+
+    def getRouters(self) -> List[MikrotikRouter]:
+        with self.lock:
+            return list(self.routers.values())
+
+    def pollAll(self, fct: Callable[[MikrotikRouter], object], ipAddrs: Iterable[str] = None) -> Dict[str, object]:
+        """
+        Calls a function for several routers in parallel, e.g. pollAll(MikrotikRouter.getLeases).
+        The whole poll takes about as long as the slowest router.
+
+        :param fct: The function called with each router
+        :param ipAddrs: The addresses to poll, all routers of the pool if not given
+        :return: Result per address, or the exception raised for it
+        """
+        routers = self.getRouters() if ipAddrs is None else [self.getRouter(ipAddr) for ipAddr in ipAddrs]
+        futures = {router.ipAddr: self.executor.submit(fct, router) for router in routers}
+
+        results: Dict[str, object] = {}
+        for ipAddr, future in futures.items():
+            try:
+                results[ipAddr] = future.result()
+            except BaseException as e:
+                logger.warning("Polling %s failed: %s", ipAddr, e)
+                results[ipAddr] = e
+        return results
+
+    def close(self) -> None:
+        """
+        Stops the worker threads, running polls are finished first.
+        """
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,255 @@
+from __future__ import annotations
+import logging
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from PythonLib.MikrotikRouter import MikrotikRouter, MikrotikRouterPool, isParentNeighbor
+
+logger = logging.getLogger('MikrotikRouter.Topology')
+
+# Fields of a /ip/neighbor/print row identifying the neighbor, in order of preference
+NEIGHBOR_ALIASES = ('identity', 'mac-address', 'address')
+
+
+def pollNeighbors(router: MikrotikRouter) -> Tuple[str, List[dict]]:
+    """
+    Retrieves what the crawler needs of one router, called on the threads of the pool.
+
+    :param router: The router
+    :return: The identity and the neighbor rows of the router
+    """
+    return router.getIdentity(), router.query('/ip/neighbor/print')
+
+
+def getAliases(neighbor: dict) -> List[str]:
+    return [neighbor[field] for field in NEIGHBOR_ALIASES if neighbor.get(field)]
+
+
+class TopologyNode:
+    """
+    One router of the topology, identified by its identity.
+    """
+    __slots__ = ('identity', 'address', 'depth', 'macAddresses', 'lastSeen', 'error')
+
+    def __init__(self, identity: str, address: str, depth: int, lastSeen: float = 0.0, error: str = None) -> None:
+        self.identity = identity
+        self.address = address
+        # Hops from the nearest root address
+        self.depth = depth
+        # MAC addresses the neighbors see the router with
+        self.macAddresses: Set[str] = set()
+        self.lastSeen = lastSeen
+        # Set if the router could not be polled, identity is then the announced one or the address
+        self.error = error
+
+    def isReachable(self) -> bool:
+        return self.error is None
+
+    def toDict(self) -> dict:
+        return {'identity': self.identity, 'address': self.address, 'depth': self.depth,
+                'macAddresses': sorted(self.macAddresses), 'lastSeen': self.lastSeen, 'error': self.error}
+
+    @staticmethod
+    def fromDict(data: dict) -> TopologyNode:
+        node = TopologyNode(data['identity'], data['address'], data['depth'], data['lastSeen'], data['error'])
+        node.macAddresses.update(data['macAddresses'])
+        return node
+
+    def __repr__(self) -> str:
+        return f"TopologyNode({self.identity}, {self.address}, depth={self.depth})"
+
+
+class TopologyChanges(NamedTuple):
+    addedNodes: List[str]
+    removedNodes: List[str]
+    addedEdges: List[Tuple[str, str]]
+    removedEdges: List[Tuple[str, str]]
+
+    def isEmpty(self) -> bool:
+        return not (self.addedNodes or self.removedNodes or self.addedEdges or self.removedEdges)
+
+
+class TopologyGraph:
+    """
+    The routers found by a crawl and the neighbor links between them. Edges are undirected, stored as sorted pairs
+    of identities.
+    """
+
+    def __init__(self, rootAddresses: List[str], crawlTime: float = None) -> None:
+        self.rootAddresses = list(rootAddresses)
+        self.crawlTime = time.time() if crawlTime is None else crawlTime
+        self.nodes: Dict[str, TopologyNode] = {}
+        self.edges: Set[Tuple[str, str]] = set()
+
+    def addEdge(self, identity1: str, identity2: str) -> None:
+        if identity1 != identity2:
+            self.edges.add((identity1, identity2) if identity1 < identity2 else (identity2, identity1))
+
+    def getNode(self, identity: str) -> Optional[TopologyNode]:
+        return self.nodes.get(identity)
+
+    def getNeighbors(self, identity: str) -> List[str]:
+        """
+        Retrieves the identities linked to a router.
+
+        :param identity: The identity of the router
+        :return: The sorted identities of its neighbors
+        """
+        neighbors = [edge[1] if edge[0] == identity else edge[0] for edge in self.edges if identity in edge]
+        return sorted(neighbors)
+
+    def compare(self, previous: TopologyGraph) -> TopologyChanges:
+        """
+        Compares the graph with an older one, e.g. the graph before refresh.
+
+        :param previous: The older graph
+        :return: The nodes and edges which were added or removed since the older graph
+        """
+        return TopologyChanges(sorted(self.nodes.keys() - previous.nodes.keys()),
+                               sorted(previous.nodes.keys() - self.nodes.keys()),
+                               sorted(self.edges - previous.edges),
+                               sorted(previous.edges - self.edges))
+
+    def toDict(self) -> dict:
+        """
+        Converts the graph into plain types, e.g. to cache it as JSON.
+        """
+        return {'rootAddresses': self.rootAddresses, 'crawlTime': self.crawlTime,
+                'nodes': [node.toDict() for node in self.nodes.values()],
+                'edges': [list(edge) for edge in sorted(self.edges)]}
+
+    @staticmethod
+    def fromDict(data: dict) -> TopologyGraph:
+        graph = TopologyGraph(data['rootAddresses'], data['crawlTime'])
+        for nodeData in data['nodes']:
+            node = TopologyNode.fromDict(nodeData)
+            graph.nodes[node.identity] = node
+        graph.edges = {tuple(edge) for edge in data['edges']}
+        return graph
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+class MikrotikTopology:
+    """
+    This class discovers the network breadth first, starting at one or more routers. All routers of one hop
+    are polled concurrently by the pool, every router is polled once even if several neighbors announce it.
+    """
+
+    def __init__(self, pool: MikrotikRouterPool, neighborFilter: Callable[[dict], bool] = isParentNeighbor,
+                 maxDepth: int = 8) -> None:
+        """
+        Constructor for the MikrotikTopology class.
+
+        :param pool: The pool providing the sessions and worker threads, its cache time applies to the polls
+        :param neighborFilter: Selects the rows of /ip/neighbor/print which are followed
+        :param maxDepth: Maximum number of hops from the root addresses, 0 polls only the roots
+        """
+        self.pool = pool
+        self.neighborFilter = neighborFilter
+        self.maxDepth = maxDepth
+
+    def crawl(self, rootAddresses: List[str]) -> TopologyGraph:
+        """
+        Discovers the routers reachable from the root addresses.
+
+        :param rootAddresses: The addresses the crawl starts at
+        :return: The TopologyGraph
+        """
+        return self.__crawl(rootAddresses, {})
+
+    def refresh(self, graph: TopologyGraph) -> TopologyGraph:
+        """
+        Crawls again, starting at the roots of an earlier graph. All routers known from the graph are polled in one
+        concurrent round instead of one round per hop, only routers which appeared since are discovered hop by hop.
+
+        :param graph: The earlier graph, e.g. restored from a cache with TopologyGraph.fromDict
+        :return: The new TopologyGraph, compare it with the earlier one to get the changes
+        """
+        addresses = list(dict.fromkeys([node.address for node in graph.nodes.values()] + graph.rootAddresses))
+        polled = self.pool.pollAll(pollNeighbors, addresses)
+        newGraph = self.__crawl(graph.rootAddresses, polled)
+
+        # Unreachable routers keep the time they were seen last
+        for identity, node in newGraph.nodes.items():
+            previous = graph.nodes.get(identity)
+            if not node.isReachable() and previous is not None:
+                node.lastSeen = previous.lastSeen
+        return newGraph
+
+    def __crawl(self, rootAddresses: List[str], polled: Dict[str, object]) -> TopologyGraph:
+        graph = TopologyGraph(rootAddresses)
+        # identity / MAC / address of a neighbor -> address it is polled with
+        aliases: Dict[str, str] = {}
+        # polled address -> identity of its node
+        identities: Dict[str, str] = {}
+        # (address of the router, neighbor row), resolved to edges once all routers are known
+        links: List[Tuple[str, dict]] = []
+
+        # address -> identity announced by the neighbor row
+        frontier: Dict[str, Optional[str]] = {}
+        for address in rootAddresses:
+            aliases[address] = address
+            frontier[address] = None
+
+        depth = 0
+        while frontier:
+            missing = [address for address in frontier if address not in polled]
+            if missing:
+                polled.update(self.pool.pollAll(pollNeighbors, missing))
+
+            nextFrontier: Dict[str, Optional[str]] = {}
+            for address, announcedIdentity in frontier.items():
+                result = polled[address]
+                if isinstance(result, BaseException):
+                    identity = announcedIdentity or address
+                    identities[address] = identity
+                    if identity not in graph.nodes:
+                        graph.nodes[identity] = TopologyNode(identity, address, depth, error=str(result))
+                    continue
+
+                identity, neighbors = result
+                identities[address] = identity
+                if identity in graph.nodes and graph.nodes[identity].isReachable():
+                    # Same router reached by another address
+                    continue
+                graph.nodes[identity] = TopologyNode(identity, address, depth, time.time())
+                aliases.setdefault(identity, address)
+
+                for neighbor in neighbors:
+                    if not self.neighborFilter(neighbor):
+                        continue
+                    links.append((address, neighbor))
+
+                    neighborAliases = getAliases(neighbor)
+                    knownAddress = next((aliases[alias] for alias in neighborAliases if alias in aliases), None)
+                    if knownAddress is not None:
+                        for alias in neighborAliases:
+                            aliases.setdefault(alias, knownAddress)
+                        continue
+
+                    neighborAddress = neighbor.get('address')
+                    if not neighborAddress or depth >= self.maxDepth:
+                        continue
+                    for alias in neighborAliases:
+                        aliases[alias] = neighborAddress
+                    nextFrontier[neighborAddress] = neighbor.get('identity') or None
+
+            frontier = nextFrontier
+            depth += 1
+
+        for address, neighbor in links:
+            neighborAliases = getAliases(neighbor)
+            neighborAddress = next((aliases[alias] for alias in neighborAliases if alias in aliases), None)
+            neighborIdentity = identities.get(neighborAddress)
+            if neighborIdentity is None:
+                # Beyond the maximum depth
+                continue
+            graph.addEdge(identities[address], neighborIdentity)
+            if neighbor.get('mac-address'):
+                graph.nodes[neighborIdentity].macAddresses.add(neighbor['mac-address'])
+
+        logger.info("Crawled %i routers with %i links from %s", len(graph.nodes), len(graph.edges),
+                    ', '.join(rootAddresses))
+        return graph
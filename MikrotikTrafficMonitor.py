@@ -0,0 +1,305 @@
+from __future__ import annotations
+import asyncio
+import logging
+import socket
+import threading
+import time
+from typing import AsyncIterator, Callable, List, Optional
+
+logger = logging.getLogger('MikrotikRouter.TrafficMonitor')
+
+# ros_api only offers request/response commands, a continuous monitor-traffic never sends !done.
+# So this module speaks the RouterOS API protocol itself:
+# https://help.mikrotik.com/docs/display/ROS/API
+
+MONITOR_TAG = b'1'
+
+# Attributes of a monitor-traffic reply -> slot of TrafficSample
+SAMPLE_ATTRIBUTES = {
+    b'rx-bits-per-second': 'rxBitsPerSecond',
+    b'tx-bits-per-second': 'txBitsPerSecond',
+    b'rx-packets-per-second': 'rxPacketsPerSecond',
+    b'tx-packets-per-second': 'txPacketsPerSecond',
+}
+
+
+class MikrotikApiError(Exception):
+    pass
+
+
+class TrafficSample:
+    """
+    One rate sample of an interface, rates are per second.
+    """
+    __slots__ = ('name', 'rxBitsPerSecond', 'txBitsPerSecond', 'rxPacketsPerSecond', 'txPacketsPerSecond', 'timeNs')
+
+    def __init__(self) -> None:
+        self.name = ''
+        self.rxBitsPerSecond = 0
+        self.txBitsPerSecond = 0
+        self.rxPacketsPerSecond = 0
+        self.txPacketsPerSecond = 0
+        self.timeNs = 0
+
+    def __repr__(self) -> str:
+        return f"TrafficSample({self.name}, rx={self.rxBitsPerSecond} bit/s, tx={self.txBitsPerSecond} bit/s)"
+
+
+def encodeWord(word: bytes) -> bytes:
+    """
+    Prefixes a word with its length in the variable length encoding of the API.
+
+    :param word: The word
+    :return: The encoded word
+    """
+    length = len(word)
+    if length < 0x80:
+        prefix = length.to_bytes(1, 'big')
+    elif length < 0x4000:
+        prefix = (length | 0x8000).to_bytes(2, 'big')
+    elif length < 0x200000:
+        prefix = (length | 0xC00000).to_bytes(3, 'big')
+    elif length < 0x10000000:
+        prefix = (length | 0xE0000000).to_bytes(4, 'big')
+    else:
+        prefix = b'\xf0' + length.to_bytes(4, 'big')
+    return prefix + word
+
+
+def encodeSentence(words: List[str]) -> bytes:
+    """
+    Encodes the words of a sentence, terminated by an empty word.
+    """
+    return b''.join(encodeWord(word.encode('utf-8')) for word in words) + b'\x00'
+
+
+class SentenceParser:
+    """
+    This class splits the received byte stream into sentences, data may arrive in arbitrary pieces.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.words: List[bytes] = []
+
+    def feed(self, data: bytes) -> List[List[bytes]]:
+        """
+        Adds received data.
+
+        :param data: The received bytes
+        :return: The sentences completed by the data, each a list of words
+        """
+        buffer = self.buffer
+        buffer += data
+        sentences: List[List[bytes]] = []
+        position = 0
+        size = len(buffer)
+
+        while position < size:
+            first = buffer[position]
+            if first < 0x80:
+                length, headerSize = first, 1
+            elif first < 0xC0:
+                length, headerSize = first & 0x3F, 2
+            elif first < 0xE0:
+                length, headerSize = first & 0x1F, 3
+            elif first < 0xF0:
+                length, headerSize = first & 0x0F, 4
+            else:
+                length, headerSize = 0, 5
+
+            if position + headerSize > size:
+                break
+            for index in range(position + 1, position + headerSize):
+                length = (length << 8) | buffer[index]
+            if position + headerSize + length > size:
+                break
+
+            start = position + headerSize
+            position = start + length
+            if length == 0:
+                sentences.append(self.words)
+                self.words = []
+            else:
+                self.words.append(bytes(buffer[start:position]))
+
+        del buffer[:position]
+        return sentences
+
+
+def checkReply(sentence: List[bytes]) -> None:
+    """
+    Raises MikrotikApiError for !trap and !fatal replies.
+    """
+    if sentence and sentence[0] in (b'!trap', b'!fatal'):
+        message = next((word[9:].decode('utf-8', 'replace') for word in sentence if word.startswith(b'=message=')),
+                       sentence[-1].decode('utf-8', 'replace'))
+        raise MikrotikApiError(message)
+
+
+def parseSample(sentence: List[bytes]) -> Optional[TrafficSample]:
+    """
+    Creates a sample from a !re reply of monitor-traffic.
+
+    :param sentence: The words of the reply
+    :return: The sample, or None if the sentence is no data reply
+    """
+    if not sentence or sentence[0] != b'!re':
+        return None
+
+    sample = TrafficSample()
+    sample.timeNs = time.time_ns()
+    for word in sentence:
+        if word[:1] != b'=':
+            continue
+        separator = word.find(b'=', 1)
+        key = word[1:separator]
+        if key == b'name':
+            sample.name = word[separator + 1:].decode('utf-8')
+        else:
+            slot = SAMPLE_ATTRIBUTES.get(key)
+            if slot is not None:
+                setattr(sample, slot, int(word[separator + 1:]))
+    return sample
+
+
+class TrafficMonitor:
+    """
+    This class runs one continuous /interface/monitor-traffic for several interfaces,
+    the router sends a sample per interface every second.
+    """
+
+    def __init__(self, ipAddr: str, user: str, passwd: str, interfaces: List[str], port: int = 8728,
+                 timeoutS: float = 10, reconnectDelayS: float = 5) -> None:
+        """
+        Constructor for the TrafficMonitor class.
+
+        :param ipAddr: The IP address of the router
+        :param user: The username to authenticate with
+        :param passwd: The password to authenticate with
+        :param interfaces: The names of the monitored interfaces
+        :param port: The port of the API service (plain, not API-SSL)
+        :param timeoutS: Time without any reply after which the connection is considered broken
+        :param reconnectDelayS: Pause before a broken connection is opened again
+        """
+        self.ipAddr = ipAddr
+        self.user = user
+        self.password = passwd
+        self.interfaces = interfaces
+        self.port = port
+        self.timeoutS = timeoutS
+        self.reconnectDelayS = reconnectDelayS
+
+        self.stopped = threading.Event()
+        self.thread: threading.Thread = None
+        self.sampleCount = 0
+
+    def __loginSentence(self) -> bytes:
+        return encodeSentence(['/login', f'=name={self.user}', f'=password={self.password}'])
+
+    def __monitorSentence(self) -> bytes:
+        return encodeSentence(['/interface/monitor-traffic', f"=interface={','.join(self.interfaces)}",
+                               f'.tag={MONITOR_TAG.decode()}'])
+
+    def __runConnection(self, callback: Callable[[TrafficSample], None]) -> None:
+        parser = SentenceParser()
+        with socket.create_connection((self.ipAddr, self.port), self.timeoutS) as connection:
+
+            def readSentence() -> List[bytes]:
+                while True:
+                    data = connection.recv(4096)
+                    if not data:
+                        raise ConnectionError(f"Connection closed by {self.ipAddr}")
+                    sentences = parser.feed(data)
+                    if sentences:
+                        return sentences[0]
+
+            connection.sendall(self.__loginSentence())
+            checkReply(readSentence())
+            connection.sendall(self.__monitorSentence())
+            logger.info("Monitoring %s on %s", ','.join(self.interfaces), self.ipAddr)
+
+            while not self.stopped.is_set():
+                data = connection.recv(65536)
+                if not data:
+                    raise ConnectionError(f"Connection closed by {self.ipAddr}")
+                for sentence in parser.feed(data):
+                    checkReply(sentence)
+                    sample = parseSample(sentence)
+                    if sample is not None:
+                        self.sampleCount += 1
+                        try:
+                            callback(sample)
+                        except Exception:
+                            # A failing callback must not end the monitor
+                            logger.exception("Callback failed for sample %s", sample)
+
+            connection.sendall(encodeSentence(['/cancel', f'=tag={MONITOR_TAG.decode()}']))
+
+    def run(self, callback: Callable[[TrafficSample], None]) -> None:
+        """
+        Delivers samples to the callback until stop() is called. Broken connections are opened again,
+        unexpected replies are handled like a broken connection.
+
+        :param callback: Called in the context of the caller with every sample
+        """
+        while not self.stopped.is_set():
+            try:
+                self.__runConnection(callback)
+            except MikrotikApiError:
+                # Wrong credentials or interface names, retrying would not help
+                raise
+            except (OSError, ValueError) as e:
+                # ValueError: a reply which could not be parsed
+                logger.warning("Monitoring %s failed: %s", self.ipAddr, e)
+                self.stopped.wait(self.reconnectDelayS)
+
+    def start(self, callback: Callable[[TrafficSample], None]) -> None:
+        """
+        Runs the monitor on a background thread.
+
+        :param callback: Called in the context of the background thread with every sample
+        """
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, args=(callback,), name="TrafficMonitor", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the monitor, a running background thread ends with the next reply or timeout.
+        """
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+            self.thread = None
+
+    async def samples(self) -> AsyncIterator[TrafficSample]:
+        """
+        Async iterator over the samples, e.g. async for sample in monitor.samples(). Ends on errors.
+        """
+        parser = SentenceParser()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.ipAddr, self.port), self.timeoutS)
+        try:
+            writer.write(self.__loginSentence())
+            loggedIn = False
+            while not loggedIn:
+                data = await asyncio.wait_for(reader.read(4096), self.timeoutS)
+                if not data:
+                    raise ConnectionError(f"Connection closed by {self.ipAddr}")
+                for sentence in parser.feed(data):
+                    checkReply(sentence)
+                    loggedIn = True
+
+            writer.write(self.__monitorSentence())
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), self.timeoutS)
+                if not data:
+                    raise ConnectionError(f"Connection closed by {self.ipAddr}")
+                for sentence in parser.feed(data):
+                    checkReply(sentence)
+                    sample = parseSample(sentence)
+                    if sample is not None:
+                        self.sampleCount += 1
+                        yield sample
+        finally:
+            writer.close()
@@ -2,22 +2,43 @@
 # It supports publishing and subscribing to MQTT topics.
 
 import re
+import base64
+import collections
+import contextvars
+import json
 import logging
 import queue
+import threading
+import time
+from enum import Enum
 from typing import Callable
 import paho.mqtt.client as mqtt
 from paho.mqtt.client import connack_string
 
+from PythonLib.MqttDispatcher import ShardedDispatcher
 from PythonLib.Scheduler import Scheduler
+from PythonLib.Spool import Spool
 
 # https://github.com/eclipse/paho.mqtt.python
 # https://mntolia.com/mqtt-python-with-paho-mqtt-client/
 
 logger = logging.getLogger('PythonLib.Mqtt')
 
+# Set while log batches are published, records created meanwhile (e.g. by publish itself) would feed themselves endlessly
+flushingLogBatch: contextvars.ContextVar = contextvars.ContextVar('flushingLogBatch', default=False)
+
+
+class PayloadType(Enum):
+    """Type of the payload handed over to a subscription callback."""
+    BYTES = 1
+    STR = 2
+    JSON = 3
+    FLOAT = 4
+
 
 class Mqtt:
-    def __init__(self, hostName: str, rootTopic: str, mqttClient: mqtt.Client, port: object = 1883) -> None:
+    def __init__(self, hostName: str, rootTopic: str, mqttClient: mqtt.Client, port: object = 1883,
+                 spool: Spool = None, replayRatePerSecond: int = 100) -> None:
         """
         Initialize the Mqtt class.
 
@@ -26,6 +47,8 @@ class Mqtt:
             rootTopic (str): The root topic for MQTT communications.
             mqttClient (mqtt.Client): The Paho MQTT client instance to use.
             port (int, optional): The MQTT broker's port (default is 1883).
+            spool (Spool, optional): Persistent spool buffering QoS>0 publishes while the broker is not connected.
+            replayRatePerSecond (int, optional): Maximum number of spooled messages replayed per second after reconnect.
         """
         self.hostname = hostName
         self.port = port
@@ -35,8 +58,16 @@ class Mqtt:
         self.onChangeDictStartTime = {}
         self.topicCallbackDict = {}
         self.startWithTopicCallbackDict = {}
+        self.startWithTopics = ()
         self.queue = queue.Queue()
 
+        self.spool = spool
+        self.replayRatePerSecond = replayRatePerSecond
+        self.connected = False
+        self.replayedCount = 0
+        self.lastReplayTime = None
+        self.dispatcher: ShardedDispatcher = None
+
         self.__setup()
 
     def __reset(self, payload: str) -> None:
@@ -59,9 +90,45 @@ class Mqtt:
             userdata: User data (not used in this implementation).
             message: A message object containing topic, payload, qos, and retain.
         """
-        payload = message.payload.decode("utf-8")
-        topic = str(message.topic)
-        self.queue.put((topic, payload))
+        topic = message.topic
+
+        # Drop messages nobody is interested in, before touching the payload
+        if topic not in self.topicCallbackDict and not topic.startswith(self.startWithTopics):
+            return
+
+        # Payload stays raw bytes, it is decoded on dispatch as requested by the subscriptions
+        self.queue.put((topic, message.payload))
+
+    @staticmethod
+    def __decodePayload(payload: bytes, payloadType: PayloadType, decodedPayloads: dict) -> object:
+        """
+        Decode the payload once per payload type and message, shared by all matching callbacks.
+        """
+        if payloadType in decodedPayloads:
+            decodedPayload = decodedPayloads[payloadType]
+        else:
+            if payloadType == PayloadType.BYTES:
+                decodedPayload = payload
+            elif payloadType == PayloadType.JSON:
+                decodedPayload = json.loads(payload)
+            elif payloadType == PayloadType.FLOAT:
+                decodedPayload = float(payload)
+            else:
+                decodedPayload = payload.decode("utf-8")
+            decodedPayloads[payloadType] = decodedPayload
+
+        return decodedPayload
+
+    def __invoke(self, topic: str, subscription: str, callback: Callable[[str, object], None], payload: object,
+                 errorTag: str) -> None:
+        dispatcher = self.dispatcher
+        if dispatcher:
+            dispatcher.submit(topic, callback, payload, subscription)
+        else:
+            try:
+                callback(topic, payload)
+            except BaseException:
+                logging.exception(errorTag)
 
     def __dispatchMessages(self) -> None:
         """
@@ -71,30 +138,118 @@ class Mqtt:
             item = self.queue.get()
             topic = item[0]
             payload = item[1]
+            decodedPayloads = {}
 
             # Check if Callback with exact topic was registered
-            callback = self.topicCallbackDict.get(topic)
-            if callback:
+            subscription = self.topicCallbackDict.get(topic)
+            if subscription:
+                callback, payloadType = subscription
                 try:
-                    callback(topic, payload)
-                except BaseException:
-                    logging.exception('_3_')
+                    decodedPayload = Mqtt.__decodePayload(payload, payloadType, decodedPayloads)
+                except ValueError:
+                    logger.exception("Payload of topic %s is no valid %s", topic, payloadType.name)
+                else:
+                    self.__invoke(topic, topic, callback, decodedPayload, '_3_')
             else:
                 logger.debug("Topic %s has no registered callback", topic)
 
             # Check if Callback was registered with topic as starter
-            for startWithTopic, startWithTopicCallback in self.startWithTopicCallbackDict.items():
+            for startWithTopic, (startWithTopicCallback, payloadType) in self.startWithTopicCallbackDict.items():
                 if topic.startswith(startWithTopic):
                     try:
-                        startWithTopicCallback(topic, payload)
-                    except BaseException:
-                        logging.exception('_2_')
+                        decodedPayload = Mqtt.__decodePayload(payload, payloadType, decodedPayloads)
+                    except ValueError:
+                        logger.exception("Payload of topic %s is no valid %s", topic, payloadType.name)
+                    else:
+                        self.__invoke(topic, startWithTopic + '#', startWithTopicCallback, decodedPayload, '_2_')
 
     def __on_connect(self, client, userdata, flags, rc) -> None:
         logger.debug("on_connect: %s", connack_string(rc))
+        self.connected = rc == mqtt.CONNACK_ACCEPTED
+
+        if self.connected and self.spool and self.spool.getPendingCount() > 0:
+            # Replay is done in loop(), not in the context of the Paho thread
+            logger.info("Connected, %i spooled messages to replay", self.spool.getPendingCount())
+            self.replayedCount = 0
+            self.lastReplayTime = None
 
     def __on_disconnect(self, client, userdata, rc) -> None:
         logger.debug("on_disconnect %s %i", connack_string(rc), rc)
+        self.connected = False
+
+    def __replaySpool(self) -> None:
+        """
+        Republish spooled messages in order, limited to replayRatePerSecond.
+        A record is removed from the spool as soon as Paho has accepted it, Paho sends it itself if the connection
+        was lost meanwhile.
+        """
+        if not self.spool or not self.connected or self.spool.getPendingCount() == 0:
+            return
+
+        now = Scheduler.getMillis()
+        if self.lastReplayTime is None:
+            self.lastReplayTime = now
+            budget = 1
+        else:
+            budget = (now - self.lastReplayTime) * self.replayRatePerSecond // 1000
+            if budget == 0:
+                return
+            self.lastReplayTime = now
+
+        budget = min(budget, self.replayRatePerSecond)
+        published = 0
+        for record in self.spool.peek(budget):
+            topic, payload, qos = Mqtt.__decodeSpoolRecord(record)
+            info = self.mqttClient.publish(topic, payload, qos)
+            if info is None or info.rc == mqtt.MQTT_ERR_SUCCESS:
+                published += 1
+                continue
+
+            # Without connection Paho keeps QoS>0 messages queued and sends them on reconnect,
+            # replaying them again would duplicate them
+            if info.rc == mqtt.MQTT_ERR_NO_CONN and qos > 0:
+                published += 1
+            break
+
+        self.spool.consume(published)
+        self.replayedCount += published
+
+        if self.spool.getPendingCount() == 0:
+            logger.info("Spool replay finished, %i messages replayed", self.replayedCount)
+
+    @staticmethod
+    def __encodeSpoolRecord(topic: str, payload: object, qos: int) -> bytes:
+        if isinstance(payload, (bytes, bytearray)):
+            record = {'t': topic, 'b': base64.b64encode(payload).decode('ascii'), 'q': qos}
+        else:
+            record = {'t': topic, 'p': payload, 'q': qos}
+        return json.dumps(record, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def __decodeSpoolRecord(record: bytes) -> tuple:
+        obj = json.loads(record)
+        payload = base64.b64decode(obj['b']) if 'b' in obj else obj['p']
+        return (obj['t'], payload, obj['q'])
+
+    def getSpoolStatus(self) -> dict:
+        """
+        Get the state of the offline spool, e.g. to watch the replay progress.
+
+        Returns:
+            dict: Pending, replayed and dropped message counts, or an empty dict if no spool is configured.
+        """
+        if not self.spool:
+            return {}
+
+        pending = self.spool.getPendingCount()
+        return {
+            'connected': self.connected,
+            'replaying': self.connected and pending > 0,
+            'pending': pending,
+            'replayed': self.replayedCount,
+            'dropped': self.spool.getDroppedCount(),
+            'sizeBytes': self.spool.getSize()
+        }
 
     def __setup(self) -> None:
         """
@@ -115,10 +270,42 @@ class Mqtt:
         # Start a thread for the Paho MQTT client
         self.mqttClient.loop_start()
 
+    def enableParallelDispatch(self, workers: int = 4, slowHandlerMs: int = 500) -> None:
+        """
+        Run callbacks on a worker pool instead of the thread calling loop().
+        Messages of the same topic are always handled by the same worker, so they keep their order.
+
+        Args:
+            workers (int, optional): Number of worker threads (default is 4).
+            slowHandlerMs (int, optional): Callbacks running longer than this are logged as warning (default is 500).
+        """
+        self.disableParallelDispatch()
+        self.dispatcher = ShardedDispatcher(workers, slowHandlerMs)
+
+    def disableParallelDispatch(self) -> None:
+        """
+        Stop the worker pool after the queued callbacks are processed, callbacks run in loop() again.
+        """
+        dispatcher = self.dispatcher
+        self.dispatcher = None
+        if dispatcher:
+            dispatcher.stop()
+
+    def getCallbackStats(self) -> dict:
+        """
+        Get timing statistics per callback, only available in parallel dispatch mode.
+
+        Returns:
+            dict: Statistics keyed by subscription (topic, or start topic followed by #),
+                see ShardedDispatcher.getStats().
+        """
+        return self.dispatcher.getStats() if self.dispatcher else {}
+
     def loop(self) -> None:
         """
         Perform cyclic jobs, processing all received data in the same context as the rest of the application (no multithreading).
         """
+        self.__replaySpool()
         self.__dispatchMessages()
 
     def publish(self, topic: str, payload: str, qos: int = 0) -> None:
@@ -141,6 +328,12 @@ class Mqtt:
             payload (str): The payload to publish.
         """
         logger.debug("Publish: %s : %s", topic, payload)
+
+        # Keep the order: as long as the spool is not empty, QoS>0 messages are queued behind it
+        if self.spool and qos > 0 and (not self.connected or self.spool.getPendingCount() > 0):
+            self.spool.append(Mqtt.__encodeSpoolRecord(topic, payload, qos))
+            return
+
         self.mqttClient.publish(topic, payload, qos)
 
     def publishOnChange(self, topic: str, payload: str, forceUpdateMs: int = 60000) -> None:
@@ -175,42 +368,49 @@ class Mqtt:
                 self.onChangeDictStartTime[topic] = Scheduler.getMillis()
                 self.publishIndependentTopic(topic, payload)
 
-    def subscribe(self, topic: str, callback: Callable[[str, str], None]) -> None:
+    def subscribe(self, topic: str, callback: Callable[[str, object], None], payloadType: PayloadType = PayloadType.STR) -> None:
         """
         Subscribe to an MQTT topic and specify a callback function to handle incoming messages.
 
         Args:
             topic (str): The topic to subscribe to (rootTopic/topic)
-            callback (Callable[[str, str], None]): A callback function that accepts the topic and message payload.
+            callback (Callable[[str, object], None]): A callback function that accepts the topic and message payload.
+            payloadType (PayloadType, optional): Type the payload is decoded to before calling the callback (default is STR).
         """
         topic = self.rootTopic + "/" + topic
-        self.subscribeIndependentTopic(topic, callback)
+        self.subscribeIndependentTopic(topic, callback, payloadType)
 
-    def subscribeIndependentTopic(self, topic: str, callback: Callable[[str, str], None]) -> None:
+    def subscribeIndependentTopic(self, topic: str, callback: Callable[[str, object], None],
+                                  payloadType: PayloadType = PayloadType.STR) -> None:
         """
         Subscribe to an MQTT topic and specify a callback function to handle incoming messages.
 
         Args:
             topic (str): The topic to subscribe to
-            callback (Callable[[str, str], None]): A callback function that accepts the topic and message payload.
+            callback (Callable[[str, object], None]): A callback function that accepts the topic and message payload.
+            payloadType (PayloadType, optional): Type the payload is decoded to before calling the callback (default is STR).
+                JSON payloads are parsed once and the same object is shared by all matching callbacks.
         """
 
-        self.topicCallbackDict[topic] = callback
+        self.topicCallbackDict[topic] = (callback, payloadType)
         self.mqttClient.subscribe(topic, qos=1)
 
     def getSubscriptionCatalog(self) -> list[str]:
         return list(self.topicCallbackDict.keys())
 
-    def subscribeStartWithTopic(self, topic: str, callback: Callable[[str, str], None]) -> None:
+    def subscribeStartWithTopic(self, topic: str, callback: Callable[[str, object], None],
+                                payloadType: PayloadType = PayloadType.STR) -> None:
         """
         Subscribe to all MQTT topic starting with topic and specify a callback function to handle incoming messages.
 
         Args:
             topic (str): The beginning of topic to subscribe to
-            callback (Callable[[str,str], None]): A callback function that accepts the topic and the message payload.
+            callback (Callable[[str, object], None]): A callback function that accepts the topic and the message payload.
+            payloadType (PayloadType, optional): Type the payload is decoded to before calling the callback (default is STR).
         """
 
-        self.startWithTopicCallbackDict[topic] = callback
+        self.startWithTopicCallbackDict[topic] = (callback, payloadType)
+        self.startWithTopics = tuple(self.startWithTopicCallbackDict.keys())
         self.mqttClient.subscribe(topic + "#", qos=1)
 
 
@@ -224,3 +424,167 @@ class MQTTHandler(logging.Handler):
     def emit(self, record):
         log_message = self.format(record)
         self.mqtt.publishIndependentTopic(self.topic, log_message)
+
+
+class BatchedMQTTHandler(logging.Handler):
+    """
+    Logging handler which never blocks the logging thread.
+    Records are kept in a bounded ring buffer and published in batches as JSON array by a background flusher.
+    """
+
+    def __init__(self, mqttClient: Mqtt, topic: str, capacity: int = 10000, batchSize: int = 100,
+                 flushIntervalMs: int = 1000, maxMessagesPerSecond: float = 10) -> None:
+        """
+        Initialize the BatchedMQTTHandler class.
+
+        Args:
+            mqttClient (Mqtt): The Mqtt instance used for publishing.
+            topic (str): The topic to publish the batches to.
+            capacity (int, optional): Maximum number of buffered records, the oldest ones are dropped if exceeded (default is 10000).
+            batchSize (int, optional): Maximum number of records per MQTT message (default is 100).
+            flushIntervalMs (int, optional): Maximum time a record waits in the buffer (default is 1000).
+            maxMessagesPerSecond (float, optional): Rate limit of published MQTT messages (default is 10).
+        """
+        super().__init__()
+        self.mqtt = mqttClient
+        self.topic = topic
+        self.batchSize = batchSize
+        self.flushIntervalMs = flushIntervalMs
+        self.maxMessagesPerSecond = maxMessagesPerSecond
+
+        self.buffer = collections.deque(maxlen=capacity)
+        self.droppedCount = 0
+        self.reportedDroppedCount = 0
+        self.sentRecordCount = 0
+        self.sentMessageCount = 0
+
+        self.tokens = 1.0
+        self.lastTokenTime = time.monotonic()
+
+        self.closed = False
+        self.wakeup = threading.Event()
+        self.flusherThread: threading.Thread = None
+        self._startFlusher()
+
+    def _startFlusher(self) -> None:
+        self.flusherThread = threading.Thread(target=self.__flushLoop, name="BatchedMQTTHandler", daemon=True)
+        self.flusherThread.start()
+
+    def _isFlusherContext(self) -> bool:
+        return flushingLogBatch.get()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._isFlusherContext():
+            return
+
+        try:
+            logMessage = self.format(record)
+        except BaseException:
+            self.handleError(record)
+            return
+
+        if len(self.buffer) == self.buffer.maxlen:
+            self.droppedCount += 1
+        self.buffer.append(logMessage)
+
+        if len(self.buffer) >= self.batchSize:
+            self._wakeupFlusher()
+
+    def _wakeupFlusher(self) -> None:
+        """
+        Flush a full batch now instead of after flushIntervalMs, called from any thread.
+        """
+        self.wakeup.set()
+
+    def _takeBatch(self) -> str:
+        """
+        Remove up to batchSize records from the buffer.
+
+        Returns:
+            str: The records as JSON array, or None if the buffer is empty.
+        """
+        batch = []
+        while self.buffer and len(batch) < self.batchSize:
+            batch.append(self.buffer.popleft())
+        self.sentRecordCount += len(batch)
+
+        droppedCount = self.droppedCount
+        if droppedCount != self.reportedDroppedCount:
+            batch.append(f"{droppedCount - self.reportedDroppedCount} log records dropped")
+            self.reportedDroppedCount = droppedCount
+
+        if not batch:
+            return None
+
+        self.sentMessageCount += 1
+        return json.dumps(batch, ensure_ascii=False)
+
+    def _reserveMessage(self) -> float:
+        """
+        Token bucket of the rate limit.
+
+        Returns:
+            float: Seconds to wait before the next message may be published, 0 if a token was taken.
+        """
+        now = time.monotonic()
+        self.tokens = min(1.0, self.tokens + (now - self.lastTokenTime) * self.maxMessagesPerSecond)
+        self.lastTokenTime = now
+
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+
+        return (1.0 - self.tokens) / self.maxMessagesPerSecond
+
+    def __flushLoop(self) -> None:
+        flushingLogBatch.set(True)
+        while not self.closed:
+            self.wakeup.wait(self.flushIntervalMs / 1000)
+            self.wakeup.clear()
+            self.__flushBuffer()
+
+    def __flushBuffer(self) -> None:
+        # Also called by close() outside of the flusher thread
+        token = flushingLogBatch.set(True)
+        try:
+            while self.buffer or self.droppedCount != self.reportedDroppedCount:
+                delay = self._reserveMessage()
+                if delay > 0:
+                    time.sleep(delay)
+                    continue
+
+                payload = self._takeBatch()
+                if payload is None:
+                    break
+                try:
+                    self.mqtt.publishIndependentTopic(self.topic, payload)
+                except BaseException:
+                    logger.exception("Publishing log batch failed")
+        finally:
+            flushingLogBatch.reset(token)
+
+    def getStatistics(self) -> dict:
+        """
+        Get the counters of the handler.
+
+        Returns:
+            dict: Buffered, sent and dropped record counts and number of sent MQTT messages.
+        """
+        return {
+            'buffered': len(self.buffer),
+            'sentRecords': self.sentRecordCount,
+            'sentMessages': self.sentMessageCount,
+            'dropped': self.droppedCount
+        }
+
+    def flush(self) -> None:
+        if self.flusherThread is not None:
+            self.wakeup.set()
+
+    def close(self) -> None:
+        self.closed = True
+        if self.flusherThread is not None:
+            self.wakeup.set()
+            self.flusherThread.join()
+            self.__flushBuffer()
+        super().close()
@@ -0,0 +1,131 @@
+# This class provides a worker pool for MQTT callbacks.
+# Messages are sharded by topic hash, so messages of the same topic are still processed in order.
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+logger = logging.getLogger('PythonLib.MqttDispatcher')
+
+
+class CallbackStats:
+    """Timing statistics of a single callback."""
+
+    __slots__ = ('count', 'totalMs', 'maxMs', 'slowCount')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.totalMs = 0.0
+        self.maxMs = 0.0
+        self.slowCount = 0
+
+    def add(self, durationMs: float, slow: bool) -> None:
+        self.count += 1
+        self.totalMs += durationMs
+        self.maxMs = max(self.maxMs, durationMs)
+        if slow:
+            self.slowCount += 1
+
+    def asDict(self) -> dict:
+        return {
+            'count': self.count,
+            'totalMs': self.totalMs,
+            'avgMs': self.totalMs / self.count if self.count else 0.0,
+            'maxMs': self.maxMs,
+            'slowCount': self.slowCount
+        }
+
+
+class ShardedDispatcher:
+    def __init__(self, workers: int = 4, slowHandlerMs: int = 500) -> None:
+        """
+        Initialize the ShardedDispatcher class.
+
+        Args:
+            workers (int, optional): Number of worker threads, each one owning a shard (default is 4).
+            slowHandlerMs (int, optional): Callbacks running longer than this are logged as warning (default is 500).
+        """
+        self.slowHandlerMs = slowHandlerMs
+        self.queues: List[queue.Queue] = [queue.Queue() for _ in range(workers)]
+        self.stats: Dict[str, CallbackStats] = {}
+        self.statsLock = threading.Lock()
+        self.threads: List[threading.Thread] = []
+
+        for index, workQueue in enumerate(self.queues):
+            thread = threading.Thread(target=self.__work, args=(workQueue,), name=f"MqttDispatcher-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, topic: str, callback: Callable[[str, str], None], payload: object, name: str = None) -> None:
+        """
+        Queue a callback invocation on the worker owning the topic.
+
+        Args:
+            topic (str): The topic of the message, used to select the shard.
+            callback (Callable[[str, str], None]): The callback to invoke with topic and payload.
+            payload (object): The payload of the message.
+            name (str, optional): Key of the statistics of the callback, e.g. its subscription.
+                Qualified name and id of the callback if not given.
+        """
+        if name is None:
+            name = f"{getattr(callback, '__qualname__', repr(callback))}@{id(callback):x}"
+        self.queues[hash(topic) % len(self.queues)].put((callback, topic, payload, name))
+
+    def __work(self, workQueue: queue.Queue) -> None:
+        while True:
+            item = workQueue.get()
+            if item is None:
+                break
+
+            callback, topic, payload, name = item
+            start = time.perf_counter()
+            try:
+                callback(topic, payload)
+            except BaseException:
+                logger.exception('Callback for topic %s failed', topic)
+            durationMs = (time.perf_counter() - start) * 1000
+
+            self.__record(name, topic, durationMs)
+
+    def __record(self, name: str, topic: str, durationMs: float) -> None:
+        slow = durationMs > self.slowHandlerMs
+
+        with self.statsLock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = CallbackStats()
+            stats.add(durationMs, slow)
+
+        if slow:
+            logger.warning("Slow MQTT callback %s for topic %s took %.1f ms", name, topic, durationMs)
+
+    def getStats(self) -> Dict[str, dict]:
+        """
+        Get timing statistics per callback.
+
+        Returns:
+            Dict[str, dict]: Count, total, average and maximum duration in ms and number of slow runs, keyed by the
+                name given to submit.
+        """
+        with self.statsLock:
+            return {name: stats.asDict() for name, stats in self.stats.items()}
+
+    def getBacklog(self) -> int:
+        """
+        Get the number of queued, not yet processed callback invocations.
+        """
+        return sum(workQueue.qsize() for workQueue in self.queues)
+
+    def stop(self) -> None:
+        """
+        Stop the worker threads after all queued callbacks are processed.
+        """
+        if not self.threads:
+            return
+        for workQueue in self.queues:
+            workQueue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
@@ -0,0 +1,104 @@
+# This class buffers a byte stream, e.g. of a serial port, until complete frames are consumed.
+# Data is appended at the end and consumed at the front. Deleting a prefix of a bytearray only moves its start,
+# so consume() does not copy the remaining data and the buffer is compacted only when it grows.
+# peek() of the whole buffer keeps its copy until the data changes, polling without new data copies nothing.
+import logging
+from typing import Optional
+
+logger = logging.getLogger('PythonLib.RingBuffer')
+
+
+class RingBuffer:
+    def __init__(self, maxSize: int = 65536) -> None:
+        """
+        Initialize the RingBuffer class.
+
+        Args:
+            maxSize (int, optional): Maximum number of buffered bytes, the oldest ones are dropped if exceeded
+                (default is 65536).
+        """
+        self.data = bytearray()
+        self.maxSize = maxSize
+        self.overflowCount = 0
+        # Copy of the whole buffer returned by peek(), None after every change
+        self.snapshot: Optional[bytes] = None
+
+    def append(self, data: bytes) -> None:
+        """
+        Append received data.
+
+        Args:
+            data (bytes): The data.
+        """
+        self.data += data
+        self.snapshot = None
+        overflow = len(self.data) - self.maxSize
+        if overflow > 0:
+            logger.warning("Buffer overflow, dropping %i bytes", overflow)
+            self.overflowCount += overflow
+            del self.data[:overflow]
+
+    def peek(self, size: int = None) -> bytes:
+        """
+        Get data without consuming it.
+
+        Args:
+            size (int, optional): Maximum number of bytes, all if not given.
+
+        Returns:
+            bytes: A copy of the oldest bytes, the copy of the whole buffer is reused as long as the data is unchanged.
+        """
+        if size is None:
+            if self.snapshot is None:
+                self.snapshot = bytes(self.data)
+            return self.snapshot
+        return bytes(self.data[:size])
+
+    def consume(self, size: int) -> int:
+        """
+        Remove the oldest bytes.
+
+        Args:
+            size (int): Number of bytes.
+
+        Returns:
+            int: Number of removed bytes, less than size if the buffer was shorter.
+        """
+        size = min(size, len(self.data))
+        if size:
+            del self.data[:size]
+            self.snapshot = None
+        return size
+
+    def read(self, size: int = None) -> bytes:
+        """Same as peek, but the returned bytes are consumed."""
+        data = self.peek(size)
+        self.consume(len(data))
+        return data
+
+    def find(self, delimiter: bytes, start: int = 0) -> int:
+        """
+        Search the buffer, e.g. for the end of a frame.
+
+        Args:
+            delimiter (bytes): The bytes searched for.
+            start (int, optional): Position the search starts at, to skip data already searched.
+
+        Returns:
+            int: Position of the delimiter relative to the oldest byte, -1 if not found.
+        """
+        return self.data.find(delimiter, start)
+
+    def startswith(self, prefix: bytes) -> bool:
+        return self.data.startswith(prefix)
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.snapshot = None
+
+    def getOverflowCount(self) -> int:
+        """Get the number of bytes dropped because the buffer was full."""
+        return self.overflowCount
+
+    def __len__(self) -> int:
+        return len(self.data)
@@ -1,23 +1,169 @@
-from typing import Callable, List
-from datetime import datetime, timedelta, time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from datetime import datetime, timedelta, time, tzinfo
+from enum import Enum
+import heapq
+import itertools
 import logging
+import threading
 import time as oldTime
+import traceback
+
+from PythonLib.Cron import CronExpression
+from PythonLib.Histogram import Histogram
+from PythonLib.TimingWheel import TimingWheel
 
 logger = logging.getLogger('PythonLib.Scheduler')
 
+LOCAL_EPOCH = datetime(1970, 1, 1)
+# Deviation of the wall clock from the monotonic clock after which the deadlines of absolute tasks are recomputed
+WALL_CLOCK_JUMP_MS = 1000
+
+
+class CatchUpPolicy(Enum):
+    """Behavior of a periodic task which missed one or more of its runs, e.g. because loop() was blocked."""
+    SKIP = 1      # A run late by a full period or more is dropped, the task realigns to its period grid
+    COALESCE = 2  # Missed runs are combined into one run, the task realigns to its period grid
+    BURST = 3     # Every missed run is executed, one per loop() call, until the task caught up
+
+    def nextRun(self, lastRun, period, now):
+        """Returns the next run of a fixed-rate task. lastRun is the scheduled, not the actual time of the last run."""
+        if not period:
+            return now
+
+        nextRun = lastRun + period
+        if self != CatchUpPolicy.BURST and nextRun <= now:
+            nextRun = lastRun + ((now - lastRun) // period + 1) * period
+        return nextRun
+
+
+class ExecutionMode(Enum):
+    """Where the callback of a task is executed."""
+    INLINE = 1   # In loop(), blocking all other tasks while running
+    THREAD = 2   # In the thread pool of the Scheduler
+    PROCESS = 3  # In the process pool of the Scheduler, the callback has to be picklable
+
+
+class OverrunPolicy(Enum):
+    """Behavior if a task offloaded to a pool is due again while its previous run is still executing."""
+    SKIP = 1        # The new run is dropped
+    QUEUE = 2       # The new run starts when the previous one finished, at most one run waits
+    CONCURRENT = 3  # The new run starts immediately in parallel
+
+
+class TaskMetrics:
+    """Metrics of all tasks sharing a name, durations and lateness in ms."""
+
+    __slots__ = ('runCount', 'overrunCount', 'failureCount', 'durationHistogram', 'latenessHistogram')
+
+    def __init__(self) -> None:
+        self.runCount = 0
+        self.overrunCount = 0
+        self.failureCount = 0
+        self.durationHistogram = Histogram()
+        self.latenessHistogram = Histogram()
+
+    def asDict(self) -> dict:
+        return {
+            'runCount': self.runCount,
+            'overrunCount': self.overrunCount,
+            'failureCount': self.failureCount,
+            'durationMs': self.durationHistogram.asDict(),
+            'latenessMs': self.latenessHistogram.asDict()
+        }
+
+
+def timedCall(callback: Callable[[None], None]) -> Tuple[float, Optional[str]]:
+    """Runs a callback, module level to be usable in a process pool. Returns duration in ms and traceback if it failed."""
+    start = oldTime.perf_counter()
+    error = None
+    try:
+        callback()
+    except BaseException:
+        error = traceback.format_exc()
+    return ((oldTime.perf_counter() - start) * 1000, error)
+
 
 class Task:
-    def __init__(self, callback: Callable[[None], None]) -> None:
+    __slots__ = ('callback', 'catchUpPolicy', 'scheduled', 'inHeap', 'cancelled', 'runCount', 'lastLatenessMs',
+                 'maxLatenessMs', 'executionMode', 'overrunPolicy', 'runningCount', 'runQueued')
+
+    def __init__(self, callback: Callable[[None], None], catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE) -> None:
         self.callback = callback
+        self.catchUpPolicy = catchUpPolicy
+        self.scheduled = False
+        # True while an entry of the task is in the heap of the scheduler, it is popped before the callback runs
+        self.inHeap = False
+        self.cancelled = False
+
+        self.runCount = 0
+        self.lastLatenessMs = 0
+        self.maxLatenessMs = 0
+
+        self.executionMode = ExecutionMode.INLINE
+        self.overrunPolicy = OverrunPolicy.SKIP
+        # Runs currently executing in a pool and whether one more run waits for them
+        self.runningCount = 0
+        self.runQueued = False
 
     def getFct(self) -> Callable[[None], None]:
         """Returns the callback function of the task"""
         return self.callback
 
+    def isCancelled(self) -> bool:
+        """Returns True if the task was cancelled"""
+        return self.cancelled
+
+    def getName(self) -> str:
+        """Returns the name of the callback, used to group the metrics"""
+        return getattr(self.callback, '__qualname__', repr(self.callback))
+
+    def setExecution(self, executionMode: ExecutionMode, overrunPolicy: OverrunPolicy) -> None:
+        self.executionMode = executionMode
+        self.overrunPolicy = overrunPolicy
+
+    def getPeriodMs(self) -> int:
+        """Returns the period of a reloading task"""
+        raise NotImplementedError
+
+    def isMissed(self, latenessMs: int) -> bool:
+        """Returns True if the current run shall be dropped because of the catch-up policy"""
+        return self.catchUpPolicy == CatchUpPolicy.SKIP and self.isReloading() and latenessMs >= self.getPeriodMs()
+
+    def recordRun(self, latenessMs: int) -> None:
+        """Records the lateness of a run, i.e. the time between deadline and actual start"""
+        self.runCount += 1
+        self.lastLatenessMs = latenessMs
+        self.maxLatenessMs = max(self.maxLatenessMs, latenessMs)
+
+    def getRunCount(self) -> int:
+        return self.runCount
+
+    def getLastLatenessMs(self) -> int:
+        return self.lastLatenessMs
+
+    def getMaxLatenessMs(self) -> int:
+        return self.maxLatenessMs
+
+    def getDeadlineMs(self) -> int:
+        """Returns the deadline of the next run, the task is due as soon as Scheduler.getMonotonicMillis() is past it"""
+        raise NotImplementedError
+
+    def isReloading(self) -> bool:
+        """Returns the reloading status of the task"""
+        raise NotImplementedError
+
+    def reload(self) -> None:
+        """Advances the task to its next run"""
+        raise NotImplementedError
+
 
 class AbsDateTask(Task):
-    def __init__(self, startDate: datetime, callback: Callable[[None], None], reloading: timedelta = None) -> None:
-        super().__init__(callback)
+    __slots__ = ('startDate', 'reloading')
+
+    def __init__(self, startDate: datetime, callback: Callable[[None], None], reloading: timedelta = None,
+                 catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE) -> None:
+        super().__init__(callback, catchUpPolicy)
         self.startDate = startDate
         self.reloading = reloading
 
@@ -30,28 +176,101 @@ class AbsDateTask(Task):
     def getReloading(self) -> timedelta:
         return self.reloading
 
+    def getDeadlineMs(self) -> int:
+        return Scheduler.dateToMillis(self.startDate)
+
+    def isReloading(self) -> bool:
+        return bool(self.reloading)
+
+    def getPeriodMs(self) -> int:
+        return int(self.reloading.total_seconds() * 1000)
+
+    def reload(self) -> None:
+        self.startDate = self.catchUpPolicy.nextRun(self.startDate, self.reloading, datetime.now(self.startDate.tzinfo))
+
 
 class AbsTimeTask(Task):
-    def __init__(self, startTime: time, callback: Callable[[None], None], reloading: timedelta = None) -> None:
-        super().__init__(callback)
+    __slots__ = ('startTime', 'reloading', 'nextDate')
+
+    def __init__(self, startTime: time, callback: Callable[[None], None], reloading: timedelta = None,
+                 catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE) -> None:
+        super().__init__(callback, catchUpPolicy)
         self.startTime = startTime
         self.reloading = reloading
+        # Full date of the next run, so reloading across midnight keeps the right day
+        self.nextDate = datetime.combine(datetime.today(), startTime)
 
     def getStartTime(self) -> time:
         return self.startTime
 
     def setStartTime(self, startTime: time) -> None:
         self.startTime = startTime
+        self.nextDate = datetime.combine(self.nextDate.date(), startTime)
+
+    def getNextDate(self) -> datetime:
+        return self.nextDate
+
+    def setNextDate(self, nextDate: datetime) -> None:
+        self.nextDate = nextDate
+        self.startTime = nextDate.time()
 
     def getReloading(self) -> timedelta:
         return self.reloading
 
+    def getDeadlineMs(self) -> int:
+        return Scheduler.dateToMillis(self.nextDate)
+
+    def isReloading(self) -> bool:
+        return bool(self.reloading)
+
+    def getPeriodMs(self) -> int:
+        return int(self.reloading.total_seconds() * 1000)
+
+    def reload(self) -> None:
+        self.setNextDate(self.catchUpPolicy.nextRun(self.nextDate, self.reloading, datetime.now()))
+
+
+class CronTask(Task):
+    __slots__ = ('cronExpression', 'nextDate')
+
+    def __init__(self, cronExpression: CronExpression, callback: Callable[[None], None],
+                 catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE) -> None:
+        super().__init__(callback, catchUpPolicy)
+        self.cronExpression = cronExpression
+        # Computed once per run, nothing is evaluated between two runs
+        self.nextDate = cronExpression.nextFireTime(datetime.now(cronExpression.timeZone))
+
+    def getCronExpression(self) -> CronExpression:
+        return self.cronExpression
+
+    def getNextDate(self) -> datetime:
+        return self.nextDate
+
+    def getDeadlineMs(self) -> int:
+        return Scheduler.dateToMillis(self.nextDate)
+
+    def isReloading(self) -> bool:
+        return True
+
+    def getPeriodMs(self) -> int:
+        """Distance to the run after the next one, a cron schedule has no fixed period"""
+        return int((self.cronExpression.nextFireTime(self.nextDate) - self.nextDate).total_seconds() * 1000)
+
+    def reload(self) -> None:
+        if self.catchUpPolicy == CatchUpPolicy.BURST:
+            self.nextDate = self.cronExpression.nextFireTime(self.nextDate)
+        else:
+            self.nextDate = self.cronExpression.nextFireTime(max(self.nextDate, datetime.now(self.nextDate.tzinfo)))
+
 
 class RelMsTask(Task):
     """A class used to represent a Task."""
 
-    def __init__(self, startTimeMs: int, durationMs: int, callback: Callable[[None], None], reloading: bool) -> None:
-        super().__init__(callback)
+    __slots__ = ('startTimeMs', 'durationMs', 'reloading')
+
+    def __init__(self, startTimeMs: int, durationMs: int, callback: Callable[[None], None], reloading: bool,
+                 catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE) -> None:
+        super().__init__(callback, catchUpPolicy)
         self.startTimeMs = startTimeMs
         self.durationMs = durationMs
         self.reloading = reloading
@@ -72,112 +291,321 @@ class RelMsTask(Task):
         """Returns the reloading status of the task"""
         return self.reloading
 
+    def getDeadlineMs(self) -> int:
+        return self.startTimeMs + self.durationMs
 
-class Scheduler:
-    """A class used to represent a Scheduler."""
-
-    def __init__(self) -> None:
-        self.relMsTaskList: List[RelMsTask] = []
-        self.absDateTaskList: List[AbsDateTask] = []
-        self.absTimeTaskList: List[AbsTimeTask] = []
-
-    def __loopRelMsTaskList(self) -> None:
-        """Executes tasks from the relMsTaskList based on their start time and duration."""
-        deleteRelMsTaskList: List[RelMsTask] = []
-
-        for task in self.relMsTaskList:
-            # https://arduino.stackexchange.com/questions/12587/how-can-i-handle-the-millis-rollover/12588#12588
-            if Scheduler.getMillis() - task.getStartTime() > task.getDuration():
-                try:
-                    # Call the function
-                    task.getFct()()
-                except BaseException:
-                    logging.exception('')
-
-                if task.isReloading():
-                    task.setStartTime(Scheduler.getMillis())
-                else:
-                    # mark current task to delete
-                    deleteRelMsTaskList.append(task)
-
-        for task in deleteRelMsTaskList:
-            self.relMsTaskList.remove(task)
-
-        logger.debug("JobList size: %i", len(self.relMsTaskList))
-
-    def __loopAbsDateTaskList(self) -> None:
-        """Executes tasks from the absDateTaskList based on their start date."""
-        deleteAbsDateTaskList: List[AbsDateTask] = []
-
-        for task in self.absDateTaskList:
-            if datetime.now() > task.getStartDate():
-                try:
-                    # Call the function
-                    task.getFct()()
-                except BaseException:
-                    logging.exception('')
-
-                if task.getReloading():
-                    task.setStartDate(task.getStartDate() + task.getReloading())
-                else:
-                    # mark current task to delete
-                    deleteAbsDateTaskList.append(task)
-
-        for task in deleteAbsDateTaskList:
-            self.absDateTaskList.remove(task)
-
-        logger.debug("JobList size: %i", len(self.absDateTaskList))
-
-    def __loopAbsTimeTaskList(self) -> None:
-        """Executes tasks from the absTimeTaskList based on their start time."""
-        deleteAbsTimeTaskList: List[AbsTimeTask] = []
-
-        for task in self.absTimeTaskList:
-            if datetime.now().time() > task.getStartTime():
-                try:
-                    # Call the function
-                    task.getFct()()
-                except BaseException:
-                    logging.exception('')
-
-                if task.getReloading():
-                    task.setStartTime((datetime.combine(datetime.today(), task.getStartTime()) + task.getReloading()).time())
-                else:
-                    # mark current task to delete
-                    deleteAbsTimeTaskList.append(task)
-
-        for task in deleteAbsTimeTaskList:
-            self.absDateTaskList.remove(task)
-
-        logger.debug("JobList size: %i", len(self.absDateTaskList))
+    def getPeriodMs(self) -> int:
+        return self.durationMs
 
-    def loop(self) -> None:
-        """Executes tasks from all task lists."""
-        self.__loopAbsDateTaskList()
-        self.__loopAbsTimeTaskList()
-        self.__loopRelMsTaskList()
+    def reload(self) -> None:
+        """Fixed rate: the next period starts at the end of the current one, independent of the callback runtime"""
+        self.startTimeMs = self.catchUpPolicy.nextRun(self.getDeadlineMs(), self.durationMs, Scheduler.getMonotonicMillis()) - self.durationMs
 
-    def oneShoot(self, callback: Callable[[None], None], timePeriodMs: int) -> None:
-        """Adds a new non-reloading task to the task list."""
-        self.relMsTaskList.append(RelMsTask(Scheduler.getMillis(), timePeriodMs, callback, False))
 
-    def scheduleEach(self, callback: Callable[[None], None], timePeriodMs: int) -> None:
-        """Adds a new reloading task to the task list."""
-        self.relMsTaskList.append(RelMsTask(Scheduler.getMillis(), timePeriodMs, callback, True))
+class Scheduler:
+    """A class used to represent a Scheduler."""
 
-    def scheduleAtTime(self, callback: Callable[[None], None], startTime: time, reloading: timedelta = None) -> None:
-        """Adds a new time-based task to the task list."""
-        self.absTimeTaskList.append(AbsTimeTask(startTime, callback, reloading))
+    def __init__(self, timingWheelTickMs: int = None, maxWorkers: int = 4) -> None:
+        """
+        Args:
+            timingWheelTickMs (int, optional): If set, relative tasks (oneShoot, scheduleEach) are kept in a
+                hierarchical timing wheel with this resolution instead of the heap. Insert and cancel are O(1) then,
+                worth it for huge numbers of short timers which are mostly cancelled before they fire.
+            maxWorkers (int, optional): Size of the thread and process pool for tasks not executed inline.
+        """
+        # Min-heap of (deadlineMs, sequence, task), the sequence keeps insertion order for equal deadlines
+        self.taskHeap: List[Tuple[int, int, Task]] = []
+        self.sequence = itertools.count()
+        # Cancelled tasks stay in the heap until they are popped or the heap is compacted
+        self.cancelledInHeap = 0
+        # Absolute tasks are converted into monotonic deadlines once, they are updated if the wall clock jumps
+        self.wallClockOffsetMs = Scheduler.getWallClockOffsetMs()
+
+        self.timingWheel: TimingWheel = None
+        if timingWheelTickMs:
+            self.timingWheel = TimingWheel(Scheduler.getMonotonicMillis(), timingWheelTickMs)
+
+        # Pools are created on first use
+        self.maxWorkers = maxWorkers
+        self.executors: Dict[ExecutionMode, Executor] = {}
+        # Protects metrics and run bookkeeping, pool runs finish in other threads
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, TaskMetrics] = {}
+
+    def __push(self, task: Task) -> None:
+        """Adds a task to the heap or the timing wheel at its deadline."""
+        task.scheduled = True
+        if self.timingWheel is not None and isinstance(task, RelMsTask):
+            self.timingWheel.add(task, task.getDeadlineMs())
+        else:
+            task.inHeap = True
+            heapq.heappush(self.taskHeap, (task.getDeadlineMs(), next(self.sequence), task))
+
+    def __pop(self) -> Task:
+        task = heapq.heappop(self.taskHeap)[2]
+        task.inHeap = False
+        if task.isCancelled():
+            self.cancelledInHeap -= 1
+        return task
+
+    def __checkWallClock(self) -> None:
+        wallClockOffsetMs = Scheduler.getWallClockOffsetMs()
+        if abs(wallClockOffsetMs - self.wallClockOffsetMs) > WALL_CLOCK_JUMP_MS:
+            logger.info("Wall clock jumped by %i ms", wallClockOffsetMs - self.wallClockOffsetMs)
+            self.wallClockOffsetMs = wallClockOffsetMs
+            Scheduler.updateAbsoluteDeadlines(self.taskHeap)
 
-    def scheduleAtDate(self, callback: Callable[[None], None], startDate: datetime, reloading: timedelta = None) -> None:
+    def loop(self) -> None:
+        """Executes all tasks which are due. Only tasks at the top of the heap are touched."""
+        self.__checkWallClock()
+        nowMs = Scheduler.getMonotonicMillis()
+
+        # Collect first, so a reloading task runs at most once per loop
+        dueTasks: List[Task] = []
+        while self.taskHeap and self.taskHeap[0][0] < nowMs:
+            task = self.__pop()
+            if not task.isCancelled():
+                dueTasks.append(task)
+
+        if self.timingWheel is not None:
+            dueTasks.extend(self.timingWheel.advance(nowMs))
+
+        for task in dueTasks:
+            # A previous callback may have cancelled this task
+            if task.isCancelled():
+                continue
+
+            latenessMs = max(0, Scheduler.getMonotonicMillis() - task.getDeadlineMs() - 1)
+            if task.isMissed(latenessMs):
+                logger.debug("Task %s skipped, %i ms late", task.getFct(), latenessMs)
+            else:
+                task.recordRun(latenessMs)
+                self.__execute(task, latenessMs)
+
+            if task.isReloading() and not task.isCancelled():
+                task.reload()
+                self.__push(task)
+            else:
+                task.scheduled = False
+
+        if dueTasks:
+            logger.debug("JobList size: %i", self.getTaskSize())
+
+    def __getMetrics(self, task: Task) -> TaskMetrics:
+        metrics = self.metrics.get(task.getName())
+        if metrics is None:
+            metrics = self.metrics[task.getName()] = TaskMetrics()
+        return metrics
+
+    def __getExecutor(self, executionMode: ExecutionMode) -> Executor:
+        executor = self.executors.get(executionMode)
+        if executor is None:
+            if executionMode == ExecutionMode.PROCESS:
+                executor = ProcessPoolExecutor(self.maxWorkers)
+            else:
+                executor = ThreadPoolExecutor(self.maxWorkers, thread_name_prefix='Scheduler')
+            self.executors[executionMode] = executor
+        return executor
+
+    def __execute(self, task: Task, latenessMs: int) -> None:
+        """Runs the callback inline or hands it over to a pool, applying the overrun policy."""
+        with self.lock:
+            metrics = self.__getMetrics(task)
+            metrics.latenessHistogram.add(latenessMs)
+
+        if task.executionMode == ExecutionMode.INLINE:
+            durationMs, error = timedCall(task.getFct())
+            self.__finished(task, durationMs, error)
+            return
+
+        with self.lock:
+            if task.runningCount > 0:
+                metrics.overrunCount += 1
+                if task.overrunPolicy == OverrunPolicy.SKIP:
+                    logger.debug("Task %s still running, run skipped", task.getName())
+                    return
+                if task.overrunPolicy == OverrunPolicy.QUEUE:
+                    task.runQueued = True
+                    return
+            task.runningCount += 1
+
+        self.__submit(task)
+
+    def __submit(self, task: Task) -> None:
+        try:
+            future = self.__getExecutor(task.executionMode).submit(timedCall, task.getFct())
+        except RuntimeError:
+            # Pool already shut down
+            logger.warning("Task %s not started, scheduler shut down", task.getName())
+            with self.lock:
+                task.runningCount -= 1
+            return
+        future.add_done_callback(lambda future: self.__poolRunDone(task, future))
+
+    def __poolRunDone(self, task: Task, future: Future) -> None:
+        """Called in the context of the pool when an offloaded run finished."""
+        try:
+            durationMs, error = future.result()
+        except BaseException:
+            durationMs, error = 0.0, traceback.format_exc()
+
+        self.__finished(task, durationMs, error)
+
+        with self.lock:
+            task.runningCount -= 1
+            startQueued = task.runQueued and not task.isCancelled()
+            task.runQueued = False
+            if startQueued:
+                task.runningCount += 1
+
+        if startQueued:
+            self.__submit(task)
+
+    def __finished(self, task: Task, durationMs: float, error: Optional[str]) -> None:
+        with self.lock:
+            metrics = self.__getMetrics(task)
+            metrics.runCount += 1
+            metrics.durationHistogram.add(durationMs)
+            if error:
+                metrics.failureCount += 1
+
+        if error:
+            logger.error("Task %s failed:\n%s", task.getName(), error)
+
+    def getMetrics(self) -> Dict[str, dict]:
+        """Returns run count, overruns, failures and duration and lateness histograms, keyed by task name."""
+        with self.lock:
+            return {name: metrics.asDict() for name, metrics in self.metrics.items()}
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts down the thread and process pools."""
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
+        self.executors = {}
+
+    def timeUntilNextTask(self) -> Optional[int]:
+        """Returns the time in ms until the next task is due, 0 if one is due already and None if there is no task."""
+        self.__checkWallClock()
+        while self.taskHeap and self.taskHeap[0][2].isCancelled():
+            self.__pop()
+
+        nextDueMs = self.taskHeap[0][0] + 1 if self.taskHeap else None
+
+        if self.timingWheel is not None:
+            wheelDueMs = self.timingWheel.getNextExpiryMs()
+            if wheelDueMs is not None and (nextDueMs is None or wheelDueMs < nextDueMs):
+                nextDueMs = wheelDueMs
+
+        if nextDueMs is None:
+            return None
+        return max(0, nextDueMs - Scheduler.getMonotonicMillis())
+
+    def cancel(self, task: Task) -> bool:
+        """Cancels a task returned by one of the schedule functions. Returns False if it was not pending anymore."""
+        if not Scheduler.cancelTask(task):
+            return False
+
+        if self.timingWheel is not None and self.timingWheel.remove(task):
+            return True
+
+        # A task cancelled by a callback of the current loop() has been popped already
+        if task.inHeap:
+            self.cancelledInHeap = Scheduler.compactHeap(self.taskHeap, self.cancelledInHeap + 1)
+
+        return True
+
+    def __schedule(self, task: Task, executionMode: ExecutionMode, overrunPolicy: OverrunPolicy) -> Task:
+        task.setExecution(executionMode, overrunPolicy)
+        self.__push(task)
+        return task
+
+    def oneShoot(self, callback: Callable[[None], None], timePeriodMs: int,
+                 executionMode: ExecutionMode = ExecutionMode.INLINE) -> RelMsTask:
+        """Adds a new non-reloading task to the task list. The returned task can be passed to cancel()."""
+        return self.__schedule(RelMsTask(Scheduler.getMonotonicMillis(), timePeriodMs, callback, False),
+                               executionMode, OverrunPolicy.CONCURRENT)
+
+    def scheduleEach(self, callback: Callable[[None], None], timePeriodMs: int,
+                     catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                     executionMode: ExecutionMode = ExecutionMode.INLINE,
+                     overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> RelMsTask:
+        """Adds a new reloading fixed-rate task to the task list. The returned task can be passed to cancel()."""
+        return self.__schedule(RelMsTask(Scheduler.getMonotonicMillis(), timePeriodMs, callback, True, catchUpPolicy),
+                               executionMode, overrunPolicy)
+
+    def scheduleAtTime(self, callback: Callable[[None], None], startTime: time, reloading: timedelta = None,
+                       catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                       executionMode: ExecutionMode = ExecutionMode.INLINE,
+                       overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> AbsTimeTask:
+        """Adds a new time-based task to the task list. A start time already passed today is due immediately."""
+        return self.__schedule(AbsTimeTask(startTime, callback, reloading, catchUpPolicy), executionMode, overrunPolicy)
+
+    def scheduleAtDate(self, callback: Callable[[None], None], startDate: datetime, reloading: timedelta = None,
+                       catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                       executionMode: ExecutionMode = ExecutionMode.INLINE,
+                       overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> AbsDateTask:
         """Adds a new date-based task to the task list."""
-        self.absDateTaskList.append(AbsDateTask(startDate, callback, reloading))
+        return self.__schedule(AbsDateTask(startDate, callback, reloading, catchUpPolicy), executionMode, overrunPolicy)
+
+    def scheduleCron(self, callback: Callable[[None], None], expression: str, timeZone: Union[tzinfo, str] = None,
+                     catchUpPolicy: CatchUpPolicy = CatchUpPolicy.COALESCE,
+                     executionMode: ExecutionMode = ExecutionMode.INLINE,
+                     overrunPolicy: OverrunPolicy = OverrunPolicy.SKIP) -> CronTask:
+        """Adds a new task running on a cron schedule like "*/5 * * * 1-5" to the task list."""
+        return self.__schedule(CronTask(CronExpression(expression, timeZone), callback, catchUpPolicy),
+                               executionMode, overrunPolicy)
 
     @staticmethod
     def getMillis() -> int:
         """Returns the current time in milliseconds."""
         return int(oldTime.time() * 1000)
 
+    @staticmethod
+    def getMonotonicMillis() -> int:
+        """Returns the time of a monotonic clock in milliseconds, the time base of all deadlines. Only differences are meaningful."""
+        return oldTime.monotonic_ns() // 1000000
+
+    @staticmethod
+    def dateToMillis(date: datetime) -> int:
+        """Converts a wall clock date, naive local or time zone aware, into the time base of getMonotonicMillis."""
+        return Scheduler.getMonotonicMillis() + int((date - datetime.now(date.tzinfo)).total_seconds() * 1000)
+
+    @staticmethod
+    def getWallClockOffsetMs() -> int:
+        """Returns the local wall clock minus the monotonic clock, it jumps with NTP steps, DST and manual changes."""
+        return int((datetime.now() - LOCAL_EPOCH).total_seconds() * 1000) - Scheduler.getMonotonicMillis()
+
+    @staticmethod
+    def updateAbsoluteDeadlines(taskHeap: List[Tuple[int, int, Task]]) -> None:
+        """Converts the wall clock dates of the absolute tasks in a heap into deadlines again, after the wall clock jumped."""
+        for index, (deadlineMs, sequence, task) in enumerate(taskHeap):
+            if not isinstance(task, RelMsTask) and not task.isCancelled():
+                taskHeap[index] = (task.getDeadlineMs(), sequence, task)
+        heapq.heapify(taskHeap)
+
+    @staticmethod
+    def cancelTask(task: Task) -> bool:
+        """Marks a task as cancelled, its heap entry is skipped when popped. Returns False if it was not pending anymore."""
+        if not task.scheduled or task.isCancelled():
+            return False
+
+        task.cancelled = True
+        task.scheduled = False
+        return True
+
+    @staticmethod
+    def compactHeap(taskHeap: List[Tuple[int, int, Task]], cancelledInHeap: int) -> int:
+        """Removes the cancelled tasks from a heap in place, once they are the majority. Returns the number left in it."""
+        if cancelledInHeap <= 64 or cancelledInHeap * 2 <= len(taskHeap):
+            return cancelledInHeap
+
+        for entry in taskHeap:
+            if entry[2].isCancelled():
+                entry[2].inHeap = False
+        taskHeap[:] = [entry for entry in taskHeap if not entry[2].isCancelled()]
+        heapq.heapify(taskHeap)
+        return 0
+
     @staticmethod
     def getSeconds() -> int:
         """Returns the current time in seconds."""
@@ -185,4 +613,5 @@ class Scheduler:
 
     def getTaskSize(self) -> int:
         """Returns the number of tasks in the task list."""
-        return len(self.relMsTaskList) + len(self.absDateTaskList) + len(self.absTimeTaskList)
+        wheelSize = len(self.timingWheel) if self.timingWheel is not None else 0
+        return len(self.taskHeap) - self.cancelledInHeap + wheelSize
@@ -1,19 +1,35 @@
 # This class provides an interface for serial port communication, with options for both hardware and dummy (testing) implementations.
 import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
 import serial
 
+from PythonLib.RingBuffer import RingBuffer
+
 logger = logging.getLogger('PythonLib.SerPort')
 
 # See https://pyserial.readthedocs.io/en/latest/shortintro.html
 
 
+def readAvailable(serPort: serial.Serial) -> bytes:
+    """
+    Block until data is received, then read all received bytes. Returns b'' if the read was cancelled.
+
+    Args:
+        serPort (serial.Serial): The port, opened without timeout.
+    """
+    return serPort.read(max(1, serPort.in_waiting))
+
+
 class SerPort:
     def read(self) -> bytes:
         """
-        Read data from the serial port.
+        Read data from the serial port. Frames are taken without copying the buffer with find() and consume().
 
         Returns:
-            bytes: The data read from the port.
+            bytes: All buffered data, the same object as long as no data was received or deleted.
         """
         raise NotImplementedError
 
@@ -28,13 +44,38 @@ class SerPort:
 
     def delete(self, bytesToDelete: bytes) -> None:
         """
-        Delete specific bytes from the buffer.
+        Delete a processed frame from the buffer, together with any data received before it.
 
         Args:
             bytesToDelete (bytes): The bytes to be deleted from the buffer.
         """
         raise NotImplementedError
 
+    def consume(self, size: int) -> int:
+        """
+        Delete the oldest bytes from the buffer.
+
+        Args:
+            size (int): Number of bytes.
+
+        Returns:
+            int: Number of deleted bytes.
+        """
+        raise NotImplementedError
+
+    def find(self, delimiter: bytes, start: int = 0) -> int:
+        """
+        Search the buffer, e.g. for the end of a frame.
+
+        Args:
+            delimiter (bytes): The bytes searched for.
+            start (int, optional): Position the search starts at.
+
+        Returns:
+            int: Position of the delimiter relative to the oldest byte, -1 if not found.
+        """
+        raise NotImplementedError
+
     def setup(self) -> None:
         """
         Set up the serial port connection (specific to hardware implementation).
@@ -59,19 +100,39 @@ class SerPort:
         """
         raise NotImplementedError
 
+    def getOverflowCount(self) -> int:
+        """
+        Get the number of received bytes dropped because the buffer was full.
+        """
+        raise NotImplementedError
+
 class SerPortDummy(SerPort):
-    def __init__(self, data: bytes) -> None:
-        self.buffer = data
+    def __init__(self, data: bytes, maxBufferSize: int = 65536) -> None:
+        self.buffer = RingBuffer(maxBufferSize)
+        self.buffer.append(data)
 
     def read(self) -> bytes:
-        return self.buffer
+        return self.buffer.peek()
 
     def write(self, data: bytes) -> None:
-        self.buffer = data
+        self.buffer.clear()
+        self.buffer.append(data)
 
     def delete(self, bytesToDelete: bytes) -> None:
         logger.debug("SerPort delete %s", bytesToDelete)
-        self.buffer = self.buffer.replace(bytesToDelete, b'')
+        if self.buffer.startswith(bytesToDelete):
+            self.buffer.consume(len(bytesToDelete))
+            return
+        # Garbage in front of the frame would never be deleted otherwise
+        position = self.buffer.find(bytesToDelete)
+        if position >= 0:
+            self.buffer.consume(position + len(bytesToDelete))
+
+    def consume(self, size: int) -> int:
+        return self.buffer.consume(size)
+
+    def find(self, delimiter: bytes, start: int = 0) -> int:
+        return self.buffer.find(delimiter, start)
 
     def setup(self) -> None:
         pass
@@ -80,18 +141,28 @@ class SerPortDummy(SerPort):
         pass
 
     def clear(self) -> None:
-        self.buffer = b''
+        self.buffer.clear()
 
     def getBufferSize(self) -> int:
         return len(self.buffer)
 
+    def getOverflowCount(self) -> int:
+        return self.buffer.getOverflowCount()
+
 
 class SerPortHw(SerPortDummy):
 
-    def __init__(self, serPort: serial.Serial) -> None:
-        super().__init__(b'')
+    def __init__(self, serPort: serial.Serial, maxBufferSize: int = 65536) -> None:
+        super().__init__(b'', maxBufferSize)
         self.serial = serPort
 
+        # Reader mode: a thread blocks on the port and fills the buffer, see startReader
+        self.condition = threading.Condition()
+        self.readerThread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        self.frameCallback: Optional[Callable[[bytes], None]] = None
+        self.frameDelimiter = b''
+
     def setup(self) -> None:
 
         self.serial.baudrate = 9600
@@ -107,18 +178,137 @@ class SerPortHw(SerPortDummy):
         self.serial.reset_input_buffer()
         self.serial.reset_output_buffer()
 
+    def startReader(self, frameCallback: Callable[[bytes], None] = None, frameDelimiter: bytes = b'!') -> None:
+        """
+        Start a thread which reads the port as soon as data arrives, read() then only returns the buffer.
+
+        Args:
+            frameCallback (Callable[[bytes], None], optional): Called in the context of the reader thread with every
+                complete frame, the frame is consumed. Without callback frames are taken with readUntil().
+            frameDelimiter (bytes, optional): The end of a frame (default is b'!').
+        """
+        self.frameCallback = frameCallback
+        self.frameDelimiter = frameDelimiter
+        self.stopped.clear()
+        self.readerThread = threading.Thread(target=self.__readLoop, name="SerPortReader", daemon=True)
+        self.readerThread.start()
+
+    def stopReader(self) -> None:
+        """
+        Stop the reader thread, waiting readUntil() calls return None.
+        """
+        self.stopped.set()
+        self.serial.cancel_read()
+        if self.readerThread is not None:
+            self.readerThread.join()
+            self.readerThread = None
+        with self.condition:
+            self.condition.notify_all()
+
+    def isReading(self) -> bool:
+        return self.readerThread is not None and not self.stopped.is_set()
+
+    def __readLoop(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                inputData = readAvailable(self.serial)
+            except (serial.SerialException, OSError):
+                logger.exception("SerPort reader failed")
+                self.stopped.set()
+                break
+            if not inputData:
+                continue
+            logger.debug("SerPort read %s", inputData)
+
+            frames: List[bytes] = []
+            with self.condition:
+                # Only the new data has to be searched, unless the overflow moved the positions
+                searchStart = max(0, len(self.buffer) - len(self.frameDelimiter) + 1)
+                overflowCount = self.buffer.getOverflowCount()
+                self.buffer.append(inputData)
+                if self.frameCallback is not None:
+                    if self.buffer.getOverflowCount() != overflowCount:
+                        searchStart = 0
+                    position = self.buffer.find(self.frameDelimiter, searchStart)
+                    while position >= 0:
+                        frames.append(self.buffer.read(position + len(self.frameDelimiter)))
+                        position = self.buffer.find(self.frameDelimiter)
+                self.condition.notify_all()
+
+            for frame in frames:
+                try:
+                    self.frameCallback(frame)
+                except BaseException:
+                    logger.exception("SerPort frame callback failed")
+
+        with self.condition:
+            self.condition.notify_all()
+
+    def readUntil(self, delimiter: bytes, timeoutS: float = None) -> Optional[bytes]:
+        """
+        Wait for a frame, the reader thread has to be started.
+
+        Args:
+            delimiter (bytes): The end of the frame.
+            timeoutS (float, optional): Maximum waiting time, no limit if not given.
+
+        Returns:
+            Optional[bytes]: The frame including the delimiter, it is consumed together with any data before it.
+                None on timeout or if the reader stopped.
+        """
+        deadline = None if timeoutS is None else time.monotonic() + timeoutS
+        searchStart = 0
+        with self.condition:
+            while True:
+                overflowCount = self.buffer.getOverflowCount()
+                position = self.buffer.find(delimiter, searchStart)
+                if position >= 0:
+                    return self.buffer.read(position + len(delimiter))
+                if not self.isReading():
+                    return None
+
+                remainingS = None if deadline is None else deadline - time.monotonic()
+                if remainingS is not None and remainingS <= 0:
+                    return None
+                length = len(self.buffer)
+                self.condition.wait(remainingS)
+
+                if self.buffer.getOverflowCount() != overflowCount or len(self.buffer) < length:
+                    # Dropped or consumed bytes moved the positions
+                    searchStart = 0
+                else:
+                    searchStart = max(0, length - len(delimiter) + 1)
+
     def write(self, data: bytes) -> None:
         logger.debug("SerPort write %s", data)
         self.serial.write(data)
 
     def read(self) -> bytes:
-        inputData = self.serial.read_all()
-        if inputData:
-            self.buffer = self.buffer + inputData
-            logger.debug("SerPort read %s", self.buffer)
+        with self.condition:
+            if self.isReading():
+                return self.buffer.peek()
+
+            inputData = self.serial.read_all()
+            if inputData:
+                self.buffer.append(inputData)
+                logger.debug("SerPort read %s", inputData)
+
+            return self.buffer.peek()
+
+    def delete(self, bytesToDelete: bytes) -> None:
+        with self.condition:
+            super().delete(bytesToDelete)
+
+    def consume(self, size: int) -> int:
+        with self.condition:
+            return super().consume(size)
 
-        return self.buffer
+    def find(self, delimiter: bytes, start: int = 0) -> int:
+        with self.condition:
+            return super().find(delimiter, start)
 
     def clear(self) -> None:
-        self.buffer = b''
-        self.serial.read_all()
+        with self.condition:
+            self.buffer.clear()
+            if not self.isReading():
+                self.serial.read_all()
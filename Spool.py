@@ -0,0 +1,291 @@
+# This class provides a persistent, append-only spool made of segment files.
+# Records are newline terminated byte strings and are read back in the order they were appended.
+
+import logging
+import os
+import threading
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger('PythonLib.Spool')
+
+SEGMENT_SUFFIX = '.seg'
+CURSOR_FILE = 'cursor'
+
+
+class SyncPolicy(Enum):
+    """When appended records are forced to disk with fsync."""
+    NEVER = 1     # Written to the OS only, records survive a crash of the process but not of the machine
+    INTERVAL = 2  # At most one fsync per syncIntervalMs, a power loss costs at most this time of records
+    ALWAYS = 3    # After every append, slowest
+
+
+class Spool:
+    def __init__(self, directory: Path, segmentSizeBytes: int = 1024 * 1024, maxSizeBytes: int = 64 * 1024 * 1024,
+                 syncPolicy: SyncPolicy = SyncPolicy.NEVER, syncIntervalMs: int = 1000) -> None:
+        """
+        Initialize the Spool class.
+
+        Args:
+            directory (Path): The directory holding the segment files. It is created if missing.
+            segmentSizeBytes (int, optional): Size after which a new segment file is started (default is 1 MiB).
+            maxSizeBytes (int, optional): Size cap of all segments. The oldest segments are dropped if exceeded (default is 64 MiB).
+            syncPolicy (SyncPolicy, optional): When appended records are forced to disk (default is NEVER).
+            syncIntervalMs (int, optional): Minimum time between two fsync calls with SyncPolicy.INTERVAL (default is 1000).
+        """
+        self.directory = directory
+        self.segmentSizeBytes = segmentSizeBytes
+        self.maxSizeBytes = maxSizeBytes
+        self.syncPolicy = syncPolicy
+        self.syncIntervalMs = syncIntervalMs
+        self.lastSyncTime = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.segments: List[int] = []
+        self.segmentSizes = {}
+        self.writeFile = None
+        self.readSegment = 0
+        self.readOffset = 0
+        self.peekPositions: List[Tuple[int, int]] = []
+        # Peeked records dropped by the size cap before they were consumed
+        self.peekDroppedCount = 0
+
+        self.pendingCount = 0
+        self.droppedCount = 0
+
+        self.__setup()
+
+    def __segmentPath(self, segment: int) -> Path:
+        return self.directory / f"{segment:010d}{SEGMENT_SUFFIX}"
+
+    def __setup(self) -> None:
+        """
+        Recover segments and read position left over from a previous run.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for path in self.directory.glob('*' + SEGMENT_SUFFIX):
+            segment = int(path.stem)
+            self.segments.append(segment)
+            self.segmentSizes[segment] = path.stat().st_size
+        self.segments.sort()
+
+        cursorPath = self.directory / CURSOR_FILE
+        if cursorPath.exists():
+            segment, offset = cursorPath.read_text(encoding='utf-8').split()
+            self.readSegment = int(segment)
+            self.readOffset = int(offset)
+
+        # Segments completely consumed before the cursor are garbage
+        while self.segments and self.segments[0] < self.readSegment:
+            segment = self.segments.pop(0)
+            self.__segmentPath(segment).unlink()
+            del self.segmentSizes[segment]
+
+        if self.segments:
+            self.__truncateTornRecord(self.segments[-1])
+
+        if self.segments and self.segments[0] != self.readSegment:
+            self.readSegment = self.segments[0]
+            self.readOffset = 0
+
+        for segment in self.segments:
+            self.pendingCount += self.__countRecords(segment)
+
+        if not self.segments:
+            self.segments.append(self.readSegment)
+            self.segmentSizes[self.readSegment] = 0
+
+        self.writeFile = open(self.__segmentPath(self.segments[-1]), 'ab')
+
+        if self.pendingCount:
+            logger.info("Spool %s recovered with %i pending records", self.directory, self.pendingCount)
+
+    def __truncateTornRecord(self, segment: int) -> None:
+        """
+        Cut off a record which was only partly written before a crash, the next append would continue it otherwise.
+        """
+        path = self.__segmentPath(segment)
+        data = path.read_bytes()
+        if not data or data.endswith(b'\n'):
+            return
+        size = data.rfind(b'\n') + 1
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+        self.segmentSizes[segment] = size
+        logger.warning("Spool %s: truncated torn record of %i bytes", self.directory, len(data) - size)
+
+    def __countRecords(self, segment: int) -> int:
+        """
+        Count the unread records of a segment.
+        """
+        offset = self.readOffset if segment == self.readSegment else 0
+        with open(self.__segmentPath(segment), 'rb') as f:
+            f.seek(offset)
+            return f.read().count(b'\n')
+
+    def __sync(self) -> None:
+        if self.syncPolicy == SyncPolicy.NEVER:
+            return
+        now = time.monotonic()
+        if self.syncPolicy == SyncPolicy.INTERVAL and (now - self.lastSyncTime) * 1000 < self.syncIntervalMs:
+            return
+        os.fsync(self.writeFile.fileno())
+        self.lastSyncTime = now
+
+    def __rollSegment(self) -> None:
+        if self.syncPolicy != SyncPolicy.NEVER:
+            # The records of a finished segment would not be synced anymore otherwise
+            os.fsync(self.writeFile.fileno())
+        self.writeFile.close()
+        segment = self.segments[-1] + 1
+        self.segments.append(segment)
+        self.segmentSizes[segment] = 0
+        self.writeFile = open(self.__segmentPath(segment), 'ab')
+
+    def __dropOldestSegment(self) -> None:
+        """
+        Drop the oldest segment to stay below the size cap.
+        """
+        segment = self.segments.pop(0)
+        dropped = self.__countRecords(segment)
+        self.__segmentPath(segment).unlink()
+        del self.segmentSizes[segment]
+
+        self.pendingCount -= dropped
+        self.droppedCount += dropped
+        self.readSegment = self.segments[0]
+        self.readOffset = 0
+        # Peeked records of later segments can still be consumed
+        keptPositions = [position for position in self.peekPositions if position[0] != segment]
+        self.peekDroppedCount += len(self.peekPositions) - len(keptPositions)
+        self.peekPositions = keptPositions
+        self.__saveCursor()
+
+        logger.warning("Spool %s full, dropped %i records", self.directory, dropped)
+
+    def __saveCursor(self) -> None:
+        (self.directory / CURSOR_FILE).write_text(f"{self.readSegment} {self.readOffset}", encoding='utf-8')
+
+    def append(self, record: bytes) -> None:
+        """
+        Append a record to the end of the spool.
+
+        Args:
+            record (bytes): The record to store. It must not contain a newline.
+        """
+        self.appendMany([record])
+
+    def appendMany(self, records: Iterable[bytes]) -> None:
+        """
+        Append several records with a single flush (and fsync, depending on the sync policy).
+
+        Args:
+            records (Iterable[bytes]): The records to store. They must not contain a newline.
+        """
+        records = list(records)
+        for record in records:
+            if b'\n' in record:
+                raise ValueError("Spool records must not contain a newline")
+
+        with self.lock:
+            for record in records:
+                if self.segmentSizes[self.segments[-1]] >= self.segmentSizeBytes:
+                    self.writeFile.flush()
+                    self.__rollSegment()
+
+                self.writeFile.write(record + b'\n')
+                self.segmentSizes[self.segments[-1]] += len(record) + 1
+                self.pendingCount += 1
+
+            self.writeFile.flush()
+            self.__sync()
+
+            while len(self.segments) > 1 and sum(self.segmentSizes.values()) > self.maxSizeBytes:
+                self.__dropOldestSegment()
+
+    def peek(self, maxRecords: int) -> List[bytes]:
+        """
+        Read the oldest records without removing them.
+
+        Args:
+            maxRecords (int): The maximum number of records to return.
+
+        Returns:
+            List[bytes]: The records in append order.
+        """
+        records: List[bytes] = []
+
+        with self.lock:
+            self.peekPositions = []
+            self.peekDroppedCount = 0
+
+            for segment in self.segments:
+                if len(records) >= maxRecords:
+                    break
+                with open(self.__segmentPath(segment), 'rb') as f:
+                    f.seek(self.readOffset if segment == self.readSegment else 0)
+                    while len(records) < maxRecords:
+                        line = f.readline()
+                        if not line.endswith(b'\n'):
+                            break
+                        records.append(line[:-1])
+                        self.peekPositions.append((segment, f.tell()))
+
+        return records
+
+    def consume(self, count: int) -> None:
+        """
+        Remove records returned by the last call of peek.
+
+        Args:
+            count (int): The number of records to remove, starting with the oldest one.
+        """
+        with self.lock:
+            # Records may have been dropped by the size cap since peek was called, they are gone already
+            dropped = min(count, self.peekDroppedCount)
+            self.peekDroppedCount -= dropped
+            count = min(count - dropped, len(self.peekPositions))
+            if count <= 0:
+                return
+
+            segment, offset = self.peekPositions[count - 1]
+            self.peekPositions = self.peekPositions[count:]
+            self.pendingCount -= count
+
+            # Consumed segments are not needed anymore, except the one being written
+            while self.segments[0] < segment:
+                oldSegment = self.segments.pop(0)
+                self.__segmentPath(oldSegment).unlink()
+                del self.segmentSizes[oldSegment]
+
+            self.readSegment = segment
+            self.readOffset = offset
+            self.__saveCursor()
+
+    def getPendingCount(self) -> int:
+        """
+        Get the number of records not consumed yet.
+        """
+        return self.pendingCount
+
+    def getDroppedCount(self) -> int:
+        """
+        Get the number of records dropped because of the size cap.
+        """
+        return self.droppedCount
+
+    def getSize(self) -> int:
+        """
+        Get the size of all segment files in bytes.
+        """
+        return sum(self.segmentSizes.values())
+
+    def close(self) -> None:
+        """
+        Close the currently written segment file.
+        """
+        with self.lock:
+            self.writeFile.close()
@@ -1,7 +1,9 @@
-from queue import Queue
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Callable
+from typing import Callable, List, Optional, Tuple
+import heapq
+import itertools
+import threading
 
 from PythonLib.Scheduler import Scheduler
 
@@ -12,6 +14,13 @@ class State(Enum):
     Finished = 3
 
 
+class Priority(Enum):
+    """Within a lane, waiting tasks of a higher priority are started first, equal priorities keep their order."""
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3
+
+
 class TaskQueueTask(ABC):
 
     def __init__(self) -> None:
@@ -24,28 +33,89 @@ class TaskQueueTask(ABC):
     def getStatus(self) -> State:
         return self.status
 
+    def getWakeupMs(self) -> int:
+        """Returns the time (Scheduler.getMonotonicMillis()) at which loop() has to be called next, by default immediately."""
+        return 0
+
+
+class TaskQueueLane:
+    """Tasks of one lane are executed one after another, lanes are independent of each other."""
+
+    __slots__ = ('taskHeap', 'currentJob')
 
-class TaskQueue:
     def __init__(self) -> None:
-        self.jobList = Queue()
+        # Min-heap of (priority, sequence, task)
+        self.taskHeap: List[Tuple[int, int, TaskQueueTask]] = []
         self.currentJob: TaskQueueTask = None
 
-    def add(self, task: TaskQueueTask) -> None:
-        self.jobList.put(task)
 
-    def cancel(self) -> None:
-        self.currentJob = None
+class TaskQueue:
+    def __init__(self, laneCount: int = 1) -> None:
+        """
+        Args:
+            laneCount (int, optional): Number of independent lanes, each lane runs one task at a time.
+        """
+        self.lanes = [TaskQueueLane() for _ in range(laneCount)]
+        self.sequence = itertools.count()
+        # add() may be called from other threads
+        self.lock = threading.Lock()
+
+    def add(self, task: TaskQueueTask, lane: int = 0, priority: Priority = Priority.NORMAL) -> None:
+        with self.lock:
+            heapq.heappush(self.lanes[lane].taskHeap, (priority.value, next(self.sequence), task))
+
+    def cancel(self, lane: Optional[int] = None) -> None:
+        """Drops the current task of a lane, or of all lanes if no lane is given."""
+        with self.lock:
+            for laneToCancel in self.lanes if lane is None else [self.lanes[lane]]:
+                laneToCancel.currentJob = None
+
+    def __stepLane(self, lane: TaskQueueLane, nowMs: int) -> None:
+        """Steps the current task if it is due, finished tasks are followed by the next one within the same call."""
+        while True:
+            if not lane.currentJob:
+                with self.lock:
+                    if not lane.taskHeap:
+                        return
+                    lane.currentJob = heapq.heappop(lane.taskHeap)[2]
+
+            job = lane.currentJob
+            if job.getWakeupMs() > nowMs:
+                return
+
+            job.loop()
+            if job.getStatus() != State.Finished:
+                return
+            # The job may have been cancelled meanwhile
+            if lane.currentJob is job:
+                lane.currentJob = None
 
     def loop(self) -> None:
+        nowMs = Scheduler.getMonotonicMillis()
+        for lane in self.lanes:
+            self.__stepLane(lane, nowMs)
+
+    def timeUntilNextTask(self) -> Optional[int]:
+        """Returns the time in ms until loop() has work to do, or None if all lanes are empty."""
+        nowMs = Scheduler.getMonotonicMillis()
+        result: Optional[int] = None
 
-        if not self.currentJob:
-            if not self.jobList.empty():
-                self.currentJob = self.jobList.get()
+        with self.lock:
+            for lane in self.lanes:
+                if lane.currentJob:
+                    remainingMs = max(0, lane.currentJob.getWakeupMs() - nowMs)
+                elif lane.taskHeap:
+                    remainingMs = 0
+                else:
+                    continue
+                result = remainingMs if result is None else min(result, remainingMs)
 
-        if self.currentJob:
-            self.currentJob.loop()
-            if self.currentJob.getStatus() == State.Finished:
-                self.currentJob = None
+        return result
+
+    def getTaskSize(self) -> int:
+        """Returns the number of waiting and running tasks of all lanes."""
+        with self.lock:
+            return sum(len(lane.taskHeap) + (1 if lane.currentJob else 0) for lane in self.lanes)
 
 
 class TaskQueueExecuteOperation(TaskQueueTask):
@@ -66,8 +136,13 @@ class TaskQueueWait(TaskQueueTask):
 
     def loop(self) -> None:
         if self.status == State.Init:
-            self.startTime = Scheduler.getMillis()
+            self.startTime = Scheduler.getMonotonicMillis()
             self.status = State.Started
 
-        if Scheduler.getMillis() - self.startTime > self.timeMs:
+        if Scheduler.getMonotonicMillis() - self.startTime > self.timeMs:
             self.status = State.Finished
+
+    def getWakeupMs(self) -> int:
+        if self.startTime is None:
+            return 0
+        return self.startTime + self.timeMs + 1
@@ -1,3 +1,6 @@
+from array import array
+from typing import Dict, Hashable, Iterable, List
+
 from PythonLib.Scheduler import Scheduler
 
 
@@ -16,3 +19,85 @@ class Throttle:
                 return True
 
         return False
+
+
+class ThrottleRegistry:
+    """
+    Token buckets for many keys (topics, devices, ...) in shared float arrays instead of one Throttle object per key.
+    A bucket holds up to burst tokens and refills with ratePerSecond, each allowed event takes one token.
+    """
+
+    def __init__(self, ratePerSecond: float, burst: float = 1, idleEvictionMs: int = 60000) -> None:
+        """
+        Args:
+            ratePerSecond (float): Sustained number of events per second and key.
+            burst (float, optional): Number of events a key may send at once after being idle.
+            idleEvictionMs (int, optional): Keys idle for this time are removed. Their bucket is full by then,
+                so a removed key behaves exactly like a key which was never seen.
+        """
+        self.ratePerMs = ratePerSecond / 1000
+        self.burst = burst
+        # A bucket is only full again after burst / rate, evicting earlier would grant extra tokens
+        self.idleEvictionMs = max(idleEvictionMs, burst / self.ratePerMs)
+
+        self.indexes: Dict[Hashable, int] = {}
+        self.tokens = array('d')
+        self.lastTimes = array('d')
+        self.freeIndexes: List[int] = []
+        self.lastEvictionMs = Scheduler.getMillis()
+
+        self.evictedCount = 0
+
+    def __take(self, key: Hashable, nowMs: int) -> bool:
+        index = self.indexes.get(key)
+        if index is None:
+            if self.freeIndexes:
+                index = self.freeIndexes.pop()
+                self.tokens[index] = self.burst
+                self.lastTimes[index] = nowMs
+            else:
+                index = len(self.tokens)
+                self.tokens.append(self.burst)
+                self.lastTimes.append(nowMs)
+            self.indexes[key] = index
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, self.tokens[index] + (nowMs - self.lastTimes[index]) * self.ratePerMs)
+            self.lastTimes[index] = nowMs
+
+        if tokens >= 1:
+            self.tokens[index] = tokens - 1
+            return True
+
+        self.tokens[index] = tokens
+        return False
+
+    def __evictIdle(self, nowMs: int) -> None:
+        if nowMs - self.lastEvictionMs < self.idleEvictionMs:
+            return
+        self.lastEvictionMs = nowMs
+
+        lastTimes = self.lastTimes
+        idleKeys = [key for key, index in self.indexes.items() if nowMs - lastTimes[index] >= self.idleEvictionMs]
+        for key in idleKeys:
+            self.freeIndexes.append(self.indexes.pop(key))
+        self.evictedCount += len(idleKeys)
+
+    def triggerAndCheck(self, key: Hashable) -> bool:
+        """Returns True if an event for the key is allowed now and takes a token for it."""
+        nowMs = Scheduler.getMillis()
+        self.__evictIdle(nowMs)
+        return self.__take(key, nowMs)
+
+    def allow(self, keys: Iterable[Hashable]) -> List[bool]:
+        """Checks the events of a whole cycle at once, a key appearing twice takes two tokens."""
+        nowMs = Scheduler.getMillis()
+        self.__evictIdle(nowMs)
+        take = self.__take
+        return [take(key, nowMs) for key in keys]
+
+    def getKeyCount(self) -> int:
+        return len(self.indexes)
+
+    def getEvictedCount(self) -> int:
+        return self.evictedCount
@@ -0,0 +1,135 @@
+# This class provides a hierarchical timing wheel (Varghese & Lauck).
+# Inserting and cancelling a timer is O(1), advancing costs O(1) per elapsed tick plus the expired timers.
+
+import logging
+from typing import Dict, Hashable, List, Optional
+
+logger = logging.getLogger('PythonLib.TimingWheel')
+
+
+class TimingWheel:
+    def __init__(self, startMs: int, tickMs: int = 10, slotBits: int = 8, levels: int = 4) -> None:
+        """
+        Initialize the TimingWheel class.
+
+        Args:
+            startMs (int): The current time in ms, the wheel starts turning from here.
+            tickMs (int, optional): Resolution of the wheel, timers expire at most one tick late (default is 10).
+            slotBits (int, optional): Each level has 2^slotBits slots (default is 8, i.e. 256 slots).
+            levels (int, optional): Number of levels, the range is tickMs * 2^(slotBits * levels) (default is 4).
+        """
+        self.tickMs = tickMs
+        self.slotBits = slotBits
+        self.slotMask = (1 << slotBits) - 1
+        self.levels = levels
+        self.currentTick = startMs // tickMs
+
+        self.wheels: List[List[Dict[Hashable, int]]] = [[{} for _ in range(1 << slotBits)] for _ in range(levels)]
+        # Timers beyond the range of the top level
+        self.overflow: Dict[Hashable, int] = {}
+        # Slot currently holding a timer, needed for O(1) removal
+        self.location: Dict[Hashable, Dict[Hashable, int]] = {}
+
+    def __place(self, timer: Hashable, targetTick: int) -> None:
+        for level in range(self.levels):
+            shift = self.slotBits * level
+            if (targetTick >> shift) - (self.currentTick >> shift) <= self.slotMask:
+                slot = self.wheels[level][(targetTick >> shift) & self.slotMask]
+                break
+        else:
+            slot = self.overflow
+
+        slot[timer] = targetTick
+        self.location[timer] = slot
+
+    def add(self, timer: Hashable, deadlineMs: int) -> None:
+        """
+        Add a timer. It expires on the first tick after deadlineMs.
+
+        Args:
+            timer (Hashable): The timer object, it must not be added twice.
+            deadlineMs (int): The deadline on the same time base as startMs.
+        """
+        self.__place(timer, max(deadlineMs // self.tickMs + 1, self.currentTick + 1))
+
+    def remove(self, timer: Hashable) -> bool:
+        """
+        Remove a timer.
+
+        Returns:
+            bool: True if the timer was still pending.
+        """
+        slot = self.location.pop(timer, None)
+        if slot is None:
+            return False
+        del slot[timer]
+        return True
+
+    def __cascade(self, slot: Dict[Hashable, int]) -> None:
+        """Moves the timers of a higher level slot into the lower levels."""
+        timers = list(slot.items())
+        slot.clear()
+        for timer, targetTick in timers:
+            self.__place(timer, targetTick)
+
+    def advance(self, nowMs: int) -> List[Hashable]:
+        """
+        Turn the wheel to nowMs.
+
+        Args:
+            nowMs (int): The current time in ms.
+
+        Returns:
+            List[Hashable]: The expired timers in expiry order. They are removed from the wheel.
+        """
+        expired: List[Hashable] = []
+        targetTick = nowMs // self.tickMs
+
+        if not self.location:
+            # Nothing to expire, jump directly
+            self.currentTick = max(self.currentTick, targetTick)
+            return expired
+
+        while self.currentTick < targetTick:
+            self.currentTick += 1
+            tick = self.currentTick
+
+            if tick & self.slotMask == 0:
+                if tick >> (self.slotBits * self.levels) << (self.slotBits * self.levels) == tick:
+                    self.__cascade(self.overflow)
+                for level in range(self.levels - 1, 0, -1):
+                    shift = self.slotBits * level
+                    if (tick >> shift) << shift == tick:
+                        self.__cascade(self.wheels[level][(tick >> shift) & self.slotMask])
+
+            slot = self.wheels[0][tick & self.slotMask]
+            if slot:
+                for timer in slot:
+                    del self.location[timer]
+                expired.extend(slot)
+                slot.clear()
+
+            if not self.location:
+                self.currentTick = targetTick
+
+        return expired
+
+    def getNextExpiryMs(self) -> Optional[int]:
+        """
+        Get a lower bound of the next expiry, exact if a timer expires within the range of the first level.
+
+        Returns:
+            Optional[int]: Time in ms of the next tick with expiring timers, or None if the wheel is empty.
+        """
+        if not self.location:
+            return None
+
+        for tick in range(self.currentTick + 1, self.currentTick + self.slotMask + 2):
+            if self.wheels[0][tick & self.slotMask]:
+                return tick * self.tickMs
+
+        # Next timer is on a higher level, the next cascade happens at the next level 0 wrap
+        return ((self.currentTick >> self.slotBits) + 1 << self.slotBits) * self.tickMs
+
+    def __len__(self) -> int:
+        return len(self.location)
@@ -0,0 +1,62 @@
+# Micro-benchmark of encoding Influx points: JSON body converted by influxdb-python versus LineProtocolEncoder.
+#
+# Usage: python -m PythonLib.benchmark_Influx --points 100000
+
+import argparse
+import random
+import time
+
+from influxdb.line_protocol import make_lines
+
+from PythonLib.InfluxLineProtocol import LineProtocolEncoder
+
+
+def createPoints(count: int) -> list:
+    random.seed(0)
+    startNs = time.time_ns()
+    return [("sensor", {"temperature": random.uniform(-20, 40), "humidity": random.uniform(0, 100), "state": i % 3},
+             {"room": f"room{i % 20}", "floor": str(i % 3)}, startNs + i * 1000000) for i in range(count)]
+
+
+def benchmarkJsonBody(points: list) -> float:
+    start = time.perf_counter()
+    # Like Influx.write before: one JSON body, then converted to line protocol by the client
+    jsonBody = [{"measurement": measurement, "tags": tags, "fields": fields, "time": timeNs}
+                for measurement, fields, tags, timeNs in points]
+    make_lines({'points': jsonBody}, 'n').encode('utf-8')
+    return time.perf_counter() - start
+
+
+def benchmarkEncoder(points: list, encoder: LineProtocolEncoder, compressLevel: int = None) -> float:
+    start = time.perf_counter()
+    encoder.clear()
+    for measurement, fields, tags, timeNs in points:
+        encoder.add(measurement, fields, tags, timeNs)
+    encoder.getBody(compressLevel)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of Influx point encoding")
+    parser.add_argument('--points', type=int, default=100000, help="Points per run")
+    parser.add_argument('--runs', type=int, default=5, help="Runs, the best one is reported")
+    args = parser.parse_args()
+
+    points = createPoints(args.points)
+    encoder = LineProtocolEncoder()
+
+    results = {
+        "json body": min(benchmarkJsonBody(points) for _ in range(args.runs)),
+        "encoder": min(benchmarkEncoder(points, encoder) for _ in range(args.runs)),
+        "encoder+gzip": min(benchmarkEncoder(points, encoder, 1) for _ in range(args.runs)),
+    }
+
+    plainSize = len(encoder.getBody())
+    compressedSize = len(encoder.getBody(1))
+    for name, seconds in results.items():
+        print(f"{name:14} {args.points / seconds:12.0f} points/s  {results['json body'] / seconds:5.1f}x")
+    print(f"body size {plainSize} bytes, gzip level 1 {compressedSize} bytes ({compressedSize / plainSize:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# Load test of Mqtt and AsyncMqtt against the in-process FakeMqttBroker.
+# Reports throughput, publish-to-callback latency and memory for several topic counts and payload sizes.
+#
+# Usage: python -m PythonLib.benchmark_Mqtt --topics 1,100,1000 --payloads 16,1024 --messages 20000 [--memory]
+
+import argparse
+import asyncio
+import statistics
+import struct
+import threading
+import time
+import tracemalloc
+from typing import List
+
+from PythonLib.AsyncMqtt import AsyncMqtt
+from PythonLib.FakeMqttBroker import FakeMqttBroker, FakeMqttClient
+from PythonLib.Mqtt import Mqtt, PayloadType
+
+TIMESTAMP = struct.Struct('<Q')
+
+
+class LatencyRecorder:
+    def __init__(self) -> None:
+        self.latenciesNs: List[int] = []
+
+    def callback(self, topic: str, payload: bytes) -> None:
+        self.latenciesNs.append(time.perf_counter_ns() - TIMESTAMP.unpack_from(payload)[0])
+
+    def getCount(self) -> int:
+        return len(self.latenciesNs)
+
+
+def publishAll(broker: FakeMqttBroker, topics: List[str], payloadSize: int, messageCount: int) -> None:
+    publisher = FakeMqttClient(broker, "publisher")
+    publisher.connect("localhost")
+    padding = b'x' * max(0, payloadSize - TIMESTAMP.size)
+
+    for i in range(messageCount):
+        publisher.publish(topics[i % len(topics)], TIMESTAMP.pack(time.perf_counter_ns()) + padding, 1)
+
+
+def report(name: str, topicCount: int, payloadSize: int, recorder: LatencyRecorder, elapsedS: float) -> None:
+    latencies = sorted(recorder.latenciesNs)
+    p50 = statistics.median(latencies) / 1e6
+    p99 = latencies[int(len(latencies) * 0.99) - 1] / 1e6
+
+    # tracemalloc slows down the run, so memory is only reported on request
+    memory = f" peak={tracemalloc.get_traced_memory()[1] / 1024:8.0f}KiB" if tracemalloc.is_tracing() else ""
+    print(f"{name:10} topics={topicCount:6} payload={payloadSize:6} "
+          f"msg/s={recorder.getCount() / elapsedS:10.0f} p50={p50:8.3f}ms p99={p99:8.3f}ms{memory}")
+
+
+def benchmarkMqtt(topicCount: int, payloadSize: int, messageCount: int) -> None:
+    broker = FakeMqttBroker()
+    recorder = LatencyRecorder()
+    topics = [f"bench/topic{i}" for i in range(topicCount)]
+
+    mqttClient = Mqtt("localhost", "bench", FakeMqttClient(broker, "Mqtt"))
+    for topic in topics:
+        mqttClient.subscribeIndependentTopic(topic, recorder.callback, PayloadType.BYTES)
+
+    start = time.perf_counter()
+    publisher = threading.Thread(target=publishAll, args=(broker, topics, payloadSize, messageCount))
+    publisher.start()
+    while recorder.getCount() < messageCount:
+        mqttClient.loop()
+    elapsed = time.perf_counter() - start
+    publisher.join()
+
+    report("Mqtt", topicCount, payloadSize, recorder, elapsed)
+    mqttClient.mqttClient.loop_stop()
+
+
+async def benchmarkAsyncMqtt(topicCount: int, payloadSize: int, messageCount: int) -> None:
+    broker = FakeMqttBroker()
+    recorder = LatencyRecorder()
+    topics = [f"bench/topic{i}" for i in range(topicCount)]
+
+    mqttClient = AsyncMqtt("localhost", "bench", FakeMqttClient(broker, "AsyncMqtt"))
+    for topic in topics:
+        await mqttClient.subscribeIndependentTopic(topic, recorder.callback, PayloadType.BYTES)
+    await mqttClient.connectAndRun()
+
+    start = time.perf_counter()
+    await asyncio.to_thread(publishAll, broker, topics, payloadSize, messageCount)
+    while recorder.getCount() < messageCount:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    report("AsyncMqtt", topicCount, payloadSize, recorder, elapsed)
+    mqttClient.task.cancel()
+    mqttClient.mqttClient.mqttClient.loop_stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test of Mqtt and AsyncMqtt with an in-process broker")
+    parser.add_argument('--topics', default='1,100,1000', help="Comma separated list of topic counts")
+    parser.add_argument('--payloads', default='16,1024', help="Comma separated list of payload sizes in bytes")
+    parser.add_argument('--messages', type=int, default=20000, help="Messages per run")
+    parser.add_argument('--memory', action='store_true', help="Trace peak memory (slows down the runs)")
+    args = parser.parse_args()
+
+    for topicCount in [int(value) for value in args.topics.split(',')]:
+        for payloadSize in [int(value) for value in args.payloads.split(',')]:
+            for run in (lambda: benchmarkMqtt(topicCount, payloadSize, args.messages),
+                        lambda: asyncio.run(benchmarkAsyncMqtt(topicCount, payloadSize, args.messages))):
+                if args.memory:
+                    tracemalloc.start()
+                run()
+                tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
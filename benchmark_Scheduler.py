@@ -0,0 +1,84 @@
+# Benchmark of the Scheduler backends with many live timers.
+# Compares the former list-scan implementation, the heap and the timing wheel for
+# inserting timers, cancelling most of them and calling loop() while nothing is due.
+#
+# Usage: python -m PythonLib.benchmark_Scheduler --timers 100000
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from PythonLib.Scheduler import RelMsTask, Scheduler
+
+
+class ListScanScheduler:
+    """Reference: relative tasks kept in a list which is scanned on every loop, as Scheduler did before."""
+
+    def __init__(self) -> None:
+        self.relMsTaskList: List[RelMsTask] = []
+
+    def oneShoot(self, callback: Callable[[None], None], timePeriodMs: int) -> RelMsTask:
+        task = RelMsTask(Scheduler.getMonotonicMillis(), timePeriodMs, callback, False)
+        self.relMsTaskList.append(task)
+        return task
+
+    def cancel(self, task: RelMsTask) -> bool:
+        self.relMsTaskList.remove(task)
+        return True
+
+    def loop(self) -> None:
+        deleteRelMsTaskList: List[RelMsTask] = []
+        for task in self.relMsTaskList:
+            if Scheduler.getMonotonicMillis() - task.getStartTime() > task.getDuration():
+                task.getFct()()
+                deleteRelMsTaskList.append(task)
+        for task in deleteRelMsTaskList:
+            self.relMsTaskList.remove(task)
+
+
+def measure(name: str, scheduler: object, timerCount: int, cancelRatio: float) -> None:
+    random.seed(0)
+    periods = [random.randint(60000, 600000) for _ in range(timerCount)]
+
+    start = time.perf_counter()
+    tasks = [scheduler.oneShoot(lambda: None, period) for period in periods]
+    insertS = time.perf_counter() - start
+
+    loops = 100
+    start = time.perf_counter()
+    for _ in range(loops):
+        scheduler.loop()
+    loopS = (time.perf_counter() - start) / loops
+
+    toCancel = random.sample(tasks, int(timerCount * cancelRatio))
+    # The list-scan reference cancels in O(n), so it is limited to a sample and extrapolated
+    if isinstance(scheduler, ListScanScheduler):
+        sample = toCancel[:1000]
+        start = time.perf_counter()
+        for task in sample:
+            scheduler.cancel(task)
+        cancelS = (time.perf_counter() - start) * len(toCancel) / len(sample)
+    else:
+        start = time.perf_counter()
+        for task in toCancel:
+            scheduler.cancel(task)
+        cancelS = time.perf_counter() - start
+
+    print(f"{name:12} insert={insertS / timerCount * 1e6:7.2f}us/timer "
+          f"cancel={cancelS / len(toCancel) * 1e6:9.2f}us/timer loop={loopS * 1e3:9.3f}ms/call")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the Scheduler backends")
+    parser.add_argument('--timers', type=int, default=100000, help="Number of live timers")
+    parser.add_argument('--cancel', type=float, default=0.9, help="Ratio of timers cancelled before they fire")
+    args = parser.parse_args()
+
+    measure("list-scan", ListScanScheduler(), args.timers, args.cancel)
+    measure("heap", Scheduler(), args.timers, args.cancel)
+    measure("timing-wheel", Scheduler(timingWheelTickMs=10), args.timers, args.cancel)
+
+
+if __name__ == '__main__':
+    main()
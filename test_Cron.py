@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from PythonLib.Cron import CronExpression
+from PythonLib.Scheduler import Scheduler
+
+
+def test1() -> None:
+    cron = CronExpression("*/5 * * * 1-5")
+
+    # Friday evening, next run on Monday
+    assert cron.nextFireTime(datetime(2024, 3, 1, 23, 58)) == datetime(2024, 3, 4, 0, 0)
+    assert cron.nextFireTime(datetime(2024, 3, 4, 10, 7, 30)) == datetime(2024, 3, 4, 10, 10)
+
+
+def test2() -> None:
+    # Day of month and day of week are combined with OR
+    cron = CronExpression("0 12 1 * SUN")
+    assert cron.nextFireTime(datetime(2024, 3, 1, 13, 0)) == datetime(2024, 3, 3, 12, 0)
+
+    cron = CronExpression("30 23 29 FEB *")
+    assert cron.nextFireTime(datetime(2024, 3, 1)) == datetime(2028, 2, 29, 23, 30)
+
+
+def test3() -> None:
+    berlin = ZoneInfo("Europe/Berlin")
+    cron = CronExpression("30 2 * * *", "Europe/Berlin")
+
+    # 02:30 does not exist on the day of the switch to summer time
+    assert cron.nextFireTime(datetime(2024, 3, 30, 12, 0, tzinfo=berlin)) == datetime(2024, 4, 1, 2, 30, tzinfo=berlin)
+
+
+def test4() -> None:
+    scheduler = Scheduler()
+    task = scheduler.scheduleCron(lambda: None, "* * * * *")
+
+    assert 0 < scheduler.timeUntilNextTask() <= 60001
+    assert task.getNextDate().second == 0
+
+
+def test5() -> None:
+    berlin = ZoneInfo("Europe/Berlin")
+    cron = CronExpression("53 10 * * *", berlin)
+    instant = datetime(2024, 6, 3, 11, 53, tzinfo=berlin)
+
+    # Naive times are local time of the host, not time of the expression's zone
+    assert cron.nextFireTime(instant) == datetime(2024, 6, 4, 10, 53, tzinfo=berlin)
+    assert cron.nextFireTime(instant.astimezone().replace(tzinfo=None)) == datetime(2024, 6, 4, 10, 53, tzinfo=berlin)
+
+    # The first run is in the future, whatever the zone of the host is
+    scheduler = Scheduler()
+    task = scheduler.scheduleCron(lambda: None, "* * * * *", "Pacific/Kiritimati")
+    assert task.getNextDate() > datetime.now(timezone.utc)
+    assert 0 < scheduler.timeUntilNextTask() <= 60001
@@ -0,0 +1,302 @@
+import gzip
+import json
+import math
+import time
+from array import array
+from pathlib import Path
+from typing import Iterator
+
+from influxdb.exceptions import InfluxDBClientError
+from influxdb.line_protocol import make_lines
+
+from PythonLib.Influx import ChangeTracker
+from PythonLib.InfluxAggregator import Aggregate, InfluxAggregator
+from PythonLib.InfluxLineProtocol import LineProtocolEncoder
+from PythonLib.InfluxQuery import queryColumnar
+from PythonLib.InfluxWriteBuffer import InfluxWriteBuffer
+from PythonLib.Spool import Spool, SyncPolicy
+
+
+class ClientStub:
+    """Records the bodies sent to the write endpoint as lists of lines."""
+
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.writes = []
+        self.headers = None
+
+    def request(self, url: str, method: str, params: dict = None, data: bytes = None,
+                expected_response_code: int = 200, headers: dict = None) -> None:
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("Server not reachable")
+        self.headers = headers
+        if headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        self.writes.append((params.get('rp'), data.decode('utf-8').split('\n')[:-1]))
+
+
+def test1() -> None:
+    client = ClientStub(failures=2)
+    writeBuffer = InfluxWriteBuffer(client, "db", batchSize=3, flushIntervalMs=50, retryDelayMs=1)
+
+    before = time.time_ns()
+    for i in range(4):
+        writeBuffer.add("temperature", {"value": i}, {"room": "kitchen"}, "raw" if i < 3 else None)
+
+    # The full batch is written right away after two retries, the rest after flushIntervalMs
+    time.sleep(0.02)
+    assert [len(points) for _, points in client.writes] == [3]
+    time.sleep(0.1)
+    assert [policy for policy, _ in client.writes] == ["raw", None]
+
+    assert client.headers == {'Content-Type': 'application/octet-stream'}
+
+    firstLine = client.writes[0][1][0]
+    assert firstLine.startswith("temperature,room=kitchen value=0i ")
+    assert before <= int(firstLine.split()[-1]) <= time.time_ns()
+
+    statistics = writeBuffer.getStatistics()
+    assert statistics["written"] == 4
+    assert statistics["retries"] == 2
+    assert statistics["buffered"] == 0
+    writeBuffer.close()
+
+
+def test2() -> None:
+    client = ClientStub(failures=10)
+    writeBuffer = InfluxWriteBuffer(client, "db", batchSize=100, flushIntervalMs=10000, maxRetries=1, retryDelayMs=1,
+                                    compressLevel=1)
+
+    writeBuffer.add("temperature", {"value": 1})
+    writeBuffer.flush()
+    assert writeBuffer.getStatistics()["failed"] == 1
+
+    client.failures = 0
+    writeBuffer.add("temperature", {"value": 2})
+    writeBuffer.close()
+    assert len(client.writes) == 1
+
+
+def test3() -> None:
+    points = [
+        ("cpu", {"load": 0.5, "cores": 4, "ok": True, "host name": "a \"b\" \\c"}, {"host": "srv 1", "dc": "a,b=c"}, 1),
+        ("weird,measurement name", {"value": -1.25e-10}, None, 1700000000000000000),
+        ("cpu", {"value": 1.0, "missing": None}, {"empty": ""}, None),
+        ("cpu", {"missing": None}, None, None),
+    ]
+
+    encoder = LineProtocolEncoder()
+    for measurement, fields, tags, timeNs in points:
+        encoder.add(measurement, fields, tags, timeNs)
+    assert len(encoder) == 3
+
+    # Same lines as influxdb-python, apart from the field order which it sorts
+    reference = make_lines({'points': [{'measurement': measurement, 'fields': fields, 'tags': tags, 'time': timeNs}
+                                       for measurement, fields, tags, timeNs in points[:3]]}).splitlines()
+    lines = encoder.getBody().decode('utf-8').splitlines()
+    assert [sorted(line.split(' ')) for line in lines[1:]] == [sorted(line.split(' ')) for line in reference[1:]]
+    assert len(lines[0]) == len(reference[0])
+    assert gzip.decompress(encoder.getBody(1)) == encoder.getBody()
+
+    encoder.clear()
+    assert encoder.getBody() == b''
+
+    # Tag values equal as dict keys keep their own encoding
+    encoder.add("m", {"v": 1}, {"a": True, "b": 1, "c": 0, "d": False})
+    encoder.add("m", {"v": 1}, {"a": 1, "b": True, "c": False, "d": 0})
+    assert encoder.getBody() == b'm,a=True,b=1,c=0,d=False v=1i\nm,a=1,b=True,c=False,d=0 v=1i\n'
+
+
+def test4() -> None:
+    tracker = ChangeTracker(ttlMs=50)
+
+    assert tracker.filter("kitchen", {"temperature": 20.0, "state": "on"}) == {"temperature": 20.0, "state": "on"}
+    # Same field name in another measurement or tag set is tracked separately
+    assert tracker.filter("bath", {"temperature": 20.0}) == {"temperature": 20.0}
+    assert tracker.filter("bath", {"temperature": 20.0}, {"floor": "1"}) == {"temperature": 20.0}
+    assert tracker.filter("kitchen", {"temperature": 20.0, "state": "on"}) == {}
+
+    assert tracker.filter("kitchen", {"temperature": 20.4}, deadband=0.5) == {}
+    assert tracker.filter("kitchen", {"temperature": 20.6}, deadband=0.5) == {"temperature": 20.6}
+    assert tracker.filter("kitchen", {"temperature": 21.0}, deadbandPercent=5) == {}
+    assert tracker.filter("kitchen", {"temperature": 21.0, "state": "off"}, deadbandPercent=1) == \
+        {"temperature": 21.0, "state": "off"}
+
+    time.sleep(0.01)
+    assert tracker.filter("kitchen", {"state": "off"}, forceUpdateMs=5) == {"state": "off"}
+
+    time.sleep(0.06)
+    tracker.filter("garage", {"door": "open"})
+    assert len(tracker) == 1
+
+
+def test5(tmp_path: Path) -> None:
+    client = ClientStub(failures=1)
+    writeBuffer = InfluxWriteBuffer(client, "db", batchSize=2, flushIntervalMs=10000, retryDelayMs=20,
+                                    spool=Spool(tmp_path, syncPolicy=SyncPolicy.ALWAYS), replayBatchSize=10)
+
+    # The first batch fails and is spooled, the second one has to wait behind it
+    writeBuffer.add("temperature", {"value": 1}, retentionPolicy="raw")
+    writeBuffer.add("temperature", {"value": 2})
+    writeBuffer.flush()
+    writeBuffer.add("temperature", {"value": 3})
+    writeBuffer.add("temperature", {"value": 4})
+    writeBuffer.flush()
+
+    statistics = writeBuffer.getStatistics()
+    assert statistics["spoolPending"] == 4
+    assert statistics["replayLagMs"] > 0
+    assert client.writes == []
+
+    time.sleep(0.1)
+    statistics = writeBuffer.getStatistics()
+    assert statistics["spoolPending"] == 0
+    assert statistics["replayed"] == 4
+    assert statistics["replayLagMs"] == 0
+    # A single request per retention policy, in the original order
+    assert [(policy, [line.split()[1] for line in lines]) for policy, lines in client.writes] == \
+        [("raw", ["value=1i"]), (None, ["value=2i", "value=3i", "value=4i"])]
+    writeBuffer.close()
+
+
+class InfluxStub:
+    def __init__(self) -> None:
+        self.points = []
+
+    def write(self, measurement: str, fields: dict, retentionPolicy: str = None, tags: dict = None,
+              timeNs: int = None) -> None:
+        self.points.append((measurement, fields, retentionPolicy, tags, timeNs))
+
+
+def test6() -> None:
+    influx = InfluxStub()
+    aggregator = InfluxAggregator(influx)
+    aggregator.configure("sensor", 60000, (Aggregate.MEAN, Aggregate.MIN, Aggregate.MAX, Aggregate.COUNT, Aggregate.LAST),
+                         retentionPolicy="long", rawRetentionPolicy="short")
+
+    minuteNs = 60000 * 1000000
+    start = 1700000040 * 1000000000
+    for i, value in enumerate([1.0, 5.0, 3.0]):
+        aggregator.write("sensor", {"value": value, "state": "on"}, tags={"room": "kitchen"}, timeNs=start + i)
+    aggregator.write("sensor", {"value": 7.0}, tags={"room": "bath"}, timeNs=start)
+    aggregator.write("other", {"value": 1}, "raw")
+
+    assert len(influx.points) == 5
+    assert influx.points[0][2] == "short"
+    assert influx.points[-1] == ("other", {"value": 1}, "raw", None, None)
+    assert aggregator.getSeriesCount() == 2
+
+    # A sample of the next window closes the kitchen window
+    aggregator.write("sensor", {"value": 10.0}, tags={"room": "kitchen"}, timeNs=start + minuteNs)
+    measurement, fields, retentionPolicy, tags, timeNs = influx.points[-1]
+    assert (measurement, retentionPolicy, tags, timeNs) == ("sensor", "long", {"room": "kitchen"}, start)
+    assert fields == {"value_mean": 3.0, "value_min": 1.0, "value_max": 5.0, "value_count": 3, "value_last": 3.0,
+                      "state_count": 3, "state_last": "on"}
+
+    # The windows are over by now
+    aggregator.loop()
+    assert aggregator.getSeriesCount() == 0
+    assert aggregator.getEmittedCount() == 3
+
+
+class ResponseStub:
+    def __init__(self, chunks: list) -> None:
+        self.chunks = chunks
+
+    def iter_lines(self) -> Iterator[bytes]:
+        return iter(json.dumps(chunk).encode() for chunk in self.chunks)
+
+    def close(self) -> None:
+        pass
+
+
+class QueryClientStub:
+    def __init__(self, chunks: list) -> None:
+        self.chunks = chunks
+        self.params = None
+        self.headers = None
+
+    def request(self, url: str, method: str, params: dict = None, stream: bool = False,
+                expected_response_code: int = 200, headers: dict = None) -> ResponseStub:
+        self.params = params
+        self.headers = headers
+        return ResponseStub(self.chunks)
+
+
+def test7() -> None:
+    columns = ["time", "value", "state"]
+    chunks = [
+        {"results": [{"statement_id": 0, "series": [
+            {"name": "sensor", "tags": {"room": "kitchen"}, "columns": columns,
+             "values": [[1, 1.5, None], [2, None, None]]}], "partial": True}]},
+        {"results": [{"statement_id": 0, "series": [
+            {"name": "sensor", "tags": {"room": "kitchen"}, "columns": columns, "values": [[3, 2, "on"]]},
+            {"name": "sensor", "tags": {"room": "bath"}, "columns": ["time", "value"], "values": [[1, 7.0]]}]}]},
+    ]
+    client = QueryClientStub(chunks)
+
+    result = queryColumnar(client, "db", "SELECT * FROM sensor GROUP BY room", chunkSize=2)
+    assert client.params["chunked"] == "true" and client.params["epoch"] == "ns"
+    assert client.headers == {"Accept": "application/json"}
+    assert [(series.name, series.tags, len(series)) for series in result] == \
+        [("sensor", {"room": "kitchen"}, 3), ("sensor", {"room": "bath"}, 1)]
+
+    kitchen = result[0]
+    assert kitchen.time == array('q', [1, 2, 3])
+    assert kitchen.getColumn("value").typecode == 'd'
+    assert kitchen.getColumn("value")[0] == 1.5 and math.isnan(kitchen.getColumn("value")[1])
+    assert kitchen.getColumn("state") == [None, None, "on"]
+
+    # SHOW results have no time column
+    client.chunks = [{"results": [{"statement_id": 0, "series": [
+        {"name": "sensor", "columns": ["tagKey"], "values": [["room"], ["floor"]]},
+        {"name": "counts", "columns": ["count", "name"], "values": [[3, "a"]]}]}]}]
+    result = queryColumnar(client, "db", "SHOW TAG KEYS")
+    assert [(series.name, series.hasTime, len(series), len(series.time)) for series in result] == \
+        [("sensor", False, 2, 0), ("counts", False, 1, 0)]
+    assert result[0].getColumn("tagKey") == ["room", "floor"]
+    assert result[1].getColumn("count") == array('d', [3.0])
+    assert result[1].getColumn("name") == ["a"]
+    assert kitchen.hasTime
+
+    client.chunks = [{"results": [{"statement_id": 0, "error": "database not found"}]}]
+    try:
+        queryColumnar(client, "db", "SELECT * FROM sensor")
+        assert False
+    except InfluxDBClientError:
+        pass
+
+
+def test8() -> None:
+    client = ClientStub()
+    writeBuffer = InfluxWriteBuffer(client, "db", batchSize=100, flushIntervalMs=100)
+
+    # The flush interval counts from adding the point, not from its timestamp
+    startTime = time.monotonic()
+    writeBuffer.add("future", {"value": 1}, timeNs=time.time_ns() + 3600 * 10 ** 9)
+    writeBuffer.add("backfill", {"value": 2}, timeNs=1000000000)
+    while not client.writes and time.monotonic() - startTime < 5:
+        time.sleep(0.005)
+    assert time.monotonic() - startTime >= 0.1
+    assert [len(points) for _, points in client.writes] == [2]
+    writeBuffer.close()
+
+
+def test9(tmp_path: Path) -> None:
+    client = ClientStub(failures=1)
+    writeBuffer = InfluxWriteBuffer(client, "db", batchSize=2, flushIntervalMs=10000, retryDelayMs=20,
+                                    spool=Spool(tmp_path), replayBatchSize=10)
+
+    # Line protocol escapes only \n, the other line breaks stay in the line and must survive the spool
+    writeBuffer.add("log", {"text": "a\rb\x0bc\x1cd\x85e\u2028f"}, {"host": "x\ry"}, timeNs=1)
+    writeBuffer.add("log", {"text": "line\nbreak"}, timeNs=2)
+    writeBuffer.flush()
+    assert writeBuffer.getStatistics()["spoolPending"] == 2
+
+    startTime = time.monotonic()
+    while writeBuffer.getStatistics()["spoolPending"] and time.monotonic() - startTime < 5:
+        time.sleep(0.005)
+    assert client.writes == [(None, ['log,host=x\ry text="a\rb\x0bc\x1cd\x85e\u2028f" 1',
+                                     'log text="line\\nbreak" 2'])]
+    writeBuffer.close()
@@ -0,0 +1,224 @@
+import sys
+import threading
+import time
+import types
+from typing import Dict, List
+
+
+class FakeSocket:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeApi:
+    """Stands in for ros_api.Api: answers the identity and configured replies, can fail like a broken session."""
+    sessions: List['FakeApi'] = []
+    replies: Dict[str, List[dict]] = {}
+    failures = 0
+    delayS = 0.0
+
+    def __init__(self, address: str, user: str = None, password: str = None) -> None:
+        if address.startswith('down'):
+            raise ConnectionRefusedError(f"{address} refused the connection")
+        self.address = address
+        self.sock = FakeSocket()
+        self.commands: List[str] = []
+        FakeApi.sessions.append(self)
+
+    def talk(self, command: str) -> List[dict]:
+        time.sleep(FakeApi.delayS)
+        if FakeApi.failures > 0:
+            FakeApi.failures -= 1
+            raise ConnectionResetError("Connection reset by peer")
+        self.commands.append(command)
+        if command == '/system/identity/print':
+            return [{'name': f"router-{self.address}"}]
+        return [dict(row) for row in FakeApi.replies.get(command, [])]
+
+    @staticmethod
+    def reset() -> None:
+        FakeApi.sessions = []
+        FakeApi.replies = {}
+        FakeApi.failures = 0
+        FakeApi.delayS = 0.0
+
+
+rosApiStub = types.ModuleType('ros_api')
+rosApiStub.Api = FakeApi
+sys.modules.setdefault('ros_api', rosApiStub)
+
+import PythonLib.MikrotikRouter as MikrotikRouterModule  # noqa: E402
+from PythonLib.MikrotikRouter import MikrotikRouter, MikrotikRouterPool, RowDiffer  # noqa: E402
+
+# The stub replaces ros_api even if the real package is installed, no test talks to a router
+MikrotikRouterModule.ros_api = rosApiStub
+
+
+def test1() -> None:
+    FakeApi.reset()
+    router = MikrotikRouter('10.0.0.1', 'admin', 'secret')
+    assert router.getIdentity() == "router-10.0.0.1"
+    assert len(FakeApi.sessions) == 1
+
+    # A broken session is closed and replaced, the command is repeated once
+    FakeApi.failures = 1
+    assert router.getIdentity() == "router-10.0.0.1"
+    assert len(FakeApi.sessions) == 2
+    assert FakeApi.sessions[0].sock.closed
+    assert not FakeApi.sessions[1].sock.closed
+    assert router.router is FakeApi.sessions[1]
+
+    # The second failure in a row is raised
+    FakeApi.failures = 2
+    try:
+        router.getIdentity()
+        assert False
+    except ConnectionResetError:
+        pass
+    assert FakeApi.sessions[1].sock.closed
+
+
+def test2() -> None:
+    FakeApi.reset()
+    FakeApi.delayS = 0.2
+    pool = MikrotikRouterPool('admin', 'secret', maxWorkers=4)
+
+    startTime = time.monotonic()
+    results = pool.pollAll(MikrotikRouter.getIdentity, ['10.0.0.1', '10.0.0.2', 'down1'])
+    # Polled in parallel
+    assert time.monotonic() - startTime < 0.5
+    assert results['10.0.0.1'] == "router-10.0.0.1"
+    assert results['10.0.0.2'] == "router-10.0.0.2"
+    assert isinstance(results['down1'], ConnectionRefusedError)
+
+    # Without addresses all routers of the pool are polled, over their kept sessions
+    results = pool.pollAll(MikrotikRouter.getIdentity)
+    assert sorted(results.keys()) == ['10.0.0.1', '10.0.0.2', 'down1']
+    assert len(FakeApi.sessions) == 2
+    pool.close()
+
+
+def test3() -> None:
+    FakeApi.reset()
+    FakeApi.replies['/ip/neighbor/print'] = [
+        {'address': '10.0.0.2', 'platform': 'MikroTik', 'interface': 'vlan30_Parents'},
+        {'address': '10.0.0.3', 'platform': 'MikroTik', 'interface': 'ether1'},
+        {'address': '10.0.0.4', 'platform': 'Linux', 'interface': 'vlan30_Parents'}]
+    pool = MikrotikRouterPool('admin', 'secret')
+    router = pool.getRouter('10.0.0.1')
+
+    neighbors = router.getNeighbors()
+    assert [neighbor.ipAddr for neighbor in neighbors] == ['10.0.0.2']
+    assert neighbors[0] is pool.getRouter('10.0.0.2')
+    # Neighbors log in with their first command
+    assert len(FakeApi.sessions) == 1
+
+    neighbors = router.getNeighbors(lambda neighbor: neighbor['platform'] == 'MikroTik')
+    assert [neighbor.ipAddr for neighbor in neighbors] == ['10.0.0.2', '10.0.0.3']
+    pool.close()
+
+    # Without pool the neighbors log in right away, unreachable ones are left out
+    FakeApi.reset()
+    FakeApi.replies['/ip/neighbor/print'] = [
+        {'address': '10.0.0.2', 'platform': 'MikroTik', 'interface': 'vlan30_Parents'},
+        {'address': 'down1', 'platform': 'MikroTik', 'interface': 'vlan30_Parents'}]
+    router = MikrotikRouter('10.0.0.1', 'admin', 'secret')
+    neighbors = router.getNeighbors()
+    assert [neighbor.ipAddr for neighbor in neighbors] == ['10.0.0.2']
+    assert neighbors[0].router is FakeApi.sessions[1]
+
+
+def test4() -> None:
+    differ = RowDiffer()
+    diff = differ.update([{'.id': '*1', 'address': 'a'}, {'.id': '*2', 'address': 'b'}])
+    assert diff.added == [{'.id': '*1', 'address': 'a'}, {'.id': '*2', 'address': 'b'}]
+    assert diff.removed == [] and diff.changed == []
+
+    diff = differ.update([{'.id': '*2', 'address': 'c'}, {'.id': '*3', 'address': 'd'}])
+    assert diff.added == [{'.id': '*3', 'address': 'd'}]
+    assert diff.removed == [{'.id': '*1', 'address': 'a'}]
+    assert diff.changed == [{'.id': '*2', 'address': 'c'}]
+
+    assert differ.update([{'.id': '*2', 'address': 'c'}, {'.id': '*3', 'address': 'd'}]).isEmpty()
+
+    differ = RowDiffer('mac-address')
+    assert len(differ.update([{'mac-address': 'm1'}, {'mac-address': 'm2'}]).added) == 2
+    assert differ.update([{'mac-address': 'm2'}]).removed == [{'mac-address': 'm1'}]
+
+
+def test5() -> None:
+    FakeApi.reset()
+    FakeApi.replies['/ip/dns/static/print'] = [{'.id': '*1', 'name': 'host'}]
+    router = MikrotikRouter('10.0.0.1', 'admin', 'secret', cacheTtlMs=200)
+    session = FakeApi.sessions[0]
+
+    # Reused within the cache time
+    assert router.getDns() == [{'.id': '*1', 'name': 'host'}]
+    assert router.getDns() == [{'.id': '*1', 'name': 'host'}]
+    assert session.commands == ['/ip/dns/static/print']
+
+    # Requested again once expired
+    time.sleep(0.25)
+    FakeApi.replies['/ip/dns/static/print'] = [{'.id': '*2', 'name': 'other'}]
+    assert router.getDns() == [{'.id': '*2', 'name': 'other'}]
+    assert session.commands == ['/ip/dns/static/print'] * 2
+
+    # Per command cache times, 0 disables the cache
+    router.setCacheTtl('/ip/dns/static/print', 0)
+    router.setCacheTtl('/system/identity/print', 3600000)
+    router.getDns()
+    router.getDns()
+    router.getIdentity()
+    router.getIdentity()
+    assert session.commands == ['/ip/dns/static/print'] * 4 + ['/system/identity/print']
+
+    # diff reads through the cache, the reply cached before is still fresh
+    router.setCacheTtl('/ip/dns/static/print', 3600000)
+    assert router.diff('/ip/dns/static/print').added == [{'.id': '*2', 'name': 'other'}]
+    assert router.diff('/ip/dns/static/print').isEmpty()
+    assert session.commands.count('/ip/dns/static/print') == 4
+
+
+def test6() -> None:
+    FakeApi.reset()
+    FakeApi.delayS = 0.2
+    FakeApi.replies['/ip/dhcp-server/lease/print'] = [{'.id': '*1', 'status': 'bound'},
+                                                      {'.id': '*2', 'status': 'waiting'}]
+    router = MikrotikRouter('10.0.0.1', 'admin', 'secret', cacheTtlMs=60000)
+    results = []
+
+    def getLeases() -> None:
+        results.append(router.getLeases())
+
+    # Concurrent callers of the same command share one request
+    threads = [threading.Thread(target=getLeases) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[{'.id': '*1', 'status': 'bound'}]] * 5
+    assert FakeApi.sessions[0].commands == ['/ip/dhcp-server/lease/print']
+
+    # A failed request is raised to all waiting callers and not cached
+    router.cache.clear()
+    FakeApi.failures = 2
+    errors = []
+
+    def query() -> None:
+        try:
+            router.query('/ip/dhcp-server/lease/print')
+        except ConnectionResetError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=query) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert router.pendingCommands == {}
+    assert len(router.query('/ip/dhcp-server/lease/print')) == 2
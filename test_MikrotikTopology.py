@@ -0,0 +1,145 @@
+import json
+import sys
+import types
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# MikrotikRouter imports ros_api, the crawler only talks to the fake pool below
+sys.modules.setdefault('ros_api', types.ModuleType('ros_api'))
+
+from PythonLib.MikrotikTopology import MikrotikTopology, TopologyGraph  # noqa: E402
+
+
+def neighborRow(identity: str, macAddress: str, address: str, platform: str = 'MikroTik') -> dict:
+    row = {'platform': platform, 'interface': 'vlan30_Parents', 'address': address}
+    if identity:
+        row['identity'] = identity
+    if macAddress:
+        row['mac-address'] = macAddress
+    return row
+
+
+class FakeRouter:
+    def __init__(self, ipAddr: str, network: Dict[str, Tuple[str, List[dict]]]) -> None:
+        self.ipAddr = ipAddr
+        self.network = network
+
+    def getIdentity(self) -> str:
+        if self.ipAddr not in self.network:
+            raise ConnectionRefusedError(f"{self.ipAddr} refused the connection")
+        return self.network[self.ipAddr][0]
+
+    def query(self, command: str) -> List[dict]:
+        assert command == '/ip/neighbor/print'
+        return self.network[self.ipAddr][1]
+
+
+class FakePool:
+    """Polls the routers of a network given as address -> (identity, neighbor rows), records each round."""
+
+    def __init__(self, network: Dict[str, Tuple[str, List[dict]]]) -> None:
+        self.network = network
+        self.rounds: List[List[str]] = []
+
+    def pollAll(self, fct: Callable[[FakeRouter], object], ipAddrs: Iterable[str]) -> Dict[str, object]:
+        ipAddrs = list(ipAddrs)
+        self.rounds.append(ipAddrs)
+        results: Dict[str, object] = {}
+        for ipAddr in ipAddrs:
+            try:
+                results[ipAddr] = fct(FakeRouter(ipAddr, self.network))
+            except BaseException as e:
+                results[ipAddr] = e
+        return results
+
+    def getPolledAddresses(self) -> List[str]:
+        return [ipAddr for ipAddrs in self.rounds for ipAddr in ipAddrs]
+
+
+def createNetwork() -> Dict[str, Tuple[str, List[dict]]]:
+    # core, a and b see each other (a cycle), core sees a on two interfaces, b sees a by another address
+    # without identity, c behind a does not answer
+    return {
+        '10.0.0.1': ('core', [neighborRow('a', 'AA', '10.0.0.2'), neighborRow('a', 'AB', '10.0.1.2'),
+                              neighborRow('b', 'BB', '10.0.0.3'), neighborRow('pc', 'EE', '10.0.0.9', 'Linux')]),
+        '10.0.0.2': ('a', [neighborRow('core', 'CC', '10.0.0.1'), neighborRow('b', 'BB', '10.0.0.3'),
+                           neighborRow('c', 'DD', '10.0.0.4')]),
+        '10.0.0.3': ('b', [neighborRow('core', 'CC', '10.0.0.1'), neighborRow(None, None, '10.0.2.2')]),
+        '10.0.2.2': ('a', []),
+    }
+
+
+def test1() -> None:
+    pool = FakePool(createNetwork())
+    graph = MikrotikTopology(pool).crawl(['10.0.0.1'])
+
+    # Hop by hop, every address polled once, the second interface of a is resolved by its identity
+    assert pool.rounds == [['10.0.0.1'], ['10.0.0.2', '10.0.0.3'], ['10.0.0.4', '10.0.2.2']]
+
+    assert sorted(graph.nodes.keys()) == ['a', 'b', 'c', 'core']
+    assert [(node.address, node.depth) for node in (graph.getNode(identity) for identity in ('core', 'a', 'b', 'c'))] \
+        == [('10.0.0.1', 0), ('10.0.0.2', 1), ('10.0.0.3', 1), ('10.0.0.4', 2)]
+    assert graph.getNode('a').isReachable()
+    assert not graph.getNode('c').isReachable()
+    assert "refused" in graph.getNode('c').error
+
+    assert sorted(graph.edges) == [('a', 'b'), ('a', 'c'), ('a', 'core'), ('b', 'core')]
+    assert graph.getNeighbors('a') == ['b', 'c', 'core']
+    assert graph.getNode('a').macAddresses == {'AA', 'AB'}
+    assert graph.getNode('core').macAddresses == {'CC'}
+
+
+def test2() -> None:
+    network = {
+        '10.0.0.1': ('core', [neighborRow('a', 'AA', '10.0.0.2')]),
+        '10.0.0.2': ('a', [neighborRow('core', 'CC', '10.0.0.1'), neighborRow('b', 'BB', '10.0.0.3')]),
+        '10.0.0.3': ('b', [neighborRow('a', 'AA', '10.0.0.2'), neighborRow('c', 'DD', '10.0.0.4')]),
+        '10.0.0.4': ('c', [neighborRow('b', 'BB', '10.0.0.3')]),
+    }
+
+    pool = FakePool(network)
+    graph = MikrotikTopology(pool, maxDepth=1).crawl(['10.0.0.1'])
+    assert pool.rounds == [['10.0.0.1'], ['10.0.0.2']]
+    assert sorted(graph.nodes.keys()) == ['a', 'core']
+    assert sorted(graph.edges) == [('a', 'core')]
+
+    pool = FakePool(network)
+    graph = MikrotikTopology(pool, maxDepth=0).crawl(['10.0.0.1'])
+    assert pool.rounds == [['10.0.0.1']]
+    assert list(graph.nodes.keys()) == ['core']
+    assert graph.edges == set()
+
+    # Several roots, the second one is already known as neighbor of the first
+    pool = FakePool(network)
+    graph = MikrotikTopology(pool, maxDepth=1).crawl(['10.0.0.1', '10.0.0.4'])
+    assert pool.rounds == [['10.0.0.1', '10.0.0.4'], ['10.0.0.2', '10.0.0.3']]
+    assert sorted(graph.edges) == [('a', 'b'), ('a', 'core'), ('b', 'c')]
+
+
+def test3() -> None:
+    network = createNetwork()
+    pool = FakePool(network)
+    topology = MikrotikTopology(pool)
+    graph = TopologyGraph.fromDict(json.loads(json.dumps(topology.crawl(['10.0.0.1']).toDict())))
+    assert sorted(graph.edges) == [('a', 'b'), ('a', 'c'), ('a', 'core'), ('b', 'core')]
+    assert graph.getNode('a').macAddresses == {'AA', 'AB'}
+    lastSeenB = graph.getNode('b').lastSeen
+
+    # c answers now and has a new neighbor d, b is down
+    network['10.0.0.4'] = ('c', [neighborRow('a', 'AA', '10.0.0.2'), neighborRow('d', 'FF', '10.0.0.5')])
+    network['10.0.0.5'] = ('d', [])
+    del network['10.0.0.3']
+    pool.rounds.clear()
+    newGraph = topology.refresh(graph)
+
+    # Known routers in one round, only d is discovered by another one
+    assert pool.rounds == [['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'], ['10.0.0.5']]
+    assert newGraph.getNode('c').isReachable()
+    assert not newGraph.getNode('b').isReachable()
+    assert newGraph.getNode('b').lastSeen == lastSeenB
+
+    changes = newGraph.compare(graph)
+    assert changes.addedNodes == ['d']
+    assert changes.removedNodes == []
+    assert changes.addedEdges == [('c', 'd')]
+    assert changes.removedEdges == []
+    assert newGraph.compare(newGraph).isEmpty()
@@ -0,0 +1,124 @@
+import asyncio
+import socket
+import threading
+
+from PythonLib.MikrotikTrafficMonitor import SentenceParser, TrafficMonitor, encodeSentence, encodeWord, parseSample
+
+
+def serveRouter(server: socket.socket, sampleCount: int) -> None:
+    """Minimal RouterOS API peer: accepts the login and answers monitor-traffic with samples of two interfaces."""
+    connection, _ = server.accept()
+    with connection:
+        parser = SentenceParser()
+        sentences = []
+        while len(sentences) < 1:
+            sentences += parser.feed(connection.recv(4096))
+        assert sentences[0] == [b'/login', b'=name=admin', b'=password=secret']
+        connection.sendall(encodeSentence(['!done']))
+
+        while len(sentences) < 2:
+            sentences += parser.feed(connection.recv(4096))
+        assert sentences[1][:2] == [b'/interface/monitor-traffic', b'=interface=ether1,ether2']
+        for i in range(sampleCount):
+            for name in ('ether1', 'ether2'):
+                reply = encodeSentence(['!re', '.tag=1', f'=name={name}', f'=rx-bits-per-second={i * 1000}',
+                                        '=tx-bits-per-second=5', '=fp-rx-bits-per-second=0'])
+                # Deliver in small pieces, the parser has to join them
+                for offset in range(0, len(reply), 7):
+                    connection.sendall(reply[offset:offset + 7])
+
+
+def test1() -> None:
+    for word in (b'a', b'a' * 0x7F, b'b' * 0x80, b'c' * 0x4000, b'd' * 0x200000):
+        parser = SentenceParser()
+        encoded = encodeWord(word) + b'\x00'
+        assert parser.feed(encoded[:-2]) == []
+        assert parser.feed(encoded[-2:]) == [[word]]
+
+    sample = parseSample([b'!re', b'=name=ether1', b'=rx-bits-per-second=42', b'=comment=a=b'])
+    assert (sample.name, sample.rxBitsPerSecond, sample.txBitsPerSecond) == ("ether1", 42, 0)
+    assert parseSample([b'!done']) is None
+
+
+def test2() -> None:
+    server = socket.create_server(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    threading.Thread(target=serveRouter, args=(server, 3), daemon=True).start()
+
+    monitor = TrafficMonitor('127.0.0.1', 'admin', 'secret', ['ether1', 'ether2'], port=port, timeoutS=2)
+
+    async def collect() -> list:
+        samples = []
+        async for sample in monitor.samples():
+            samples.append((sample.name, sample.rxBitsPerSecond))
+            if len(samples) == 6:
+                break
+        return samples
+
+    assert asyncio.run(collect()) == [('ether1', 0), ('ether2', 0), ('ether1', 1000), ('ether2', 1000),
+                                      ('ether1', 2000), ('ether2', 2000)]
+    server.close()
+
+
+def test3() -> None:
+    server = socket.create_server(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    threading.Thread(target=serveRouter, args=(server, 2), daemon=True).start()
+
+    monitor = TrafficMonitor('127.0.0.1', 'admin', 'secret', ['ether1', 'ether2'], port=port, timeoutS=2)
+    samples = []
+    done = threading.Event()
+
+    def onSample(sample) -> None:
+        samples.append(sample.name)
+        if len(samples) == 4:
+            monitor.stop()
+            done.set()
+
+    monitor.start(onSample)
+    assert done.wait(2)
+    monitor.stop()
+    assert samples == ['ether1', 'ether2', 'ether1', 'ether2']
+    server.close()
+
+
+def serveBadReply(server: socket.socket) -> None:
+    """Answers monitor-traffic with a reply which cannot be parsed, then serves two regular samples."""
+    connection, _ = server.accept()
+    with connection:
+        parser = SentenceParser()
+        sentences = []
+        while len(sentences) < 2:
+            sentences += parser.feed(connection.recv(4096))
+            if len(sentences) == 1:
+                connection.sendall(encodeSentence(['!done']))
+        connection.sendall(encodeSentence(['!re', '.tag=1', '=name=ether1', '=rx-bits-per-second=fast']))
+        # The monitor closes the connection
+        while connection.recv(4096):
+            pass
+    serveRouter(server, 2)
+
+
+def test4() -> None:
+    server = socket.create_server(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    threading.Thread(target=serveBadReply, args=(server,), daemon=True).start()
+
+    monitor = TrafficMonitor('127.0.0.1', 'admin', 'secret', ['ether1', 'ether2'], port=port, timeoutS=2,
+                             reconnectDelayS=0.01)
+    samples = []
+    done = threading.Event()
+
+    def onSample(sample) -> None:
+        samples.append(sample.name)
+        if len(samples) == 4:
+            monitor.stop()
+            done.set()
+        # Neither the failing callback nor the bad reply before end the monitor
+        raise RuntimeError("callback failed")
+
+    monitor.start(onSample)
+    assert done.wait(5)
+    monitor.stop()
+    assert samples == ['ether1', 'ether2', 'ether1', 'ether2']
+    server.close()
@@ -1,7 +1,11 @@
+import asyncio
 import logging
 from time import sleep
 import paho.mqtt.client as pahoMqtt
-from PythonLib.Mqtt import Mqtt
+from PythonLib.FakeMqttBroker import FakeMqttBroker, FakeMqttClient
+from PythonLib.AsyncMqtt import AsyncBatchedMQTTHandler, AsyncMqtt
+from PythonLib.Mqtt import BatchedMQTTHandler, Mqtt, PayloadType
+from PythonLib.Spool import Spool
 
 
 class paoMqttClient():
@@ -12,7 +16,7 @@ class paoMqttClient():
         self.hostname = hostname
         self.port = port
 
-    def publish(self, topic: str, payload: str) -> None:
+    def publish(self, topic: str, payload: str, qos: int = 0) -> None:
         self.topic = topic
         self.payload = payload
 
@@ -22,6 +26,9 @@ class paoMqttClient():
     def loop_start(self) -> None:
         pass
 
+    def enable_logger(self, logger=None) -> None:
+        pass
+
 
 def test1() -> None:
     poaClient = paoMqttClient("TestClient")
@@ -79,3 +86,242 @@ def test4() -> None:
     sleep(10)
     mqttClient.loop()
     assert receiver.getReceived() == "hallo"
+
+
+def test5() -> None:
+    broker = FakeMqttBroker()
+    mqttClient = Mqtt("localhost", "heizung", FakeMqttClient(broker, "Subscriber"))
+    publisher = FakeMqttClient(broker, "Publisher")
+    publisher.connect("localhost")
+
+    received = []
+    mqttClient.subscribe("temp", lambda topic, payload: received.append((topic, payload)), PayloadType.FLOAT)
+    mqttClient.subscribeStartWithTopic("heizung/json/", lambda topic, payload: received.append((topic, payload)), PayloadType.JSON)
+
+    publisher.publish("heizung/temp", "21.5")
+    publisher.publish("heizung/json/a", '{"on": true}')
+    publisher.publish("other/temp", "1")
+    mqttClient.mqttClient.loop_stop()
+    mqttClient.loop()
+
+    assert received == [("heizung/temp", 21.5), ("heizung/json/a", {"on": True})]
+
+
+def test6(tmp_path) -> None:
+    broker = FakeMqttBroker()
+    fakeClient = FakeMqttClient(broker, "Publisher")
+    mqttClient = Mqtt("localhost", "heizung", fakeClient, spool=Spool(tmp_path), replayRatePerSecond=1000)
+    fakeClient.loop_stop()
+    subscriber = FakeMqttClient(broker, "Subscriber")
+    subscriber.connect("localhost")
+    subscriber.subscribe("heizung/#")
+
+    received = []
+    subscriber.on_message = lambda client, userdata, message: received.append(message.payload)
+
+    # Broker outage, QoS 1 messages go to the spool
+    fakeClient.dropConnection()
+    fakeClient.loop(timeout=0)
+    mqttClient.publish("a", "1", qos=1)
+    mqttClient.publish("a", "2", qos=1)
+    assert mqttClient.getSpoolStatus()['pending'] == 2
+
+    fakeClient.reconnect()
+    fakeClient.loop(timeout=0)
+    while mqttClient.getSpoolStatus()['pending'] > 0:
+        mqttClient.loop()
+        sleep(0.01)
+    subscriber.loop(timeout=0)
+
+    assert received == [b"1", b"2"]
+
+
+def test7() -> None:
+    broker = FakeMqttBroker()
+    mqttClient = Mqtt("localhost", "heizung", FakeMqttClient(broker, "Subscriber"))
+    mqttClient.enableParallelDispatch(workers=2)
+    publisher = FakeMqttClient(broker, "Publisher")
+    publisher.connect("localhost")
+
+    received = []
+    mqttClient.subscribe("a", lambda topic, payload: received.append(payload))
+    mqttClient.subscribe("b", lambda topic, payload: received.append(payload))
+
+    for i in range(10):
+        publisher.publish("heizung/a", f"a{i}")
+    publisher.publish("heizung/b", "b0")
+    mqttClient.mqttClient.loop_stop()
+    mqttClient.loop()
+    dispatcher = mqttClient.dispatcher
+    # Waits for the queued callbacks
+    mqttClient.disableParallelDispatch()
+
+    # Each lambda has its own statistics, messages of a topic keep their order
+    stats = dispatcher.getStats()
+    assert stats["heizung/a"]["count"] == 10
+    assert stats["heizung/b"]["count"] == 1
+    assert [payload for payload in received if payload.startswith("a")] == [f"a{i}" for i in range(10)]
+    assert "b0" in received
+
+    # Inline dispatch again, the callback runs within loop()
+    assert mqttClient.getCallbackStats() == {}
+    publisher.publish("heizung/b", "b1")
+    mqttClient.mqttClient.loop(timeout=0)
+    mqttClient.loop()
+    assert received[-1] == "b1"
+
+
+def test8() -> None:
+    poaClient = paoMqttClient("TestClient")
+    mqttClient = Mqtt("koserver.parents", "heizung", poaClient)
+
+    received = []
+    mqttClient.subscribe("temp", lambda topic, payload: received.append(payload), PayloadType.FLOAT)
+    mqttClient.subscribe("json/a", lambda topic, payload: received.append(payload), PayloadType.JSON)
+    mqttClient.subscribeStartWithTopic("heizung/json/", lambda topic, payload: received.append(payload), PayloadType.JSON)
+    mqttClient.subscribe("raw", lambda topic, payload: received.append(payload), PayloadType.BYTES)
+
+    def deliver(topic: str, payload: bytes) -> None:
+        message = pahoMqtt.MQTTMessage(0, topic.encode('utf-8'))
+        message.payload = payload
+        poaClient.on_message(poaClient, None, message)
+
+    # Messages without subscription are dropped before they are queued
+    deliver("heizung/unknown", b"1")
+    deliver("other/temp", b"1")
+    assert mqttClient.queue.empty()
+
+    deliver("heizung/temp", b"no float")
+    deliver("heizung/temp", b"21.5")
+    deliver("heizung/json/a", b'{"on": true}')
+    deliver("heizung/raw", b"\xff")
+    mqttClient.loop()
+
+    # The invalid payload is skipped, the JSON payload is parsed once for both callbacks
+    assert received[0] == 21.5
+    assert received[1] == {"on": True}
+    assert received[1] is received[2]
+    assert received[3] == b"\xff"
+    assert len(received) == 4
+
+
+class PublishCounter(paoMqttClient):
+    def __init__(self, clientName: str) -> None:
+        super().__init__(clientName)
+        self.payloads = []
+
+    def publish(self, topic: str, payload: str, qos: int = 0) -> None:
+        self.payloads.append(payload)
+
+
+def test9() -> None:
+    # Publishing a batch logs on DEBUG itself, these records must not end up in the next batch
+    rootLogger = logging.getLogger()
+    previousLevel = rootLogger.level
+    rootLogger.setLevel(logging.DEBUG)
+
+    poaClient = PublishCounter("TestClient")
+    handler = BatchedMQTTHandler(Mqtt("koserver.parents", "heizung", poaClient), "log", flushIntervalMs=60000)
+    asyncClient = PublishCounter("TestClient")
+    asyncHandler = AsyncBatchedMQTTHandler(AsyncMqtt("koserver.parents", "heizung", asyncClient), "log",
+                                           flushIntervalMs=60000, maxMessagesPerSecond=1000)
+    rootLogger.addHandler(handler)
+    rootLogger.addHandler(asyncHandler)
+    try:
+        logging.getLogger("test").info("message")
+
+        async def run() -> None:
+            await asyncHandler.start()
+            await asyncio.wait_for(asyncHandler.stop(), 2)
+
+        asyncio.run(run())
+        handler.close()
+    finally:
+        rootLogger.removeHandler(handler)
+        rootLogger.removeHandler(asyncHandler)
+        rootLogger.setLevel(previousLevel)
+
+    assert len(poaClient.payloads) == 1
+    assert "message" in poaClient.payloads[0]
+    assert len(asyncClient.payloads) == 1
+
+
+class ResultClient(paoMqttClient):
+    """Returns the publish results of Paho, rcs lists the results of the next calls."""
+
+    def __init__(self, clientName: str) -> None:
+        super().__init__(clientName)
+        self.payloads = []
+        self.rcs = []
+
+    def publish(self, topic: str, payload: str, qos: int = 0) -> pahoMqtt.MQTTMessageInfo:
+        info = pahoMqtt.MQTTMessageInfo(len(self.payloads) + 1)
+        info.rc = self.rcs.pop(0) if self.rcs else pahoMqtt.MQTT_ERR_SUCCESS
+        if info.rc in (pahoMqtt.MQTT_ERR_SUCCESS, pahoMqtt.MQTT_ERR_NO_CONN):
+            self.payloads.append(payload)
+        return info
+
+
+def test10(tmp_path) -> None:
+    client = ResultClient("TestClient")
+    mqttClient = Mqtt("localhost", "heizung", client, spool=Spool(tmp_path), replayRatePerSecond=1000)
+    for i in range(4):
+        mqttClient.publish("a", str(i), qos=1)
+    assert mqttClient.getSpoolStatus()['pending'] == 4
+
+    # Queue full: the message is not taken, it stays in the spool
+    client.on_connect(client, None, None, pahoMqtt.CONNACK_ACCEPTED)
+    client.rcs = [pahoMqtt.MQTT_ERR_QUEUE_SIZE]
+    mqttClient.loop()
+    assert client.payloads == []
+    assert mqttClient.getSpoolStatus()['pending'] == 4
+
+    # Connection lost: Paho has queued the message and sends it itself, it must not be replayed again
+    sleep(0.01)
+    client.rcs = [pahoMqtt.MQTT_ERR_SUCCESS, pahoMqtt.MQTT_ERR_NO_CONN]
+    mqttClient.loop()
+    assert client.payloads == ["0", "1"]
+    assert mqttClient.getSpoolStatus()['pending'] == 2
+
+    while mqttClient.getSpoolStatus()['pending'] > 0:
+        sleep(0.01)
+        mqttClient.loop()
+    assert client.payloads == ["0", "1", "2", "3"]
+
+
+def test11() -> None:
+    # A full batch is published at once, not after the flush interval
+    client = PublishCounter("TestClient")
+    handler = AsyncBatchedMQTTHandler(AsyncMqtt("koserver.parents", "heizung", client), "log", batchSize=2,
+                                      flushIntervalMs=60000, maxMessagesPerSecond=1000)
+    testLogger = logging.getLogger("test11")
+    testLogger.propagate = False
+    testLogger.addHandler(handler)
+
+    async def waitForPayloads(count: int) -> None:
+        for _ in range(200):
+            if len(client.payloads) >= count:
+                return
+            await asyncio.sleep(0.01)
+
+    async def run() -> None:
+        await handler.start()
+        testLogger.warning("1")
+        assert client.payloads == []
+        testLogger.warning("2")
+        await waitForPayloads(1)
+        assert len(client.payloads) == 1
+
+        # Logged by another thread
+        await asyncio.get_running_loop().run_in_executor(None, lambda: [testLogger.warning(str(i)) for i in (3, 4)])
+        await waitForPayloads(2)
+        assert len(client.payloads) == 2
+        await asyncio.wait_for(handler.stop(), 2)
+
+    try:
+        asyncio.run(run())
+    finally:
+        testLogger.removeHandler(handler)
+
+    assert "1" in client.payloads[0] and "2" in client.payloads[0]
+    assert "3" in client.payloads[1] and "4" in client.payloads[1]
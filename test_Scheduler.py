@@ -0,0 +1,254 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+import PythonLib.Scheduler
+from PythonLib.AsyncScheduler import AsyncScheduler
+from PythonLib.Scheduler import CatchUpPolicy, ExecutionMode, OverrunPolicy, RelMsTask, Scheduler
+
+
+def test1() -> None:
+    scheduler = Scheduler()
+    calls = []
+
+    scheduler.oneShoot(lambda: calls.append("late"), 50)
+    scheduler.oneShoot(lambda: calls.append("early"), 10)
+    scheduler.scheduleAtDate(lambda: calls.append("date"), datetime.now() - timedelta(seconds=1))
+    assert scheduler.getTaskSize() == 3
+    assert scheduler.timeUntilNextTask() == 0
+
+    scheduler.loop()
+    assert calls == ["date"]
+
+    time.sleep(0.1)
+    scheduler.loop()
+    assert calls == ["date", "early", "late"]
+    assert scheduler.getTaskSize() == 0
+    assert scheduler.timeUntilNextTask() is None
+
+
+def test2() -> None:
+    scheduler = Scheduler()
+    calls = []
+
+    scheduler.scheduleEach(lambda: calls.append(1), 20)
+    assert 0 < scheduler.timeUntilNextTask() <= 21
+
+    for _ in range(3):
+        time.sleep(scheduler.timeUntilNextTask() / 1000)
+        scheduler.loop()
+
+    assert len(calls) == 3
+    assert scheduler.getTaskSize() == 1
+
+
+def test3() -> None:
+    for scheduler in (Scheduler(), Scheduler(timingWheelTickMs=5)):
+        calls = []
+
+        kept = scheduler.oneShoot(lambda: calls.append("kept"), 10)
+        cancelled = scheduler.oneShoot(lambda: calls.append("cancelled"), 10)
+        periodic = scheduler.scheduleEach(lambda: calls.append("periodic"), 10)
+        assert scheduler.getTaskSize() == 3
+
+        assert scheduler.cancel(cancelled)
+        assert not scheduler.cancel(cancelled)
+        assert scheduler.getTaskSize() == 2
+
+        time.sleep(0.05)
+        scheduler.loop()
+        assert calls == ["kept", "periodic"]
+        assert not scheduler.cancel(kept)
+
+        assert scheduler.cancel(periodic)
+        time.sleep(0.05)
+        scheduler.loop()
+        assert calls == ["kept", "periodic"]
+        assert scheduler.getTaskSize() == 0
+
+
+def test4() -> None:
+    assert CatchUpPolicy.BURST.nextRun(100, 10, 135) == 110
+    assert CatchUpPolicy.COALESCE.nextRun(100, 10, 135) == 140
+    assert CatchUpPolicy.SKIP.nextRun(100, 10, 105) == 110
+    assert CatchUpPolicy.COALESCE.nextRun(datetime(2024, 1, 1), timedelta(hours=1), datetime(2024, 1, 1, 5, 30)) == datetime(2024, 1, 1, 6)
+
+    scheduler = Scheduler()
+    calls = []
+    task = scheduler.scheduleEach(lambda: calls.append(1), 20, CatchUpPolicy.SKIP)
+    startTimeMs = task.getStartTime()
+
+    # Blocked for several periods: the late run is dropped and the task stays on its grid
+    time.sleep(0.1)
+    scheduler.loop()
+    assert calls == []
+    assert (task.getStartTime() - startTimeMs) % 20 == 0
+    assert task.getDeadlineMs() > Scheduler.getMonotonicMillis() - 1
+
+
+def test5() -> None:
+
+    async def run() -> list:
+        scheduler = AsyncScheduler()
+        calls = []
+
+        async def append(value: str) -> None:
+            calls.append(value)
+
+        await scheduler.scheduleAtDate(lambda: append("date"), datetime.now() + timedelta(milliseconds=30))
+        await scheduler.oneShoot(lambda: append("oneShoot"), 10)
+        cancelled = await scheduler.oneShoot(lambda: append("cancelled"), 20)
+        assert await scheduler.cancel(cancelled)
+        assert scheduler.getTaskSize() == 2
+
+        await asyncio.sleep(0.1)
+        assert scheduler.getTaskSize() == 0
+        return calls
+
+    assert asyncio.run(run()) == ["oneShoot", "date"]
+
+
+def slowTask() -> None:
+    time.sleep(0.05)
+
+
+def queuedTask() -> None:
+    time.sleep(0.05)
+
+
+def test6() -> None:
+    scheduler = Scheduler()
+    scheduler.scheduleEach(slowTask, 10, executionMode=ExecutionMode.THREAD, overrunPolicy=OverrunPolicy.SKIP)
+    scheduler.scheduleEach(queuedTask, 10, executionMode=ExecutionMode.THREAD, overrunPolicy=OverrunPolicy.QUEUE)
+
+    # loop() is not blocked by the slow callbacks
+    end = time.monotonic() + 0.12
+    while time.monotonic() < end:
+        start = time.monotonic()
+        scheduler.loop()
+        assert time.monotonic() - start < 0.02
+        time.sleep(0.005)
+    scheduler.shutdown()
+
+    metrics = scheduler.getMetrics()
+    skipped = metrics[slowTask.__qualname__]
+    queued = metrics[queuedTask.__qualname__]
+    assert skipped['overrunCount'] > 0
+    assert 1 < skipped['runCount'] <= 3
+    assert skipped['durationMs']['count'] == skipped['runCount']
+    assert skipped['durationMs']['mean'] >= 45
+    assert skipped['latenessMs']['count'] == skipped['runCount'] + skipped['overrunCount']
+    # The queued run is executed once the running one finished
+    assert queued['runCount'] >= skipped['runCount']
+
+
+def test7() -> None:
+    scheduler = Scheduler()
+    calls = []
+
+    def cancelItself() -> None:
+        calls.append(1)
+        scheduler.cancel(periodic)
+
+    # The task is not in the heap anymore while its callback runs
+    periodic = scheduler.scheduleEach(cancelItself, 10)
+    kept = scheduler.scheduleEach(lambda: None, 1000)
+    time.sleep(0.03)
+    scheduler.loop()
+
+    assert calls == [1]
+    assert scheduler.getTaskSize() == 1
+    assert scheduler.cancel(kept)
+    assert scheduler.getTaskSize() == 0
+
+
+def test8(monkeypatch) -> None:
+    scheduler = Scheduler()
+    calls = []
+    scheduler.scheduleAtDate(lambda: calls.append(1), datetime.now() + timedelta(seconds=30))
+    scheduler.loop()
+    assert calls == []
+    assert scheduler.timeUntilNextTask() > 29000
+
+    class SteppedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(seconds=31)
+
+    # The wall clock is stepped forward, e.g. by NTP, the monotonic clock is not
+    monkeypatch.setattr(PythonLib.Scheduler, 'datetime', SteppedDatetime)
+    scheduler.loop()
+    assert calls == [1]
+    assert Scheduler.getMillis() > 1700000000000
+
+
+def test9() -> None:
+
+    async def run(overrunPolicy: OverrunPolicy) -> Tuple[int, int]:
+        scheduler = AsyncScheduler()
+        state = {'running': 0, 'maxRunning': 0, 'runs': 0}
+
+        async def slowJob() -> None:
+            state['running'] += 1
+            state['runs'] += 1
+            state['maxRunning'] = max(state['maxRunning'], state['running'])
+            await asyncio.sleep(0.05)
+            state['running'] -= 1
+
+        task = await scheduler.scheduleEach(slowJob, 10, overrunPolicy=overrunPolicy)
+        await asyncio.sleep(0.12)
+        assert await scheduler.cancel(task)
+        await asyncio.sleep(0.06)
+        assert scheduler.getTaskSize() == 0
+        return state['maxRunning'], state['runs']
+
+    # A run due while the previous one is still running is dropped, queued or started in parallel
+    maxRunning, runs = asyncio.run(run(OverrunPolicy.SKIP))
+    assert maxRunning == 1 and runs <= 3
+    maxRunning, queuedRuns = asyncio.run(run(OverrunPolicy.QUEUE))
+    assert maxRunning == 1 and queuedRuns >= runs
+    maxRunning, runs = asyncio.run(run(OverrunPolicy.CONCURRENT))
+    assert maxRunning > 1
+
+
+def test10(monkeypatch) -> None:
+
+    async def run() -> list:
+        scheduler = AsyncScheduler()
+        calls = []
+
+        async def failingJob() -> None:
+            calls.append("failed")
+            raise ValueError("failed")
+
+        async def append(value: str) -> None:
+            calls.append(value)
+
+        def failingReload(task: RelMsTask) -> None:
+            raise RuntimeError("reload failed")
+
+        # Neither a failing callback nor a failing reload stops the other timers
+        monkeypatch.setattr(RelMsTask, 'reload', failingReload)
+        failingReloadTask = await scheduler.scheduleEach(lambda: append("each"), 10)
+        await scheduler.oneShoot(failingJob, 10)
+        await scheduler.scheduleAtDate(lambda: append("aware"), datetime.now(timezone.utc), timedelta(seconds=60))
+        await scheduler.oneShoot(lambda: append("later"), 40)
+        await asyncio.sleep(0.1)
+        assert not failingReloadTask.scheduled
+        assert scheduler.getTaskSize() == 1
+
+        dispatcher = scheduler.dispatcher
+        await scheduler.stop()
+        assert dispatcher.done()
+        assert scheduler.dispatcher is None
+        await scheduler.stop()
+
+        # The next schedule function starts the dispatcher again
+        await scheduler.oneShoot(lambda: append("restarted"), 10)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return calls
+
+    calls = asyncio.run(run())
+    assert sorted(calls) == ["aware", "each", "failed", "later", "restarted"]
@@ -0,0 +1,88 @@
+import asyncio
+import queue
+
+import serial
+
+from PythonLib.AsyncSerPort import AsyncSerPort
+from PythonLib.RingBuffer import RingBuffer
+from PythonLib.SerPort import SerPortDummy, SerPortHw
+
+
+def test1() -> None:
+    buffer = RingBuffer(maxSize=10)
+    buffer.append(b'/frame1!')
+    assert buffer.find(b'!') == 7
+    assert buffer.peek(3) == b'/fr'
+
+    assert buffer.consume(8) == 8
+    assert len(buffer) == 0
+    assert buffer.consume(5) == 0
+
+    # Overflow drops the oldest bytes
+    buffer.append(b'0123456789abc')
+    assert buffer.peek() == b'3456789abc'
+    assert buffer.getOverflowCount() == 3
+    assert buffer.read(4) == b'3456'
+    assert buffer.find(b'a', 2) == 3
+
+    # The whole buffer is copied again only after a change
+    snapshot = buffer.peek()
+    assert buffer.peek() is snapshot
+    assert buffer.consume(0) == 0 and buffer.peek() is snapshot
+    buffer.append(b'd')
+    assert buffer.peek() == b'789abcd'
+    buffer.consume(1)
+    assert buffer.peek() == b'89abcd'
+    assert buffer.read(2) == b'89' and buffer.peek() == b'abcd'
+    buffer.clear()
+    assert buffer.peek() == b''
+
+
+def test2() -> None:
+    port = SerPortDummy(b'/frame!/frame!/fr')
+
+    # Only the first frame is deleted, not every equal one
+    port.delete(b'/frame!')
+    assert port.read() == b'/frame!/fr'
+
+    # Data in front of the frame is deleted with it
+    port.write(b'xx/frame!rest')
+    port.delete(b'/frame!')
+    assert port.read() == b'rest'
+    assert port.getBufferSize() == 4
+
+    port.delete(b'/unknown!')
+    assert port.read() == b'rest'
+    assert port.read() is port.read()
+
+
+def test3() -> None:
+    # Written data is received again
+    port = SerPortHw(serial.serial_for_url('loop://', timeout=None))
+    frames: queue.Queue = queue.Queue()
+    port.startReader(frames.put, b'!')
+
+    port.write(b'/meter1')
+    port.write(b'!/meter2!/me')
+    assert frames.get(timeout=2) == b'/meter1!'
+    assert frames.get(timeout=2) == b'/meter2!'
+    port.stopReader()
+    assert port.read() == b'/me'
+
+    port.clear()
+    port.startReader()
+    port.write(b'/a!')
+    assert port.readUntil(b'!', timeoutS=2) == b'/a!'
+    assert port.readUntil(b'!', timeoutS=0.1) is None
+    port.stopReader()
+
+
+def test4() -> None:
+    async def run() -> None:
+        async with AsyncSerPort(serial.serial_for_url('loop://', timeout=None)) as port:
+            port.write(b'/meter1!/met')
+            assert await asyncio.wait_for(port.readuntil(b'!'), 2) == b'/meter1!'
+            port.write(b'er2!')
+            assert await asyncio.wait_for(port.readuntil(b'!'), 2) == b'/meter2!'
+
+    asyncio.run(run())
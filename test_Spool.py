@@ -0,0 +1,81 @@
+from pathlib import Path
+from PythonLib.Spool import Spool, SyncPolicy
+
+
+def test1(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, segmentSizeBytes=20)
+
+    for i in range(10):
+        spool.append(f"record {i}".encode())
+
+    assert spool.getPendingCount() == 10
+    assert spool.peek(3) == [b"record 0", b"record 1", b"record 2"]
+
+    spool.consume(2)
+    assert spool.getPendingCount() == 8
+    assert spool.peek(100)[0] == b"record 2"
+
+
+def test2(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, segmentSizeBytes=20)
+    for i in range(5):
+        spool.append(f"record {i}".encode())
+    spool.peek(3)
+    spool.consume(3)
+    spool.close()
+
+    # Reopen, the read position must survive
+    spool = Spool(tmp_path, segmentSizeBytes=20)
+    assert spool.getPendingCount() == 2
+    assert spool.peek(10) == [b"record 3", b"record 4"]
+
+
+def test3(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, segmentSizeBytes=20, maxSizeBytes=60)
+    for i in range(20):
+        spool.append(f"record {i:02d}".encode())
+
+    assert spool.getDroppedCount() > 0
+    assert spool.getPendingCount() + spool.getDroppedCount() == 20
+    assert spool.peek(100)[-1] == b"record 19"
+
+
+def test4(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, segmentSizeBytes=20, syncPolicy=SyncPolicy.INTERVAL)
+    spool.appendMany(f"record {i}".encode() for i in range(5))
+    spool.close()
+
+    spool = Spool(tmp_path, segmentSizeBytes=20)
+    assert spool.getPendingCount() == 5
+    assert spool.peek(10)[-1] == b"record 4"
+
+
+def test5(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, segmentSizeBytes=20, maxSizeBytes=70)
+    for i in range(4):
+        spool.append(f"record {i:02d}".encode())
+    records = spool.peek(4)
+
+    # The size cap drops the oldest segment before the peeked records are consumed
+    for i in range(4, 8):
+        spool.append(f"record {i:02d}".encode())
+    assert spool.getDroppedCount() > 0
+
+    spool.consume(len(records))
+    assert spool.peek(100)[0] == b"record 04"
+    assert spool.getPendingCount() == 4
+
+
+def test6(tmp_path: Path) -> None:
+    spool = Spool(tmp_path)
+    spool.append(b"record 0")
+    spool.close()
+
+    # Crash while writing a record
+    segment = next(tmp_path.glob('*.seg'))
+    with open(segment, 'ab') as f:
+        f.write(b"rec")
+
+    spool = Spool(tmp_path)
+    spool.append(b"record 1")
+    assert spool.peek(10) == [b"record 0", b"record 1"]
@@ -1,6 +1,9 @@
+import asyncio
 import time
 
-from TaskQueue import TaskQueueExecuteOperation, TaskQueue, TaskQueueWait
+from PythonLib.AsyncTaskQueue import AsyncTaskQueue
+from PythonLib.Scheduler import Scheduler
+from PythonLib.TaskQueue import Priority, TaskQueueExecuteOperation, TaskQueue, TaskQueueWait
 
 
 def main() -> None:
@@ -20,5 +23,117 @@ def main() -> None:
         taskQueue.loop()
 
 
+def test1() -> None:
+    taskQueue = TaskQueue(2)
+    calls = []
+
+    taskQueue.add(TaskQueueWait(50), 0)
+    taskQueue.add(TaskQueueExecuteOperation(lambda: calls.append("lane0")), 0)
+    taskQueue.add(TaskQueueExecuteOperation(lambda: calls.append("low")), 1, Priority.LOW)
+    taskQueue.add(TaskQueueExecuteOperation(lambda: calls.append("high")), 1, Priority.HIGH)
+    assert taskQueue.getTaskSize() == 4
+    assert taskQueue.timeUntilNextTask() == 0
+
+    # Lane 1 is not blocked by the wait of lane 0
+    taskQueue.loop()
+    assert calls == ["high", "low"]
+    assert 40 <= taskQueue.timeUntilNextTask() <= 51
+
+    time.sleep(taskQueue.timeUntilNextTask() / 1000)
+    taskQueue.loop()
+    assert calls == ["high", "low", "lane0"]
+    assert taskQueue.getTaskSize() == 0
+    assert taskQueue.timeUntilNextTask() is None
+
+
+def test2() -> None:
+
+    async def run() -> list:
+        taskQueue = AsyncTaskQueue(2)
+        calls = []
+
+        async def append(value: str) -> None:
+            calls.append(value)
+
+        await taskQueue.addWait(50, 0)
+        await taskQueue.add(lambda: append("lane0"), 0)
+        await taskQueue.add(lambda: append("lane1"), 1)
+        await asyncio.sleep(0.01)
+        assert calls == ["lane1"]
+
+        await taskQueue.join()
+        await taskQueue.stop()
+        return calls
+
+    assert asyncio.run(run()) == ["lane1", "lane0"]
+
+
+def test3() -> None:
+
+    async def run() -> None:
+        taskQueue = AsyncTaskQueue()
+        calls = []
+
+        async def append(value: str) -> None:
+            calls.append(value)
+
+        # A job cancelled by cancel() is dropped, the lane goes on
+        await taskQueue.add(lambda: asyncio.sleep(10))
+        await taskQueue.add(lambda: append("next"))
+        await asyncio.sleep(0.01)
+        await taskQueue.cancel()
+        await taskQueue.join()
+        assert calls == ["next"]
+
+        # A cancelled worker ends, even while a job is running (like at the end of asyncio.run())
+        await taskQueue.add(lambda: asyncio.sleep(10))
+        await asyncio.sleep(0.01)
+        worker = taskQueue.workers[0]
+        worker.cancel()
+        await asyncio.wait([worker], timeout=1)
+        assert worker.cancelled()
+
+    asyncio.run(run())
+
+
+def test4() -> None:
+
+    async def run() -> list:
+        taskQueue = AsyncTaskQueue()
+        calls = []
+
+        async def append(value: str) -> None:
+            calls.append(value)
+
+        def failingJob() -> None:
+            raise ValueError("failed before returning a coroutine")
+
+        # Jobs failing before they are awaited neither end the worker nor block join()
+        await taskQueue.add(failingJob)
+        await taskQueue.add(lambda: calls.append("no coroutine"))
+        await taskQueue.add(lambda: append("next"))
+        await asyncio.wait_for(taskQueue.join(), 1)
+        assert taskQueue.getTaskSize() == 0
+        await taskQueue.stop()
+        return calls
+
+    assert asyncio.run(run()) == ["no coroutine", "next"]
+
+
+def test5(monkeypatch) -> None:
+    taskQueue = TaskQueue()
+    calls = []
+    taskQueue.add(TaskQueueWait(30))
+    taskQueue.add(TaskQueueExecuteOperation(lambda: calls.append("done")))
+
+    # The wall clock is set back, the wait still ends
+    monkeypatch.setattr(Scheduler, 'getMillis', staticmethod(lambda: 0))
+    endTime = time.monotonic() + 1
+    while not calls and time.monotonic() < endTime:
+        taskQueue.loop()
+        time.sleep(0.01)
+    assert calls == ["done"]
+
+
 if __name__ == '__main__':
     main()
@@ -1,24 +1,42 @@
 import time
 
-from PythonLib.Throttle import Throttle
+from PythonLib.Throttle import Throttle, ThrottleRegistry
 
 
 def test1() -> None:
     throttle = Throttle(3000)
+    # Slightly more than one second, three sleeps of exactly one second often measure just 3000 ms
+    stepS = 1.01
 
     assert throttle.triggerAndCheck() is True
-    time.sleep(1)
+    time.sleep(stepS)
     assert throttle.triggerAndCheck() is False
-    time.sleep(1)
+    time.sleep(stepS)
     assert throttle.triggerAndCheck() is False
-    time.sleep(1)
+    time.sleep(stepS)
     assert throttle.triggerAndCheck() is True
-    time.sleep(1)
+    time.sleep(stepS)
     assert throttle.triggerAndCheck() is False
-    time.sleep(1)
+    time.sleep(stepS)
     assert throttle.triggerAndCheck() is False
-    time.sleep(1)
+    time.sleep(stepS)
     assert throttle.triggerAndCheck() is True
 
 
-test1()
+def test2() -> None:
+    registry = ThrottleRegistry(20, burst=2, idleEvictionMs=100)
+
+    assert registry.allow(["a", "a", "a", "b"]) == [True, True, False, True]
+    time.sleep(0.06)
+    # One token refilled for each key
+    assert registry.allow(["a", "a", "b", "b"]) == [True, False, True, True]
+    assert registry.getKeyCount() == 2
+
+    time.sleep(0.11)
+    assert registry.triggerAndCheck("c") is True
+    assert registry.getKeyCount() == 1
+    assert registry.getEvictedCount() == 2
+
+
+if __name__ == '__main__':
+    test1()